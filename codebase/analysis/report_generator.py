@@ -41,6 +41,36 @@ def format_analyses_for_prompt(analyses_data):
     return "\n".join(formatted_strings)
 
 
+def synthesize_into_report(prompt_template, prompt_fill_data, data_batch_for_prompt, text_report_path, report_header):
+    """
+    Runs the Gemini synthesis and writes the text report: `report_header`, then the textual summary.
+    With GEMINI_SYNTHESIS_STREAMING the summary is written to the file while Gemini is still generating it;
+    otherwise it's written once the whole response is in. The file is removed if no summary came back.
+    Returns (text_summary, structured_json_str) like gemini_client.synthesize_analyses_with_gemini.
+    """
+    with open(text_report_path, "w", encoding="utf-8") as f:
+        f.write(report_header)
+        f.write("--- Textual Summary from Gemini ---\n")
+        f.flush()
+
+        def write_summary_text(text_piece):
+            f.write(text_piece)
+            f.flush() # Lets the report be followed (e.g. tail -f) while it is generated
+
+        text_summary, structured_json_str = gemini_client.synthesize_analyses_with_gemini(
+            prompt_template=prompt_template,
+            prompt_fill_data=prompt_fill_data,
+            data_batch_for_prompt=data_batch_for_prompt,
+            on_text=write_summary_text
+        )
+
+    if text_summary:
+        logger.info(f"Textual summary saved to {text_report_path}")
+    else:
+        os.remove(text_report_path)
+    return text_summary, structured_json_str
+
+
 def generate_longitudinal_brand_report(brand_name, product_line, product_configs_for_brand):
     """
     Generates a longitudinal brand evolution report.
@@ -73,30 +103,28 @@ def generate_longitudinal_brand_report(brand_name, product_line, product_configs
         "generation_entry_list_for_json": [pc['name'] + f" ({pc.get('year', 'N/A')})" for pc in product_configs_for_brand]
     }
 
-    text_summary, structured_json_str = gemini_client.synthesize_analyses_with_gemini(
+    report_subdir = os.path.join("brand_evolution", brand_name.replace(" ", "_").replace("/", "_"))
+    output_path = ensure_reports_dir(report_subdir)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    safe_product_line = product_line.replace(" ", "_").replace("/", "_")
+    base_filename = f"{safe_product_line}_evolution_{timestamp}"
+    report_header = "".join([
+        f"Longitudinal Analysis Report for: {brand_name} - {product_line}\n",
+        f"Report Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n",
+        "Products Included:\n",
+        "\n".join(product_details_prompt_list) + "\n\n",
+    ])
+
+    text_summary, structured_json_str = synthesize_into_report(
         prompt_template=analysis_prompts.LONGITUDINAL_BRAND_EVOLUTION_PROMPT_TEMPLATE,
         prompt_fill_data=prompt_fill_data,
-        data_batch_for_prompt=concatenated_analyses_str
+        data_batch_for_prompt=concatenated_analyses_str,
+        text_report_path=os.path.join(output_path, f"{base_filename}.txt"),
+        report_header=report_header
     )
 
     if text_summary or structured_json_str:
         logger.info(f"Successfully generated synthesis for {brand_name} {product_line}.")
-        
-        report_subdir = os.path.join("brand_evolution", brand_name.replace(" ", "_").replace("/", "_"))
-        output_path = ensure_reports_dir(report_subdir)
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        safe_product_line = product_line.replace(" ", "_").replace("/", "_")
-        base_filename = f"{safe_product_line}_evolution_{timestamp}"
-
-        if text_summary:
-            with open(os.path.join(output_path, f"{base_filename}.txt"), "w", encoding="utf-8") as f:
-                f.write(f"Longitudinal Analysis Report for: {brand_name} - {product_line}\n")
-                f.write(f"Report Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-                f.write("Products Included:\n")
-                f.write("\n".join(product_details_prompt_list) + "\n\n")
-                f.write("--- Textual Summary from Gemini ---\n")
-                f.write(text_summary)
-            logger.info(f"Textual summary saved to {output_path}/{base_filename}.txt")
 
         if structured_json_str:
             try:
@@ -144,31 +172,29 @@ def generate_comparative_product_report(product_configs_to_compare, comparison_t
         "comparison_timeframe_or_segment": timeframe_segment # Added this to fill in the prompt
     }
     
-    text_summary, structured_json_str = gemini_client.synthesize_analyses_with_gemini(
+    report_subdir = "comparative_analysis"
+    output_path = ensure_reports_dir(report_subdir)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    safe_title = comparison_title.replace(" ", "_").replace("/", "_").replace(":", "_")
+    base_filename = f"{safe_title}_{timestamp}"
+    report_header = "".join([
+        f"Comparative Analysis Report: {comparison_title}\n",
+        f"Report Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n",
+        "Products Included:\n",
+        "\n".join(product_details_prompt_list) + "\n\n",
+    ])
+
+    text_summary, structured_json_str = synthesize_into_report(
         prompt_template=analysis_prompts.COMPARATIVE_PRODUCT_ANALYSIS_PROMPT_TEMPLATE,
         prompt_fill_data=prompt_fill_data,
-        data_batch_for_prompt=concatenated_analyses_str
+        data_batch_for_prompt=concatenated_analyses_str,
+        text_report_path=os.path.join(output_path, f"{base_filename}.txt"),
+        report_header=report_header
     )
 
     if text_summary or structured_json_str:
         logger.info(f"Successfully generated synthesis for comparison: {comparison_title}.")
 
-        report_subdir = "comparative_analysis"
-        output_path = ensure_reports_dir(report_subdir)
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        safe_title = comparison_title.replace(" ", "_").replace("/", "_").replace(":", "_")
-        base_filename = f"{safe_title}_{timestamp}"
-
-        if text_summary:
-            with open(os.path.join(output_path, f"{base_filename}.txt"), "w", encoding="utf-8") as f:
-                f.write(f"Comparative Analysis Report: {comparison_title}\n")
-                f.write(f"Report Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-                f.write("Products Included:\n")
-                f.write("\n".join(product_details_prompt_list) + "\n\n")
-                f.write("--- Textual Summary from Gemini ---\n")
-                f.write(text_summary)
-            logger.info(f"Textual summary saved to {output_path}/{base_filename}.txt")
-
         if structured_json_str:
             try:
                 parsed_json = json.loads(structured_json_str)
@@ -212,30 +238,29 @@ def generate_comparative_saas_report(saas_product_configs_to_compare, comparison
         "comparison_segment_description": segment_description
     }
     
-    text_summary, structured_json_str = gemini_client.synthesize_analyses_with_gemini(
+    report_subdir = os.path.join("saas_analysis", "comparative") # New subdir
+    output_path = ensure_reports_dir(report_subdir)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    safe_title = comparison_title.replace(" ", "_").replace("/", "_").replace(":", "_")
+    base_filename = f"SaaS_Compare_{safe_title}_{timestamp}"
+    report_header = "".join([
+        f"Comparative SaaS Analysis Report: {comparison_title}\n",
+        f"Segment: {segment_description}\n",
+        f"Report Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n",
+        "Products Included (with review counts):\n",
+        "\n".join(product_details_prompt_list) + "\n\n",
+    ])
+
+    text_summary, structured_json_str = synthesize_into_report(
         prompt_template=analysis_prompts.COMPARATIVE_SAAS_ANALYSIS_PROMPT_TEMPLATE, # Use new SaaS prompt
         prompt_fill_data=prompt_fill_data,
-        data_batch_for_prompt=concatenated_analyses_str
+        data_batch_for_prompt=concatenated_analyses_str,
+        text_report_path=os.path.join(output_path, f"{base_filename}.txt"),
+        report_header=report_header
     )
 
     if text_summary or structured_json_str:
         logger.info(f"Successfully generated SaaS comparison synthesis: {comparison_title}.")
-        report_subdir = os.path.join("saas_analysis", "comparative") # New subdir
-        output_path = ensure_reports_dir(report_subdir)
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        safe_title = comparison_title.replace(" ", "_").replace("/", "_").replace(":", "_")
-        base_filename = f"SaaS_Compare_{safe_title}_{timestamp}"
-
-        if text_summary:
-            with open(os.path.join(output_path, f"{base_filename}.txt"), "w", encoding="utf-8") as f:
-                f.write(f"Comparative SaaS Analysis Report: {comparison_title}\n")
-                f.write(f"Segment: {segment_description}\n")
-                f.write(f"Report Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-                f.write("Products Included (with review counts):\n")
-                f.write("\n".join(product_details_prompt_list) + "\n\n")
-                f.write("--- Textual Summary from Gemini ---\n")
-                f.write(text_summary)
-            logger.info(f"Textual summary saved to {output_path}/{base_filename}.txt")
 
         if structured_json_str:
             try:
@@ -284,30 +309,29 @@ def generate_single_saas_deep_dive_report(saas_product_config, report_title_suff
         "num_reviews_used_for_json": num_reviews
     }
     
-    text_summary, structured_json_str = gemini_client.synthesize_analyses_with_gemini(
+    report_subdir = os.path.join("saas_analysis", "deep_dives") # New subdir
+    output_path = ensure_reports_dir(report_subdir)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    safe_product_name = product_name.replace(" ", "_").replace("/", "_")
+    base_filename = f"SaaS_DeepDive_{safe_product_name}_{report_title_suffix.replace(' ', '_')}_{timestamp}"
+    report_header = "".join([
+        f"SaaS Product Deep Dive Report: {product_name}\n",
+        f"Report Title Suffix: {report_title_suffix}\n",
+        f"Report Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n",
+        "Based on data from:\n",
+        "\n".join(product_detail_prompt_list) + "\n\n",
+    ])
+
+    text_summary, structured_json_str = synthesize_into_report(
         prompt_template=analysis_prompts.SINGLE_SAAS_PRODUCT_DEEP_DIVE_PROMPT_TEMPLATE,
         prompt_fill_data=prompt_fill_data,
-        data_batch_for_prompt=concatenated_analyses_str
+        data_batch_for_prompt=concatenated_analyses_str,
+        text_report_path=os.path.join(output_path, f"{base_filename}.txt"),
+        report_header=report_header
     )
 
     if text_summary or structured_json_str:
         logger.info(f"Successfully generated SaaS deep dive for: {product_name}.")
-        report_subdir = os.path.join("saas_analysis", "deep_dives") # New subdir
-        output_path = ensure_reports_dir(report_subdir)
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        safe_product_name = product_name.replace(" ", "_").replace("/", "_")
-        base_filename = f"SaaS_DeepDive_{safe_product_name}_{report_title_suffix.replace(' ', '_')}_{timestamp}"
-
-        if text_summary:
-            with open(os.path.join(output_path, f"{base_filename}.txt"), "w", encoding="utf-8") as f:
-                f.write(f"SaaS Product Deep Dive Report: {product_name}\n")
-                f.write(f"Report Title Suffix: {report_title_suffix}\n")
-                f.write(f"Report Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-                f.write("Based on data from:\n")
-                f.write("\n".join(product_detail_prompt_list) + "\n\n")
-                f.write("--- Textual Summary from Gemini ---\n")
-                f.write(text_summary)
-            logger.info(f"Textual summary saved to {output_path}/{base_filename}.txt")
 
         if structured_json_str:
             try:
@@ -355,30 +379,29 @@ def generate_saas_category_insights_report(saas_product_configs_for_category, ca
         "total_reviews_considered_for_json": total_reviews
     }
     
-    text_summary, structured_json_str = gemini_client.synthesize_analyses_with_gemini(
+    report_subdir = os.path.join("saas_analysis", "category_insights") # New subdir
+    output_path = ensure_reports_dir(report_subdir)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    safe_category_name = category_name.replace(" ", "_").replace("/", "_")
+    base_filename = f"SaaS_Category_{safe_category_name}_{timestamp}"
+    report_header = "".join([
+        f"SaaS Category Insights Report: {category_name}\n",
+        f"Report Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n",
+        "Based on data from products including:\n",
+        example_product_list_str + "\n",
+        f"(Total {total_reviews} individual review analyses considered from the category)\n\n",
+    ])
+
+    text_summary, structured_json_str = synthesize_into_report(
         prompt_template=analysis_prompts.SAAS_CATEGORY_KEY_BUYING_FACTORS_PROMPT_TEMPLATE,
         prompt_fill_data=prompt_fill_data,
-        data_batch_for_prompt=concatenated_analyses_str
+        data_batch_for_prompt=concatenated_analyses_str,
+        text_report_path=os.path.join(output_path, f"{base_filename}.txt"),
+        report_header=report_header
     )
 
     if text_summary or structured_json_str:
         logger.info(f"Successfully generated SaaS category insights for: {category_name}.")
-        report_subdir = os.path.join("saas_analysis", "category_insights") # New subdir
-        output_path = ensure_reports_dir(report_subdir)
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        safe_category_name = category_name.replace(" ", "_").replace("/", "_")
-        base_filename = f"SaaS_Category_{safe_category_name}_{timestamp}"
-
-        if text_summary:
-            with open(os.path.join(output_path, f"{base_filename}.txt"), "w", encoding="utf-8") as f:
-                f.write(f"SaaS Category Insights Report: {category_name}\n")
-                f.write(f"Report Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-                f.write("Based on data from products including:\n")
-                f.write(example_product_list_str + "\n")
-                f.write(f"(Total {total_reviews} individual review analyses considered from the category)\n\n")
-                f.write("--- Textual Summary from Gemini ---\n")
-                f.write(text_summary)
-            logger.info(f"Textual summary saved to {output_path}/{base_filename}.txt")
 
         if structured_json_str:
             try:
@@ -507,4 +530,7 @@ if __name__ == '__main__':
                 example_product_list_str=example_list_str
             )
 
-    logger.info("--- Phase 2 Analysis Report Generation (Including SaaS) Complete ---")
\ No newline at end of file
+    gemini_client.gemini_response_cache.log_summary() # GEMINI_CACHE_MODE=replay_strict re-renders reports offline
+    gemini_client.gemini_usage.log_summary()
+    gemini_client.gemini_usage.persist("phase2_reports")
+    logger.info("--- Phase 2 Analysis Report Generation (Including SaaS) Complete ---")
@@ -1,21 +1,27 @@
 # config.py (Main configuration loader)
+import hashlib
 
 # Import all settings from configs.settings
 from configs.settings import *
 
 # Import specific dictionaries/constants from other config files
 from configs.reviewer_lists import REVIEWER_CHANNELS
-from configs.product_catalog import PRODUCTS_TO_ANALYZE
+from configs.product_catalog import PRODUCTS_TO_ANALYZE, CATEGORY_VIDEO_FILTERS
 
 from configs.prompts_consumer import (
     GEMINI_RELEVANCE_CHECK_PROMPT_TEMPLATE as CONSUMER_RELEVANCE_PROMPT,
+    GEMINI_BATCH_RELEVANCE_CHECK_PROMPT_TEMPLATE as CONSUMER_BATCH_RELEVANCE_PROMPT,
     GEMINI_ANALYSIS_PROMPT_TEMPLATE as CONSUMER_ANALYSIS_PROMPT,
+    GEMINI_ANALYSIS_SEGMENT_NOTE_TEMPLATE as CONSUMER_ANALYSIS_SEGMENT_NOTE,
+    GEMINI_ANALYSIS_VIDEO_DETAILS_TEMPLATE as CONSUMER_ANALYSIS_VIDEO_DETAILS,
+    GEMINI_MULTI_PRODUCT_ANALYSIS_PROMPT_TEMPLATE as CONSUMER_MULTI_PRODUCT_ANALYSIS_PROMPT,
     GEMINI_JSON_STRUCTURE_REQUEST as CONSUMER_JSON_REQUEST
 )
 
 from configs.prompts_saas import (
     GEMINI_SAAS_TYPE_RELEVANCE_PROMPT_TEMPLATE as SAAS_TIER1_RELEVANCE_PROMPT,
     GEMINI_SAAS_SUITABILITY_PROMPT_TEMPLATE as SAAS_TIER2_SUITABILITY_PROMPT,
+    GEMINI_SAAS_FUSED_SCREENING_PROMPT_TEMPLATE as SAAS_FUSED_SCREENING_PROMPT,
     GEMINI_SAAS_JSON_STRUCTURE_REQUEST as SAAS_JSON_REQUEST
     # Note: We can reuse CONSUMER_ANALYSIS_PROMPT for SaaS, but pass it SAAS_JSON_REQUEST
 )
@@ -25,12 +31,15 @@ from configs.prompts_saas import (
 PROMPT_CONFIGS = {
     "consumer": { # Default or for categories like "smartphones"
         "relevance_check": CONSUMER_RELEVANCE_PROMPT,
+        "batch_relevance_check": CONSUMER_BATCH_RELEVANCE_PROMPT,
         "analysis_prompt": CONSUMER_ANALYSIS_PROMPT,
+        "multi_product_analysis_prompt": CONSUMER_MULTI_PRODUCT_ANALYSIS_PROMPT, # Cross-product mode
         "json_structure": CONSUMER_JSON_REQUEST
     },
     "saas_crm": { # Specific for "saas_crm" category
         "tier1_relevance": SAAS_TIER1_RELEVANCE_PROMPT,
         "tier2_suitability": SAAS_TIER2_SUITABILITY_PROMPT,
+        "fused_screening": SAAS_FUSED_SCREENING_PROMPT, # Tier 1 + Tier 2 in one request
         "analysis_prompt": CONSUMER_ANALYSIS_PROMPT, # Re-using the general analysis prompt shell
         "json_structure": SAAS_JSON_REQUEST        # But with the SaaS specific JSON structure
     }
@@ -53,6 +62,20 @@ def get_prompt_config_for_category(category_name):
     return PROMPT_CONFIGS.get(category_type, PROMPT_CONFIGS["consumer"])
 
 
+def get_screening_prompt_version(screening_kind):
+    """
+    Returns a version string for a screening prompt set, e.g. "saas_two_tier:3f2a9c1d0b7e".
+    The hash changes whenever the prompt text changes, so stored relevance verdicts from older prompts are not reused.
+    screening_kind: "consumer_relevance", "saas_two_tier" or "saas_fused".
+    """
+    templates_by_kind = {
+        "consumer_relevance": [CONSUMER_RELEVANCE_PROMPT, CONSUMER_BATCH_RELEVANCE_PROMPT],
+        "saas_two_tier": [SAAS_TIER1_RELEVANCE_PROMPT, SAAS_TIER2_SUITABILITY_PROMPT],
+        "saas_fused": [SAAS_FUSED_SCREENING_PROMPT],
+    }
+    digest = hashlib.sha1("\n".join(templates_by_kind[screening_kind]).encode("utf-8")).hexdigest()[:12]
+    return f"{screening_kind}:{digest}"
+
 # The API Key validation from settings.py will run when settings.py is imported.
 # No need to repeat it here.
 print(f"Config loaded. APP_MODE: {APP_MODE}, IS_TEST_MODE: {IS_TEST_MODE}")
\ No newline at end of file
@@ -28,9 +28,12 @@ PRODUCTS_TO_ANALYZE = {
     ],
 
     "saas_crm": [
+        # Optional per-product keys: "screening_mode" ("two_tier" or "fused", default settings.SAAS_DEFAULT_SCREENING_MODE),
+        # "initial_search_max_results", "search_max_quota_units", "max_full_analysis_videos",
+        # "video_filters" (overrides keys of CATEGORY_VIDEO_FILTERS below for this product).
         {"name": "Salesforce Sales Cloud", "brand": "Salesforce", "type": "CRM", "search_language": "en", "category_tags": ["Enterprise CRM", "Sales Automation"], "keywords_for_relevance": ["Salesforce Sales Cloud review", "Salesforce features", "Salesforce pricing", "Salesforce comparison", "Salesforce demo"]},
         
-        {"name": "HubSpot CRM Suite", "brand": "HubSpot", "type": "CRM", "search_language": "en", "category_tags": ["SMB CRM", "Inbound Marketing", "All-in-One CRM"], "keywords_for_relevance": ["HubSpot CRM review", "HubSpot Sales Hub features", "HubSpot Marketing Hub pricing", "HubSpot vs", "HubSpot demo"]},
+        {"name": "HubSpot CRM Suite", "brand": "HubSpot", "type": "CRM", "search_language": "en", "screening_mode": "fused", "category_tags": ["SMB CRM", "Inbound Marketing", "All-in-One CRM"], "keywords_for_relevance": ["HubSpot CRM review", "HubSpot Sales Hub features", "HubSpot Marketing Hub pricing", "HubSpot vs", "HubSpot demo"]},
 
         {"name": "Microsoft Dynamics 365 Sales", "brand": "Microsoft", "type": "CRM", "search_language": "en", "category_tags": ["Enterprise CRM", "Microsoft Ecosystem", "Sales Force Automation"], "keywords_for_relevance": ["Dynamics 365 Sales review", "Microsoft CRM features", "Dynamics 365 pricing", "Dynamics vs Salesforce", "Dynamics 365 demo", "MSFT D365 Sales"]},
         
@@ -46,4 +49,12 @@ PRODUCTS_TO_ANALYZE = {
     ],
     # "laptops": [ ... ],
     # "cameras": [ ... ],
-}
\ No newline at end of file
+}
+
+# Video-level thresholds applied after the batched videos.list enrichment and before any Gemini call.
+# Keys (all optional): "min_duration_seconds", "max_duration_seconds", "min_view_count", "require_captions", "exclude_live".
+# A product can override single keys with its own "video_filters" dict. Videos whose details could not be fetched are kept.
+CATEGORY_VIDEO_FILTERS = {
+    "smartphones": {"min_duration_seconds": 180, "max_duration_seconds": 2 * 3600, "min_view_count": 1000, "exclude_live": True},
+    "saas_crm": {"min_duration_seconds": 120, "max_duration_seconds": 3 * 3600, "min_view_count": 100, "exclude_live": True},
+}
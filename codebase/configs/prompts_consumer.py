@@ -16,6 +16,25 @@ Based ONLY on the title and description, is this video likely to be a detailed r
 Respond with ONLY "YES" or "NO".
 """
 
+# --- Gemini Consumer Product Batched Relevance Check Prompt ---
+# Same criteria as above, but classifies many videos (e.g. one reviewer's search results) in a single request.
+GEMINI_BATCH_RELEVANCE_CHECK_PROMPT_TEMPLATE = """
+You are an assistant that determines if YouTube videos are relevant, in-depth reviews or detailed hands-on analyses suitable for detailed feature extraction for consumer electronics like smartphones or laptops.
+Do not consider short news segments, event recaps without product interaction, or very brief impression videos that lack substance for a full review analysis.
+However, consider "X Months Later" reviews as relevant if they are substantial.
+
+Product we are interested in: "{product_name_for_relevance}"
+Keywords associated with this product search: {product_keywords_for_relevance}
+
+Videos to classify (title and first 250 chars of description):
+{numbered_video_list}
+
+For EACH video above, based ONLY on its title and description, decide whether it is likely to be a detailed review or substantial hands-on analysis of the specified product, suitable for extracting detailed opinions on its features, performance, and non-verbal cues from the reviewer.
+
+Respond ONLY with a JSON array containing one object per video, in the same order, with two keys: "index" (integer, the number shown before the video) and "is_relevant" (boolean).
+Example: [{{"index": 1, "is_relevant": true}}, {{"index": 2, "is_relevant": false}}]
+"""
+
 # --- Gemini Consumer Product Full Analysis Prompt Configuration ---
 # Ensure all textual output within the JSON is requested in ENGLISH
 GEMINI_ANALYSIS_PROMPT_TEMPLATE = """
@@ -37,6 +56,42 @@ The requested JSON structure is as follows, AND ALL STRING VALUES WITHIN IT MUST
 {json_structure_request}
 """
 
+# --- Per-video details, sent after the video when the analysis instructions are a cached prefix ---
+GEMINI_ANALYSIS_VIDEO_DETAILS_TEMPLATE = """
+Video details:
+- Video URL: {video_url}
+- Video title: "{video_title}"
+- Channel name: "{channel_name}"
+- Product: "{product_name}"
+Analyze the video above for this product, following the instructions and the JSON structure you were given, and copy these details into 'video_metadata'.
+"""
+
+# --- Segment note, appended to the full analysis prompt when a long video is analyzed in time windows ---
+GEMINI_ANALYSIS_SEGMENT_NOTE_TEMPLATE = """
+IMPORTANT: You are given only part of the video, from {segment_start} to {segment_end} (segment {segment_number} of {segment_count}).
+Base your analysis ONLY on this part. Other parts are analyzed separately and the results are combined afterwards, so:
+- Only list features, comparisons, prices and non-verbal cues that actually appear in this part.
+- 'overall_assessment' describes the reviewer's opinion as expressed in this part; if no verdict is given here, say so in 'summary_review'.
+- Do not guess what is said in the rest of the video.
+"""
+
+# --- Gemini Multi-Product Full Analysis Prompt (one request for a video that covers several configured products) ---
+GEMINI_MULTI_PRODUCT_ANALYSIS_PROMPT_TEMPLATE = """
+Analyze the provided YouTube video (URL: {video_url}). It covers SEVERAL consumer products (typically a comparison or a roundup), and we need a separate review analysis for EACH of these products:
+{numbered_product_list}
+The video may be in any language that you understand.
+However, ALL extracted information and your entire response MUST be structured EXCLUSIVELY in JSON format, AND ALL TEXTUAL CONTENT WITHIN THE JSON (e.g., summaries, comments, sentiments, feature names, quotes) MUST BE IN ENGLISH.
+
+For each product, analyze the video from that product's point of view only: what the reviewer says and shows about THAT product, its features, its price, and how it fares against the other products in the video (use 'comparison_context.vs_competitors' for this).
+Be as specific as possible, basing your analysis ONLY on the content of the video, INCLUDING VISUAL AND AUDITORY CUES from the reviewer (non-verbal cues should refer to the moments when that product is being discussed).
+If a piece of information is not explicitly mentioned or clearly deducible from the video,
+use the value null for non-string fields, an empty string \"\" for textual fields (unless specified otherwise for ENUMs), and an empty list [] for list fields.
+
+Return a single JSON object of the form {{"analyses": [ANALYSIS_1, ANALYSIS_2, ...]}} with exactly one analysis per product above, in the same order.
+Each analysis MUST follow the structure below, with 'video_metadata.product_reviewed' set to the product name exactly as written in the list. ALL STRING VALUES MUST BE IN ENGLISH:
+{json_structure_request}
+"""
+
 GEMINI_JSON_STRUCTURE_REQUEST = """
 {{
     "video_metadata": {{
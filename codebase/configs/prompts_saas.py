@@ -47,6 +47,39 @@ Is this video LIKELY to contain enough substantive evaluative commentary or opin
 Respond with ONLY "YES_SUITABLE" or "NO_UNSUITABLE".
 """
 
+# --- Gemini SaaS Product Fused Screening Prompt (Tier 1 + Tier 2 in one request) ---
+# Used when a product's "screening_mode" is "fused". Same categories and suitability rules as the two prompts above.
+GEMINI_SAAS_FUSED_SCREENING_PROMPT_TEMPLATE = """
+Product of Interest: "{saas_product_name}"
+Video Title: "{video_title}"
+Channel Title: "{channel_title}"
+Video Description (snippet): "{video_description_snippet}"
+
+Based on the information above, please perform three tasks:
+1.  Is this video PRIMARILY about the "{saas_product_name}"? (true or false)
+2.  If true, what is the MOST LIKELY primary type of this video? Choose ONE from the following categories:
+    - "In-depth Review/Critique"
+    - "Feature Showcase/Demo"
+    - "User Experience/Testimonial"
+    - "Comparison"
+    - "Tutorial/How-To"
+    - "News/Announcement"
+    - "Marketing/Advertisement"
+    - "Webinar/Presentation"
+    - "Other"
+    - "Not Applicable"
+3.  If true, is this video LIKELY to contain enough substantive evaluative commentary or opinion to be useful for a detailed sentiment and feature analysis?
+    The goal is to understand opinions on features, ease of use, pricing, support, pros, cons, and overall user experience.
+    - "In-depth Review/Critique", "User Experience/Testimonial", and "Comparison" videos are highly suitable.
+    - "Feature Showcase/Demo" and "Webinar/Presentation" are suitable if they go beyond pure feature listing and include evaluative context, user benefits, or address pain points.
+    - "Tutorial/How-To" videos are suitable ONLY if they embed significant evaluative commentary or opinions on the software's aspects, not just instructional steps.
+    - "Marketing/Advertisement" and "News/Announcement" are generally UNSUITABLE unless they contain substantial, verifiable user testimonials or detailed competitive differentiators that reflect user sentiment.
+
+Respond ONLY with a JSON object with three keys: "is_relevant_to_product" (boolean), "video_type" (string from the list above) and "is_suitable_for_analysis" (boolean, false whenever "is_relevant_to_product" is false).
+Ensure the "video_type" string exactly matches one of the provided categories.
+Example: {{"is_relevant_to_product": true, "video_type": "In-depth Review/Critique", "is_suitable_for_analysis": true}}
+"""
+
 # --- Gemini SaaS Product Full Analysis JSON Structure Request ---
 # The main analysis prompt (GEMINI_ANALYSIS_PROMPT_TEMPLATE from prompts_consumer.py) can be reused,
 # but it will be formatted with THIS specific JSON structure request for SaaS.
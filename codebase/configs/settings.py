@@ -5,8 +5,16 @@ from dotenv import load_dotenv
 load_dotenv() # Load .env file from the root of the project (where main.py is likely run)
 
 # --- API Keys ---
-YOUTUBE_API_KEY = os.getenv("YOUTUBE_API_KEY")
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+# Several keys per service can be given, comma-separated, in YOUTUBE_API_KEYS / GEMINI_API_KEYS (else the single
+# *_API_KEY is used). They form a credential pool (core/credential_pool.py): each call goes to the least-loaded
+# healthy key, and a key that gets CREDENTIAL_QUARANTINE_AFTER_ERRORS rate-limit / quota errors in a row is left
+# out for CREDENTIAL_QUARANTINE_SECONDS (a YouTube key out of daily quota: until the quota resets).
+YOUTUBE_API_KEYS = [key.strip() for key in (os.getenv("YOUTUBE_API_KEYS") or os.getenv("YOUTUBE_API_KEY") or "").split(",") if key.strip()]
+GEMINI_API_KEYS = [key.strip() for key in (os.getenv("GEMINI_API_KEYS") or os.getenv("GEMINI_API_KEY") or "").split(",") if key.strip()]
+YOUTUBE_API_KEY = YOUTUBE_API_KEYS[0] if YOUTUBE_API_KEYS else None # First key of the pool
+GEMINI_API_KEY = GEMINI_API_KEYS[0] if GEMINI_API_KEYS else None # First key of the pool; the one genai.configure() uses
+CREDENTIAL_QUARANTINE_AFTER_ERRORS = 3
+CREDENTIAL_QUARANTINE_SECONDS = 600
 
 # --- Application Mode ---
 APP_MODE = os.getenv("APP_MODE", "PRODUCTION").upper()
@@ -25,16 +33,199 @@ else:
     DATABASE_NAME = f"{_DATABASE_BASE_NAME}_mongo"  # e.g., "reviews_analysis_prod_mongo"
                                                       # Or just _mongo if you prefer the original name for prod
 
+# MongoDB connection: one shared MongoClient (thread-safe, pooled) serves every thread of the run
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017/")
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "50")) # Should cover PHASE1_MAX_WORKERS / pipeline stage workers
+MONGO_SERVER_SELECTION_TIMEOUT_MS = 5000
+MONGO_CONNECT_TIMEOUT_MS = 5000
+MONGO_SOCKET_TIMEOUT_MS = 30000
+
+# Stored Gemini screening verdicts (relevance_verdicts collection) expire after this many days; None keeps them forever
+RELEVANCE_VERDICT_TTL_DAYS = 90
+
 # --- YouTube Search Parameters ---
 DEFAULT_MAX_VIDEO_RESULTS_PER_QUERY = 5 # For curated reviewer search
-SAAS_INITIAL_SEARCH_MAX_RESULTS = 50 # For SaaS CRM search
+SAAS_INITIAL_SEARCH_MAX_RESULTS = 150 # For SaaS CRM search: candidates are paged in lazily and paging stops once enough are suitable
+SAAS_SEARCH_MAX_QUOTA_UNITS = 300 # Max YouTube quota spent on one SaaS product's search (each results page costs SEARCH_LIST_QUOTA_COST)
 SAAS_MAX_VIDEOS_TO_FULLY_ANALYZE = 7 # For each product
+# SaaS candidate screening: "two_tier" (Tier 1 relevance/type, then Tier 2 suitability) or "fused" (one request).
+# Can be overridden per product with a "screening_mode" key in product_catalog.py.
+SAAS_DEFAULT_SCREENING_MODE = "two_tier"
 
 VIDEO_ORDER_PREFERENCE = 'relevance'
 
+# Curated-reviewer discovery: "search" runs one search.list (100 quota units) per product x reviewer;
+# "channel_index" lists each reviewer's uploads once per run (1 unit per 50 videos) and matches every product locally.
+CONSUMER_DISCOVERY_MODE = os.getenv("CONSUMER_DISCOVERY_MODE", "search").lower()
+CHANNEL_INDEX_MAX_VIDEOS_PER_CHANNEL = 1000 # Most recent uploads indexed per reviewer
+CHANNEL_INDEX_PUBLISHED_AFTER = "2019-01-01T00:00:00Z" # Older uploads are not indexed (oldest products in the catalog are from 2019)
+
+# --- YouTube Quota Budget (core/youtube_quota.py) ---
+# Units charged per call by the YouTube Data API v3 (search pages are by far the most expensive)
+YOUTUBE_QUOTA_COSTS = {
+    "search.list": 100,
+    "videos.list": 1,
+    "channels.list": 1,
+    "playlistItems.list": 1,
+}
+SEARCH_LIST_QUOTA_COST = YOUTUBE_QUOTA_COSTS["search.list"] # Per search.list call (one page of up to 50 results)
+# Usage is tracked per Pacific-time day (when Google resets the quota) in MongoDB; calls that would exceed the budget are refused
+# Defaults to the standard 10,000 units per pooled key
+YOUTUBE_DAILY_QUOTA_BUDGET = int(os.getenv("YOUTUBE_DAILY_QUOTA_BUDGET", str(10000 * max(1, len(YOUTUBE_API_KEYS)))))
+# Before running, Phase 1 estimates each product's discovery cost. If True, products that don't fit in what's left
+# of today's budget are deferred (skipped; found again by a later run) instead of failing halfway through.
+YOUTUBE_QUOTA_DEFER_UNAFFORDABLE_PRODUCTS = False
+
+# Incremental discovery: remember per (channel or search query, product) how far discovery got and only ask YouTube
+# for newer videos next time (publishedAfter). `python main.py --full-rescan` ignores the stored watermarks for one run.
+# While enabled, discovery searches are sorted by date (newest first) instead of VIDEO_ORDER_PREFERENCE / relevance.
+DISCOVERY_WATERMARKS_ENABLED = True
+DISCOVERY_WATERMARK_OVERLAP_HOURS = 48 # Re-scan this much before the watermark: search indexing of new uploads can lag
+
+# Batched videos.list enrichment (duration, views, captions, language) used by the CATEGORY_VIDEO_FILTERS in product_catalog.py
+VIDEO_ENRICHMENT_ENABLED = True
+
+# --- YouTube Response Cache (core/youtube_cache.py) ---
+# Identical YouTube Data API requests are answered from a local SQLite file until their TTL expires,
+# so re-running Phase 1 (after a crash, a prompt change, ...) doesn't spend quota on the same searches again.
+YOUTUBE_CACHE_ENABLED = True
+YOUTUBE_CACHE_BYPASS = os.getenv("YOUTUBE_CACHE_BYPASS", "false").lower() in ("1", "true", "yes") # Ignore cached entries (still refreshes them)
+YOUTUBE_CACHE_PATH = os.path.join("cache", "youtube_responses.sqlite")
+YOUTUBE_CACHE_MAX_ENTRIES = 20000 # Least recently used entries are evicted beyond this
+YOUTUBE_CACHE_TTL_SECONDS = { # Endpoints not listed here are never cached
+    "search.list": 24 * 3600,
+    "channels.list": 7 * 24 * 3600, # Uploads playlist IDs practically never change
+    "playlistItems.list": 6 * 3600, # New uploads should show up the same day
+    "videos.list": 24 * 3600, # View counts drift slowly; a day-old count is fine for thresholds
+}
+
+# --- Relevance Screening ---
+GEMINI_RELEVANCE_BATCH_SIZE = 20 # Max videos classified per batched relevance request
+
+# Local pre-filter (core/relevance_prefilter.py): scores title/description before any Gemini relevance call.
+# score >= ACCEPT -> relevant without asking Gemini (consumer only); score <= REJECT -> dropped; otherwise Gemini decides.
+# REJECT is below 0 so only negative evidence (a negative pattern, a different model variant) drops a video: a title
+# with no signal at all scores 0 and goes to Gemini.
+PREFILTER_ENABLED = True
+PREFILTER_ACCEPT_SCORE = 6
+PREFILTER_REJECT_SCORE = -1
+PREFILTER_REVIEW_TERMS = [
+    "review", "full review", "in-depth", "long term", "months later",          # English
+    "recensione", "prova",                                                     # Italian
+    "test", "im test",                                                         # German
+    "análisis", "analisis", "reseña",                                          # Spanish
+    "avis", "critique",                                                        # French
+]
+# Words that turn one model into another ("15 Pro" vs "15 Pro Max"); a title that only names the product followed by one of these is penalised
+PREFILTER_MODEL_VARIANT_TOKENS = ["pro", "max", "plus", "ultra", "mini", "lite", "fe", "fold", "flip", "edge"]
+# Regexes (case-insensitive) matched against the title only; products can add their own via "negative_patterns"
+# (matched against the description too if the product sets "negative_patterns_in_description": True)
+PREFILTER_NEGATIVE_PATTERNS = [
+    r"#shorts?\b",
+    r"^(?!.*\b(review|recensione|test|análisis|avis)\b).*\bunboxing\b", # Title says unboxing but nothing about a review
+    r"\b(leaks?|leaked|rumou?rs?|renders?)\b",
+    r"\b(news|weekly recap|tech news|keynote recap|event recap)\b",
+    r"\b(giveaway|sorteo|case review|screen protector)\b",
+]
+
 # --- Gemini Model Configuration ---
 GEMINI_MODEL_NAME = "gemini-2.0-flash" # "gemini-1.5-flash-latest"
 
+# --- Gemini Model Routing ---
+# Model per call type ("consumer_relevance", "consumer_relevance_batch", "consumer_analysis", "consumer_segment_analysis",
+# "consumer_multi_product_analysis", "saas_tier1", "saas_tier2", "saas_fused", "saas_analysis", "synthesis");
+# call types not listed use GEMINI_MODEL_NAME. E.g. {"synthesis": "gemini-2.5-pro"}
+GEMINI_MODEL_ROUTING = {}
+
+# Cascade for screening calls: GEMINI_CASCADE_LIGHT_MODEL_NAME answers first; answers that can't be parsed or whose
+# confidence (exp of the response's avg_logprobs) is under GEMINI_CASCADE_MIN_CONFIDENCE are asked again to the routed model.
+GEMINI_CASCADE_ENABLED = os.getenv("GEMINI_CASCADE_ENABLED", "false").lower() in ("1", "true", "yes")
+GEMINI_CASCADE_LIGHT_MODEL_NAME = "gemini-2.0-flash-lite"
+GEMINI_CASCADE_CALL_TYPES = ["consumer_relevance", "consumer_relevance_batch", "saas_tier1", "saas_tier2", "saas_fused"]
+GEMINI_CASCADE_MIN_CONFIDENCE = 0.85
+
+# When a call still gets 429s after MAX_API_RETRIES, it is re-sent to the fallback model, and calls routed to the
+# exhausted model go to the fallback model for GEMINI_FALLBACK_COOLDOWN_SECONDS. Empty: no fallback.
+GEMINI_FALLBACK_MODEL_NAME = os.getenv("GEMINI_FALLBACK_MODEL_NAME", "")
+GEMINI_FALLBACK_COOLDOWN_SECONDS = 300
+
+# --- Gemini Rate Limiting ---
+# Shared by every Gemini call in the process (see core/rate_limiter.AdaptiveRateLimiter), one limiter per pooled key.
+# Set these to one key's (project's) quota; the limiter adapts downwards on 429s and climbs back up on success.
+GEMINI_REQUESTS_PER_MINUTE = int(os.getenv("GEMINI_REQUESTS_PER_MINUTE", "15"))
+GEMINI_TOKENS_PER_MINUTE = int(os.getenv("GEMINI_TOKENS_PER_MINUTE", "1000000"))
+GEMINI_ESTIMATED_TOKENS_PER_VIDEO = 150000 # Pre-call estimate for one video part (~10 min of video at default resolution)
+
+# --- Gemini Token Accounting (core/gemini_usage.py) ---
+# Every call's usage_metadata, latency and retries are tallied per call type and product; run totals go to gemini_usage_runs.
+# With the pre-flight check on, prompts are measured with count_tokens (one extra, free API call) before sending;
+# prompts over GEMINI_MAX_PROMPT_TOKENS are not sent. Oversized synthesis batches are then either split into
+# partial syntheses that are merged in a final call ("split") or rejected ("reject").
+GEMINI_PREFLIGHT_TOKEN_COUNT = os.getenv("GEMINI_PREFLIGHT_TOKEN_COUNT", "false").lower() in ("1", "true", "yes")
+GEMINI_MAX_PROMPT_TOKENS = 1000000 # gemini-2.0-flash accepts 1,048,576 input tokens; keep some headroom
+GEMINI_OVERSIZED_SYNTHESIS = "split" # "split" or "reject"
+
+# Phase 2 reports: stream synthesis responses and write the textual summary to the report file as it is generated
+GEMINI_SYNTHESIS_STREAMING = os.getenv("GEMINI_SYNTHESIS_STREAMING", "false").lower() in ("1", "true", "yes")
+
+# --- Gemini Record/Replay Cache (core/gemini_cache.py) ---
+# "passthrough" (off), "record" (call Gemini, store every answer), "replay" (serve stored answers, record misses),
+# "replay_strict" (stored answers only, a miss is an error: offline, deterministic re-runs of Phase 1 / Phase 2).
+GEMINI_CACHE_MODE = os.getenv("GEMINI_CACHE_MODE", "passthrough").lower()
+GEMINI_CACHE_PATH = os.path.join("cache", "gemini_responses.sqlite")
+GEMINI_CACHE_MAX_ENTRIES = 5000 # Least recently used recordings are evicted beyond this
+
+# --- Gemini Context Caching of Analysis Prompts (core/gemini_prompt_cache.py) ---
+# Full analyses send the instructions + JSON structure (identical for every video) as a cached-content prefix and
+# only the video and its details per request. Caches live GEMINI_PROMPT_CACHE_TTL_SECONDS, extended while in use and
+# replaced when the templates change. Where caching isn't available the prefix is sent inline.
+GEMINI_PROMPT_CACHE_ENABLED = os.getenv("GEMINI_PROMPT_CACHE_ENABLED", "false").lower() in ("1", "true", "yes")
+GEMINI_PROMPT_CACHE_TTL_SECONDS = 3600
+GEMINI_PROMPT_CACHE_REFRESH_MARGIN_SECONDS = 300
+
+# --- Segmented Analysis of Long Videos (core/video_segments.py) ---
+# Consumer reviews at least VIDEO_SEGMENT_MIN_DURATION_SECONDS long (duration from enrichment) are analyzed as
+# time windows (video start/end offsets) sent concurrently, then merged into a single analysis without another call.
+# Needs a google-ai-generativelanguage whose Part has `video_metadata` (not the 0.6.x pinned by google-generativeai 0.8.x);
+# without it long videos are analyzed whole.
+VIDEO_SEGMENTED_ANALYSIS_ENABLED = os.getenv("VIDEO_SEGMENTED_ANALYSIS_ENABLED", "false").lower() in ("1", "true", "yes")
+VIDEO_SEGMENT_MIN_DURATION_SECONDS = 1200
+VIDEO_SEGMENT_LENGTH_SECONDS = 600 # Target window length; windows are equal so the last one isn't a short leftover
+VIDEO_SEGMENT_MAX_SEGMENTS = 4
+VIDEO_SEGMENT_OVERLAP_SECONDS = 15 # Each window runs this far into the next one
+VIDEO_SEGMENT_FPS = 0.5 # Frames sampled per second in a window (Gemini's default is 1); None keeps the default
+
+# --- Offline Batch Analysis (core/gemini_batch.py) ---
+# `main.py --gemini-batch-submit` discovers and screens as usual but writes the full analyses' Gemini requests to a
+# JSONL job file handed to the batch backend; `main.py --gemini-batch-ingest` later saves the results.
+# "local": nothing is sent, the results JSONL is expected next to the job file (offline runs, downloaded batch outputs).
+GEMINI_BATCH_BACKEND = "local"
+GEMINI_BATCH_DIR = os.path.join("cache", "gemini_batches")
+
+# --- Phase 1 Execution ---
+# "sequential" analyses one video at a time (original behaviour).
+# "concurrent" runs full analyses on a bounded worker pool while discovery/filtering continues.
+# "pipeline" runs discovery -> dedup -> relevance -> full analysis -> persist as stages joined by bounded queues.
+PHASE1_EXECUTION_MODE = os.getenv("PHASE1_EXECUTION_MODE", "sequential").lower()
+PHASE1_MAX_WORKERS = int(os.getenv("PHASE1_MAX_WORKERS", "4"))
+PHASE1_MAX_PENDING_TASKS = PHASE1_MAX_WORKERS * 2 # Discovery blocks once this many analyses are queued
+
+# Worker threads per stage in "pipeline" mode. Each worker thread gets its own YouTube service object.
+PHASE1_PIPELINE_STAGE_WORKERS = {
+    "discovery": 1,
+    "dedup": 1,
+    "relevance": 2,
+    "analysis": PHASE1_MAX_WORKERS,
+    "persist": 1,
+}
+PHASE1_PIPELINE_QUEUE_SIZE = 8 # Max items waiting in front of each stage (backpressure bound)
+
+# Cross-product analysis (consumer products): when the same video passes screening for several product configs
+# (e.g. "S24 Ultra vs iPhone 15 Pro Max"), analyze it once with a multi-product prompt and save one document per product.
+# Analyses are then held back until screening has finished, so they start later than without it.
+PHASE1_CROSS_PRODUCT_ANALYSIS = os.getenv("PHASE1_CROSS_PRODUCT_ANALYSIS", "false").lower() in ("1", "true", "yes")
+PHASE1_CROSS_PRODUCT_MAX_PRODUCTS = 4 # Products per multi-product request; larger groups are split
+
 # --- Test Mode Specific Limits ---
 # These are only used if IS_TEST_MODE is True (defined above)
 TEST_MODE_CATEGORIES = ["smartphones", "saas_crm"]
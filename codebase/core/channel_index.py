@@ -0,0 +1,76 @@
+import threading
+import logging
+import config
+from core import youtube_client, relevance_prefilter
+
+logger = logging.getLogger(__name__)
+
+
+class ChannelUploadsIndex:
+    """
+    Local index of curated reviewers' uploads, built once per channel per run from the uploads playlist
+    (a few quota units per channel) instead of one 100-unit search.list per product x reviewer.
+    Every product is matched against the index locally: an inverted token index narrows the uploads down
+    to those containing a product phrase, which are then ranked with the pre-filter score.
+    """
+
+    def __init__(self, max_videos_per_channel, published_after=None):
+        self.max_videos_per_channel = max_videos_per_channel
+        self.published_after = published_after
+        self._channels = {} # channel_id -> {"videos": [video_info], "tokens": {token: set(video positions)}}
+        self._channel_locks = {}
+        self._lock = threading.Lock()
+
+    def _channel_lock(self, channel_id):
+        with self._lock:
+            return self._channel_locks.setdefault(channel_id, threading.Lock())
+
+    def _get_channel(self, channel_id):
+        """Returns the indexed uploads of a channel, listing them on first use (other threads wait for that listing)."""
+        with self._channel_lock(channel_id):
+            if channel_id not in self._channels:
+                videos = list(youtube_client.iter_channel_uploads(
+                    channel_id,
+                    max_videos=self.max_videos_per_channel,
+                    published_after=self.published_after
+                ))
+                tokens = {}
+                for position, video_meta in enumerate(videos):
+                    for token in set(relevance_prefilter.normalize_tokens(f"{video_meta['title']} {video_meta['description']}")):
+                        tokens.setdefault(token, set()).add(position)
+                self._channels[channel_id] = {"videos": videos, "tokens": tokens}
+                logger.info(f"[CHANNEL INDEX] Indexed {len(videos)} uploads of channel {channel_id}.")
+            return self._channels[channel_id]
+
+    def find_candidates(self, product_config, channel_id, max_results=config.DEFAULT_MAX_VIDEO_RESULTS_PER_QUERY):
+        """
+        Returns up to `max_results` uploads of `channel_id` that mention the product, best pre-filter score first
+        (ties: newest first). Uploads from before the product's release year are ignored.
+        """
+        channel = self._get_channel(channel_id)
+        candidate_positions = set()
+        for phrase in relevance_prefilter.product_phrases(product_config):
+            phrase_tokens = relevance_prefilter.normalize_tokens(phrase)
+            if phrase_tokens:
+                candidate_positions |= set.intersection(*(channel["tokens"].get(token, set()) for token in phrase_tokens))
+
+        earliest_year = str(product_config['year']) if product_config.get('year') else ""
+        scored_candidates = []
+        for position in candidate_positions:
+            video_meta = channel["videos"][position]
+            if video_meta['published_at'][:4] < earliest_year:
+                continue
+            score, _ = relevance_prefilter.score_video(product_config, video_meta)
+            if score > config.PREFILTER_REJECT_SCORE:
+                scored_candidates.append((score, video_meta['published_at'], video_meta))
+
+        scored_candidates.sort(key=lambda candidate: (candidate[0], candidate[1]), reverse=True)
+        candidates = [video_meta for _, _, video_meta in scored_candidates[:max_results]]
+        logger.info(f"[CHANNEL INDEX] {len(candidates)} candidate(s) for '{product_config['name']}' in channel {channel_id} ({len(candidate_positions)} uploads mention it).")
+        return candidates
+
+
+uploads_index = ChannelUploadsIndex(
+    max_videos_per_channel=config.CHANNEL_INDEX_MAX_VIDEOS_PER_CHANNEL,
+    published_after=config.CHANNEL_INDEX_PUBLISHED_AFTER
+)
@@ -0,0 +1,84 @@
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class SharedClientProvider:
+    """
+    One client for the whole process, created on first use under a lock so concurrent first calls build it once.
+    For clients that are safe to share between threads (MongoClient and its connection pool, the Gemini model).
+    The factory returns the client, or None on failure; failures are not cached, the next `get()` tries again.
+    """
+
+    def __init__(self, name, factory):
+        self.name = name
+        self._factory = factory
+        self._client = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        client = self._client
+        if client is not None:
+            return client
+        with self._lock:
+            if self._client is None:
+                self._client = self._factory()
+            return self._client
+
+    def reset(self, close=None):
+        """Drops the current client (calling `close(client)` first if given); the next `get()` builds a new one."""
+        with self._lock:
+            client, self._client = self._client, None
+        if client is not None and close is not None:
+            try:
+                close(client)
+            except Exception as e:
+                logger.warning(f"Could not cleanly close the {self.name} client: {e}")
+
+
+class ThreadLocalClientProvider:
+    """
+    One client per thread, created on the thread's first `get()`.
+    For clients that must not be shared between threads, like googleapiclient services (their httplib2 connection isn't thread-safe).
+    Failures are not cached, as in SharedClientProvider.
+    """
+
+    def __init__(self, name, factory):
+        self.name = name
+        self._factory = factory
+        self._local = threading.local()
+        self._created = 0
+        self._count_lock = threading.Lock()
+
+    def get(self):
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self._factory()
+            if client is not None:
+                self._local.client = client
+                with self._count_lock:
+                    self._created += 1
+                logger.debug(f"Created {self.name} client #{self._created} for thread '{threading.current_thread().name}'.")
+        return client
+
+    @property
+    def created_count(self):
+        return self._created
+
+
+def warm_up_clients(checks):
+    """
+    Builds the clients up front so a bad key, an unreachable database or a missing dependency stops the run
+    at startup rather than in the middle of Phase 1.
+    checks: (name, getter) pairs; a getter returns the client or None on failure.
+    Returns True if every client could be created.
+    """
+    all_ready = True
+    for name, getter in checks:
+        if getter() is None:
+            logger.critical(f"Warm-up: the {name} client could not be initialized.")
+            all_ready = False
+        else:
+            logger.info(f"Warm-up: {name} client ready.")
+    return all_ready
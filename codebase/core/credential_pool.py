@@ -0,0 +1,143 @@
+import time
+import threading
+import logging
+from collections import deque
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+_RATE_WINDOW_SECONDS = 60 # Calls counted for the calls/minute load figure
+
+
+class PooledCredential:
+    """One API key of a pool with its own counters. `rate_limiter` is set when the pool was given a limiter factory."""
+
+    def __init__(self, index, key, rate_limiter=None):
+        self.index = index
+        self.key = key
+        self.label = f"key #{index + 1} (...{key[-4:]})" # Never log whole keys
+        self.rate_limiter = rate_limiter
+        self.in_flight = 0
+        self.calls = 0
+        self.units = 0 # Service-specific quota units: YouTube quota units, Gemini estimated tokens
+        self.rate_limited = 0
+        self.quarantines = 0
+        self.consecutive_errors = 0
+        self.quarantined_until = 0.0
+        self._recent_calls = deque()
+
+    def calls_last_minute(self, now):
+        while self._recent_calls and self._recent_calls[0] <= now - _RATE_WINDOW_SECONDS:
+            self._recent_calls.popleft()
+        return len(self._recent_calls)
+
+    def load(self, now):
+        """Sort key for routing: calls in flight, then calls in the last minute, then units spent this run."""
+        return (self.in_flight, self.calls_last_minute(now), self.units)
+
+
+class CredentialPool:
+    """
+    Several API keys for one service. Every call is routed to the least-loaded healthy key (`pick`) and counted
+    against it (`calling`); a key that gets `quarantine_after_errors` rate-limit / quota errors in a row is left out
+    of routing for `quarantine_seconds`, and one whose error says how long it is out (an exhausted daily quota) is left
+    out right away, for that long. If every key is quarantined, `pick` returns the one that recovers first. Pool methods accept None for a credential (calls made outside the pool) and ignore it.
+    Safe to share between threads.
+    """
+
+    def __init__(self, service, keys, quarantine_after_errors=3, quarantine_seconds=600, rate_limiter_factory=None):
+        self.service = service
+        self.quarantine_after_errors = quarantine_after_errors
+        self.quarantine_seconds = quarantine_seconds
+        self.credentials = [
+            PooledCredential(index, key, rate_limiter_factory(index) if rate_limiter_factory else None)
+            for index, key in enumerate(keys)
+        ]
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.credentials)
+
+    def _is_healthy(self, credential, now):
+        return credential.quarantined_until <= now
+
+    def pick(self, exclude=None):
+        """Least-loaded healthy key (other than `exclude`, if another one is healthy), or None if the pool is empty."""
+        with self._lock:
+            now = time.monotonic()
+            healthy = [credential for credential in self.credentials if self._is_healthy(credential, now)]
+            if exclude is not None and len(healthy) > 1:
+                healthy = [credential for credential in healthy if credential is not exclude]
+            if healthy:
+                return min(healthy, key=lambda credential: credential.load(now))
+            return min(self.credentials, key=lambda credential: credential.quarantined_until, default=None)
+
+    def healthy_count(self, exclude=None):
+        with self._lock:
+            now = time.monotonic()
+            return sum(1 for credential in self.credentials if credential is not exclude and self._is_healthy(credential, now))
+
+    def is_quarantined(self, credential):
+        with self._lock:
+            return credential is not None and not self._is_healthy(credential, time.monotonic())
+
+    @contextmanager
+    def calling(self, credential, units=0):
+        """Counts one call (and its quota `units`) against `credential` while it is in flight."""
+        if credential is None:
+            yield
+            return
+        with self._lock:
+            credential.in_flight += 1
+            credential.calls += 1
+            credential.units += units
+            credential._recent_calls.append(time.monotonic())
+        try:
+            yield
+        finally:
+            with self._lock:
+                credential.in_flight -= 1
+
+    def report_success(self, credential):
+        if credential is None:
+            return
+        with self._lock:
+            credential.consecutive_errors = 0
+
+    def report_rate_limited(self, credential, quarantine_seconds=None):
+        """
+        Records a 429 / quota error on `credential`. Once it has had `quarantine_after_errors` in a row, the key is
+        quarantined for the pool's `quarantine_seconds`. With `quarantine_seconds` (an error that is a verdict, like an
+        exhausted daily quota) it is quarantined right away, for that long. Returns True if the key is now quarantined.
+        """
+        if credential is None:
+            return False
+        with self._lock:
+            now = time.monotonic()
+            credential.rate_limited += 1
+            credential.consecutive_errors += 1
+            if quarantine_seconds is None and credential.consecutive_errors < self.quarantine_after_errors:
+                return not self._is_healthy(credential, now)
+            quarantine_seconds = quarantine_seconds or self.quarantine_seconds
+            was_healthy = self._is_healthy(credential, now)
+            credential.quarantined_until = max(credential.quarantined_until, now + quarantine_seconds)
+            consecutive_errors, credential.consecutive_errors = credential.consecutive_errors, 0
+            if not was_healthy: # Already out (e.g. the last key, still tried): just extended
+                return True
+            credential.quarantines += 1
+            healthy_left = sum(1 for other in self.credentials if self._is_healthy(other, now))
+        logger.warning(
+            f"[{self.service.upper()} KEYS] Quarantined {credential.label} for {quarantine_seconds:.0f}s after "
+            f"{consecutive_errors} rate-limit / quota error(s) in a row; {healthy_left} of {len(self.credentials)} key(s) left."
+        )
+        return True
+
+    def log_summary(self):
+        with self._lock:
+            now = time.monotonic()
+            for credential in self.credentials:
+                status = "healthy" if self._is_healthy(credential, now) else f"quarantined for {credential.quarantined_until - now:.0f}s"
+                logger.info(
+                    f"[{self.service.upper()} KEYS] {credential.label}: {credential.calls} calls, {credential.units} units, "
+                    f"{credential.rate_limited} rate-limit / quota errors, {credential.quarantines} quarantines, {status}."
+                )
@@ -0,0 +1,76 @@
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class SequentialTaskRunner:
+    """Runs every submitted task immediately in the calling thread (the original Phase 1 behaviour)."""
+
+    def submit(self, task_fn, *args, **kwargs):
+        try:
+            task_fn(*args, **kwargs)
+        except Exception as e:
+            logger.error(f"Task {getattr(task_fn, '__name__', task_fn)} failed: {e}")
+
+    def wait_all(self):
+        pass
+
+    def shutdown(self):
+        pass
+
+
+class BoundedThreadPoolTaskRunner:
+    """
+    Runs submitted tasks on a fixed-size worker pool.
+    `ThreadPoolExecutor` queues work without limit, so submissions are gated by a semaphore:
+    once `max_pending_tasks` tasks are queued or running, `submit` blocks the producer
+    (e.g. the discovery loop in main.py) until a worker frees a slot.
+    """
+
+    def __init__(self, max_workers, max_pending_tasks=None, thread_name_prefix="phase1-worker"):
+        self.max_workers = max(1, int(max_workers))
+        self.max_pending_tasks = max(self.max_workers, int(max_pending_tasks or self.max_workers * 2))
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=thread_name_prefix)
+        self._slots = threading.BoundedSemaphore(self.max_pending_tasks)
+        self._futures = []
+        self._futures_lock = threading.Lock()
+        logger.info(f"Task runner started with {self.max_workers} workers (max {self.max_pending_tasks} pending tasks).")
+
+    def _run_task(self, task_fn, args, kwargs):
+        try:
+            return task_fn(*args, **kwargs)
+        except Exception as e:
+            logger.error(f"Task {getattr(task_fn, '__name__', task_fn)} failed: {e}")
+            return None
+        finally:
+            self._slots.release()
+
+    def submit(self, task_fn, *args, **kwargs):
+        self._slots.acquire() # Backpressure: blocks while the pool is saturated
+        future = self._executor.submit(self._run_task, task_fn, args, kwargs)
+        with self._futures_lock:
+            self._futures = [f for f in self._futures if not f.done()]
+            self._futures.append(future)
+        return future
+
+    def wait_all(self):
+        """Blocks until every task submitted so far has finished."""
+        with self._futures_lock:
+            pending = list(self._futures)
+        for future in pending:
+            future.result()
+
+    def shutdown(self):
+        self.wait_all()
+        self._executor.shutdown(wait=True)
+
+
+def create_task_runner(execution_mode, max_workers, max_pending_tasks=None):
+    """Returns the task runner for the configured Phase 1 execution mode ('sequential' or 'concurrent')."""
+    if execution_mode == "concurrent":
+        return BoundedThreadPoolTaskRunner(max_workers=max_workers, max_pending_tasks=max_pending_tasks)
+    if execution_mode != "sequential":
+        logger.warning(f"Unknown execution mode '{execution_mode}'. Falling back to sequential.")
+    return SequentialTaskRunner()
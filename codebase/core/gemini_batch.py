@@ -0,0 +1,209 @@
+import os
+import json
+import uuid
+import threading
+import logging
+from datetime import datetime, timezone
+import config
+from core.gemini_cache import _to_key_material, CachedGeminiResponse
+from core.gemini_usage import gemini_usage
+from core.gemini_prompt_cache import cached_content_name
+
+logger = logging.getLogger(__name__)
+
+# Files of one batch, in GEMINI_BATCH_DIR/<batch_id>/
+_REQUESTS_FILE = "requests.jsonl" # One Gemini request per line, handed to the backend
+_JOBS_FILE = "jobs.jsonl"         # One analysis job per line, with the keys of its requests
+_STATE_FILE = "batch.json"        # Backend, backend reference, submitted / ingested timestamps
+
+
+class BatchBackend:
+    """
+    Where a batch's request file is executed. `submit` hands the file over and returns a reference (stored with
+    the batch); `fetch_results` returns the path of the results JSONL once the batch is done, else None.
+    A results line is {"key": ..., "response": {"text": ..., "usage": {...}}} or {"key": ..., "error": "..."}.
+    """
+    name = None
+
+    def submit(self, batch_id, requests_path):
+        raise NotImplementedError
+
+    def fetch_results(self, batch_id, backend_reference):
+        raise NotImplementedError
+
+
+class LocalFileBatchBackend(BatchBackend):
+    """
+    Nothing is sent anywhere: the batch is done when a `results.jsonl` appears next to its request file, written by
+    whatever executed it (an offline test fixture, a script, or a batch output downloaded by hand).
+    """
+    name = "local"
+
+    def submit(self, batch_id, requests_path):
+        results_path = os.path.join(os.path.dirname(requests_path), "results.jsonl")
+        logger.info(f"[GEMINI BATCH] Batch {batch_id}: requests in '{requests_path}', results expected in '{results_path}'.")
+        return results_path
+
+    def fetch_results(self, batch_id, backend_reference):
+        return backend_reference if os.path.exists(backend_reference) else None
+
+
+BATCH_BACKENDS = {backend.name: backend for backend in (LocalFileBatchBackend,)}
+
+
+def get_batch_backend(name=None):
+    name = name or config.GEMINI_BATCH_BACKEND
+    if name not in BATCH_BACKENDS:
+        raise ValueError(f"Unknown Gemini batch backend '{name}' (expected one of {', '.join(BATCH_BACKENDS)})")
+    return BATCH_BACKENDS[name]()
+
+
+def _batch_path(batch_id, file_name, batch_dir=None):
+    return os.path.join(batch_dir or config.GEMINI_BATCH_DIR, batch_id, file_name)
+
+
+def _read_jsonl(path):
+    with open(path, encoding="utf-8") as jsonl_file:
+        return [json.loads(line) for line in jsonl_file if line.strip()]
+
+
+def _read_state(batch_id, batch_dir=None):
+    with open(_batch_path(batch_id, _STATE_FILE, batch_dir), encoding="utf-8") as state_file:
+        return json.load(state_file)
+
+
+def _write_state(batch_id, state, batch_dir=None):
+    with open(_batch_path(batch_id, _STATE_FILE, batch_dir), "w", encoding="utf-8") as state_file:
+        json.dump(state, state_file, indent=2)
+
+
+def list_batches(pending_only=False, batch_dir=None):
+    """Submitted batch ids, oldest first; with `pending_only`, the ones not ingested yet."""
+    batch_dir = batch_dir or config.GEMINI_BATCH_DIR
+    if not os.path.isdir(batch_dir):
+        return []
+    batches = []
+    for batch_id in os.listdir(batch_dir):
+        if not os.path.exists(_batch_path(batch_id, _STATE_FILE, batch_dir)):
+            continue # Never submitted (the run stopped while writing it)
+        state = _read_state(batch_id, batch_dir)
+        if pending_only and state.get("ingested_at"):
+            continue
+        batches.append((state["submitted_at"], batch_id))
+    return [batch_id for _, batch_id in sorted(batches)]
+
+
+def pending_job_keys(batch_dir=None):
+    """Keys of the analysis jobs waiting in submitted, not yet ingested batches."""
+    job_keys = set()
+    for batch_id in list_batches(pending_only=True, batch_dir=batch_dir):
+        job_keys.update(job["job_key"] for job in _read_jsonl(_batch_path(batch_id, _JOBS_FILE, batch_dir)))
+    return job_keys
+
+
+class AnalysisBatchWriter:
+    """
+    Collects the Gemini requests of deferred analyses into a new batch (request file + job manifest), then submits it.
+    Jobs already waiting in an earlier batch are skipped. Safe to share between threads.
+    """
+
+    def __init__(self, batch_dir=None):
+        self.batch_dir = batch_dir or config.GEMINI_BATCH_DIR
+        self.batch_id = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ") + "-" + uuid.uuid4().hex[:8]
+        self.job_count = 0
+        self.request_count = 0
+        self._pending_job_keys = pending_job_keys(self.batch_dir)
+        self._lock = threading.Lock()
+
+    def add(self, job_key, job_record, calls):
+        """
+        Adds one analysis job: `job_record` (JSON-able) is what ingestion needs to rebuild and save the analysis,
+        `calls` the GeminiCalls its analysis asked for. Returns False if the job is already waiting in a batch.
+        """
+        with self._lock:
+            if job_key in self._pending_job_keys:
+                return False
+            self._pending_job_keys.add(job_key)
+            request_keys = [f"{job_key}#{position}" for position in range(len(calls))]
+            os.makedirs(os.path.join(self.batch_dir, self.batch_id), exist_ok=True)
+            with open(_batch_path(self.batch_id, _REQUESTS_FILE, self.batch_dir), "a", encoding="utf-8") as requests_file:
+                for request_key, call in zip(request_keys, calls):
+                    requests_file.write(json.dumps({
+                        "key": request_key,
+                        "model": getattr(call.model, "model_name", config.GEMINI_MODEL_NAME).split("/")[-1],
+                        "cached_content": cached_content_name(call.model), # Cached prompt prefix, if any (it expires with its TTL)
+                        "contents": _to_key_material(call.contents),
+                        "generation_config": _to_key_material(call.generation_config),
+                        "context_description": call.context_description,
+                        "call_type": call.call_type,
+                        "product": call.product,
+                    }, ensure_ascii=False) + "\n")
+            with open(_batch_path(self.batch_id, _JOBS_FILE, self.batch_dir), "a", encoding="utf-8") as jobs_file:
+                jobs_file.write(json.dumps({"job_key": job_key, "request_keys": request_keys, "job": job_record},
+                                           ensure_ascii=False, default=str) + "\n")
+            self.job_count += 1
+            self.request_count += len(calls)
+        return True
+
+    def submit(self, backend=None):
+        """Hands the request file to the backend. Returns the batch id, or None if no job was added."""
+        if self.job_count == 0:
+            logger.info("[GEMINI BATCH] No analyses were deferred; nothing to submit.")
+            return None
+        backend = backend or get_batch_backend()
+        backend_reference = backend.submit(self.batch_id, _batch_path(self.batch_id, _REQUESTS_FILE, self.batch_dir))
+        _write_state(self.batch_id, {
+            "backend": backend.name,
+            "backend_reference": backend_reference,
+            "job_count": self.job_count,
+            "request_count": self.request_count,
+            "submitted_at": datetime.now(timezone.utc).isoformat(),
+            "ingested_at": None,
+        }, self.batch_dir)
+        logger.info(f"[GEMINI BATCH] Submitted batch {self.batch_id}: {self.job_count} analyses, {self.request_count} requests (backend: {backend.name}).")
+        return self.batch_id
+
+
+def ingest_batch(batch_id, ingest_job, batch_dir=None):
+    """
+    Reads a finished batch's results and calls `ingest_job(job_record, responses)` for each job, `responses` holding
+    one CachedGeminiResponse (or exception, for failed / missing results) per request of the job, in order.
+    `ingest_job` returns True when the job was saved. Returns (saved, failed) counts, or None if the batch isn't done.
+    """
+    state = _read_state(batch_id, batch_dir)
+    if state.get("ingested_at"):
+        logger.info(f"[GEMINI BATCH] Batch {batch_id} was already ingested at {state['ingested_at']}.")
+        return 0, 0
+    results_path = get_batch_backend(state["backend"]).fetch_results(batch_id, state["backend_reference"])
+    if results_path is None:
+        logger.info(f"[GEMINI BATCH] Batch {batch_id} has no results yet.")
+        return None
+
+    results = {result["key"]: result for result in _read_jsonl(results_path)}
+    requests = {request["key"]: request for request in _read_jsonl(_batch_path(batch_id, _REQUESTS_FILE, batch_dir))}
+    saved = failed = 0
+    for job in _read_jsonl(_batch_path(batch_id, _JOBS_FILE, batch_dir)):
+        responses = []
+        for request_key in job["request_keys"]:
+            result = results.get(request_key)
+            if result is None or "response" not in result:
+                responses.append(RuntimeError(f"Batch {batch_id}: no result for '{request_key}' ({(result or {}).get('error', 'missing')})"))
+            else:
+                responses.append(CachedGeminiResponse(result["response"].get("text"), result["response"].get("usage")))
+            request = requests.get(request_key, {})
+            gemini_usage.record(request.get("call_type", "batch"), request.get("product"),
+                                responses[-1] if result and "response" in result else None,
+                                failed=not (result and "response" in result), model_name=request.get("model"))
+        try:
+            job_saved = ingest_job(job["job"], responses)
+        except Exception as e:
+            logger.error(f"[GEMINI BATCH] Could not ingest '{job['job_key']}' from batch {batch_id}: {e}")
+            job_saved = False
+        saved += bool(job_saved)
+        failed += not job_saved
+
+    state["ingested_at"] = datetime.now(timezone.utc).isoformat()
+    state["saved"], state["failed"] = saved, failed
+    _write_state(batch_id, state, batch_dir)
+    logger.info(f"[GEMINI BATCH] Ingested batch {batch_id}: {saved} analyses saved, {failed} failed.")
+    return saved, failed
@@ -0,0 +1,178 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+import dataclasses
+import logging
+from types import SimpleNamespace
+import config
+
+logger = logging.getLogger(__name__)
+
+GEMINI_CACHE_MODES = ("passthrough", "record", "replay", "replay_strict")
+_USAGE_FIELDS = ("prompt_token_count", "candidates_token_count", "total_token_count")
+
+
+class GeminiReplayMiss(Exception):
+    """Raised in replay_strict mode when a Gemini request has no recording."""
+
+
+def _to_key_material(value):
+    """Turns a prompt/contents/generation config into plain JSON-able data with a stable ordering."""
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    if isinstance(value, dict):
+        return {str(key): _to_key_material(item) for key, item in sorted(value.items(), key=lambda kv: str(kv[0]))}
+    if isinstance(value, (list, tuple)):
+        return [_to_key_material(item) for item in value]
+    if dataclasses.is_dataclass(value):
+        return _to_key_material(dataclasses.asdict(value))
+    if hasattr(value, "__dict__"):
+        return _to_key_material({key: item for key, item in vars(value).items() if not key.startswith("_")})
+    return repr(value)
+
+
+class CachedGeminiResponse:
+    """
+    Replayed response. Offers what the callers in gemini_client read from a real response:
+    `text`, `prompt_feedback` (always None: blocked responses are never recorded) and `usage_metadata`.
+    """
+
+    def __init__(self, text, usage=None):
+        self.text = text
+        self.prompt_feedback = None
+        self.usage_metadata = SimpleNamespace(**{field: (usage or {}).get(field, 0) for field in _USAGE_FIELDS})
+
+
+class GeminiResponseCache:
+    """
+    Content-addressed record/replay store for Gemini generate_content calls, on SQLite.
+    The key is a hash of the model name, the generation config and the contents (prompt text, video parts...).
+    Modes:
+    - "passthrough": the cache is not used at all.
+    - "record": every request goes to Gemini and its answer is (re)recorded.
+    - "replay": recorded answers are served without calling Gemini; misses call Gemini and are recorded.
+    - "replay_strict": recorded answers only; a miss raises GeminiReplayMiss (fully offline, deterministic runs).
+    The table is kept at `max_entries` by evicting the least recently used recordings. Safe to share between threads.
+    """
+
+    def __init__(self, path, mode="passthrough", max_entries=5000):
+        if mode not in GEMINI_CACHE_MODES:
+            raise ValueError(f"Unknown Gemini cache mode '{mode}' (expected one of {', '.join(GEMINI_CACHE_MODES)})")
+        self.path = path
+        self.mode = mode
+        self.max_entries = max_entries
+        self.stats = {"hits": 0, "misses": 0, "recorded": 0}
+        self._lock = threading.Lock()
+        self._connection = None
+
+    def set_mode(self, mode):
+        if mode not in GEMINI_CACHE_MODES:
+            raise ValueError(f"Unknown Gemini cache mode '{mode}' (expected one of {', '.join(GEMINI_CACHE_MODES)})")
+        self.mode = mode
+
+    @property
+    def serves_recordings(self):
+        return self.mode in ("replay", "replay_strict")
+
+    @property
+    def records(self):
+        return self.mode in ("record", "replay")
+
+    def _get_connection(self):
+        if self._connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._connection = sqlite3.connect(self.path, check_same_thread=False)
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS recordings ("
+                " cache_key TEXT PRIMARY KEY, model_name TEXT, response_json TEXT, created_at REAL, last_access REAL)"
+            )
+            self._connection.execute("CREATE INDEX IF NOT EXISTS idx_recordings_last_access ON recordings(last_access)")
+            self._connection.commit()
+            logger.info(f"[GEMINI CACHE] Recordings opened at '{self.path}' (mode: {self.mode}).")
+        return self._connection
+
+    def cache_key(self, model_name, generation_config, contents):
+        key_material = json.dumps(
+            [model_name, _to_key_material(generation_config), _to_key_material(contents)],
+            sort_keys=True, ensure_ascii=False
+        )
+        return hashlib.sha256(key_material.encode("utf-8")).hexdigest()
+
+    def get(self, cache_key, context_description=""):
+        """
+        Returns the recorded CachedGeminiResponse, or None on a miss (or when this mode doesn't serve recordings).
+        Raises GeminiReplayMiss on a miss in replay_strict mode.
+        """
+        if not self.serves_recordings:
+            return None
+        row = None
+        try:
+            with self._lock:
+                connection = self._get_connection()
+                row = connection.execute("SELECT response_json FROM recordings WHERE cache_key = ?", (cache_key,)).fetchone()
+                if row is not None:
+                    connection.execute("UPDATE recordings SET last_access = ? WHERE cache_key = ?", (time.time(), cache_key))
+                    connection.commit()
+                self.stats["hits" if row is not None else "misses"] += 1
+        except sqlite3.Error as e:
+            logger.warning(f"[GEMINI CACHE] Lookup failed for [{context_description}], treating as a miss: {e}")
+
+        if row is None:
+            if self.mode == "replay_strict":
+                raise GeminiReplayMiss(f"No recorded Gemini response for [{context_description}] (key {cache_key[:12]})")
+            return None
+        recording = json.loads(row[0])
+        logger.debug(f"[GEMINI CACHE] Replaying [{context_description}] (key {cache_key[:12]})")
+        return CachedGeminiResponse(recording["text"], recording.get("usage"))
+
+    def put(self, cache_key, model_name, response, context_description=""):
+        """Records a real response. Responses without text (blocked, empty) are not recorded."""
+        if not self.records:
+            return
+        try:
+            text = response.text
+        except (ValueError, AttributeError): # .text raises when the candidate was blocked
+            return
+        if not text:
+            return
+        usage_metadata = getattr(response, "usage_metadata", None)
+        usage = {field: getattr(usage_metadata, field, 0) or 0 for field in _USAGE_FIELDS}
+        now = time.time()
+        try:
+            with self._lock:
+                connection = self._get_connection()
+                connection.execute(
+                    "INSERT OR REPLACE INTO recordings (cache_key, model_name, response_json, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                    (cache_key, model_name, json.dumps({"text": text, "usage": usage}), now, now)
+                )
+                # LRU eviction: keep only the `max_entries` most recently used recordings
+                connection.execute(
+                    "DELETE FROM recordings WHERE cache_key IN ("
+                    " SELECT cache_key FROM recordings ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,)
+                )
+                connection.commit()
+                self.stats["recorded"] += 1
+        except sqlite3.Error as e:
+            logger.warning(f"[GEMINI CACHE] Could not record the response for [{context_description}]: {e}")
+
+    def log_summary(self):
+        if self.mode == "passthrough":
+            return
+        with self._lock:
+            logger.info(
+                f"[GEMINI CACHE] Mode {self.mode}: {self.stats['hits']} replayed, {self.stats['misses']} misses, "
+                f"{self.stats['recorded']} recorded."
+            )
+
+
+gemini_response_cache = GeminiResponseCache(
+    path=config.GEMINI_CACHE_PATH,
+    mode=config.GEMINI_CACHE_MODE,
+    max_entries=config.GEMINI_CACHE_MAX_ENTRIES
+)
@@ -1,92 +1,632 @@
 import google.generativeai as genai
+import google.ai.generativelanguage as glm # Per-key clients (see _bind_model_to_key)
 import config
 import json
 import logging
 import sys # For the __main__ block logging
-import time # For time.sleep
 import re   # For parsing retry_delay
+import math
 import random # For jitter
+import time
+import asyncio
+import threading
+import functools
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from google.api_core.exceptions import ResourceExhausted # Specific exception for 429s
+from core.rate_limiter import AdaptiveRateLimiter
+from core.client_providers import SharedClientProvider
+from core.credential_pool import CredentialPool
+from core.gemini_cache import gemini_response_cache, GeminiReplayMiss
+from core.gemini_usage import gemini_usage, PromptTooLarge
+from core.video_segments import plan_segments, merge_segment_analyses, format_timestamp
+from core.gemini_prompt_cache import prompt_prefix_cache
+from core.relevance_prefilter import normalize_tokens
 
 logger = logging.getLogger(__name__)
-gemini_model = None
 
 # --- Constants for Retry Logic ---
 MAX_API_RETRIES = 3  # Max number of retries for 429 errors
 DEFAULT_API_RETRY_SECONDS = 10 # Default base wait if API doesn't specify or parsing fails
 
-def get_gemini_model():
-    global gemini_model
-    if gemini_model:
-        return gemini_model
+# --- Shared Rate Limiter ---
+# Every Gemini call in this process (all threads) goes through this limiter before it is sent.
+gemini_rate_limiter = AdaptiveRateLimiter(
+    requests_per_minute=config.GEMINI_REQUESTS_PER_MINUTE,
+    tokens_per_minute=config.GEMINI_TOKENS_PER_MINUTE,
+    name="gemini"
+)
+# API keys (GEMINI_API_KEYS): each key gets its own limiter (the first one: gemini_rate_limiter above), and every call
+# is sent with the least-loaded healthy key
+gemini_credentials = CredentialPool(
+    "Gemini", config.GEMINI_API_KEYS,
+    quarantine_after_errors=config.CREDENTIAL_QUARANTINE_AFTER_ERRORS,
+    quarantine_seconds=config.CREDENTIAL_QUARANTINE_SECONDS,
+    rate_limiter_factory=lambda index: gemini_rate_limiter if index == 0 else AdaptiveRateLimiter(
+        requests_per_minute=config.GEMINI_REQUESTS_PER_MINUTE,
+        tokens_per_minute=config.GEMINI_TOKENS_PER_MINUTE,
+        name=f"gemini#{index + 1}"
+    )
+)
+
+# Keys other than the first rely on google-generativeai 0.8.x internals: a GenerativeModel sends generate_content,
+# count_tokens and their async twins through its `_client` / `_async_client`, which it only creates (from the
+# process-global genai.configure() settings) while they are None. Checked on every model bound to such a key,
+# so an SDK that works differently fails loudly instead of sending every key's calls with the first key.
+_PER_KEY_CLIENT_SDK_VERSIONS = ("0.8.",)
+
+def _bind_model_to_key(model, credential):
+    """Gives `model` its own API clients for `credential` (a key other than the one genai.configure() set)."""
+    sdk_version = getattr(genai, "__version__", "unknown")
+    if (not sdk_version.startswith(_PER_KEY_CLIENT_SDK_VERSIONS)
+            or getattr(model, "_client", False) is not None or getattr(model, "_async_client", False) is not None):
+        raise RuntimeError(
+            f"Cannot send Gemini calls with {credential.label}: per-key clients need google-generativeai 0.8.x "
+            f"(installed: {sdk_version}). Configure a single Gemini API key or install a supported SDK version."
+        )
+    model._client = glm.GenerativeServiceClient(client_options={"api_key": credential.key})
+    model._async_client = glm.GenerativeServiceAsyncClient(client_options={"api_key": credential.key})
 
-    if not config.GEMINI_API_KEY:
+def _create_gemini_model(model_name=None, credential=None):
+    model_name = model_name or config.GEMINI_MODEL_NAME
+    credential = credential or next(iter(gemini_credentials.credentials), None) # Default: the first key
+    if credential is None:
         logger.error("Gemini API Key is not configured.")
         return None
         
     try:
         genai.configure(api_key=config.GEMINI_API_KEY)
-        gemini_model = genai.GenerativeModel(config.GEMINI_MODEL_NAME)
-        logger.info(f"Gemini model '{config.GEMINI_MODEL_NAME}' initialized successfully.")
-        return gemini_model
+        model = genai.GenerativeModel(model_name)
     except Exception as e:
         logger.error(f"An error occurred during Gemini model initialization: {e}")
         return None
+    if credential.index > 0:
+        # genai.configure() is process-global (first key): other keys get clients of their own on the model.
+        # Raises (not caught) if the installed SDK can't take them.
+        _bind_model_to_key(model, credential)
+    model.credential = credential # Calls made with this model are charged to this key
+    logger.info(f"Gemini model '{model_name}' initialized successfully ({credential.label}).")
+    return model
+
+# genai.configure() is process-global, so the model is created once (under the provider's lock) and shared by all threads
+gemini_model_provider = SharedClientProvider("Gemini", _create_gemini_model)
+# Every other (model name, key index) pair (routing, cascade, fallback, other API keys), one shared provider each
+_routed_model_providers = {}
+_routed_model_providers_lock = threading.Lock()
+# Model name -> time.monotonic() until which calls routed to it go to GEMINI_FALLBACK_MODEL_NAME (sustained 429s)
+_model_429_cooldowns = {}
+
+def _short_model_name(model_name):
+    """GenerativeModel.model_name is "models/<name>"; the settings use the bare name."""
+    return (model_name or "").split("/")[-1]
+
+def get_gemini_model(model_name=None, credential=None):
+    """The model `model_name` (default GEMINI_MODEL_NAME) on `credential`, else on the least-loaded healthy API key."""
+    model_name = model_name or config.GEMINI_MODEL_NAME
+    credential = credential or gemini_credentials.pick()
+    key_index = credential.index if credential is not None else 0
+    if model_name == config.GEMINI_MODEL_NAME and key_index == 0:
+        return gemini_model_provider.get()
+    with _routed_model_providers_lock:
+        provider = _routed_model_providers.get((model_name, key_index))
+        if provider is None:
+            provider = _routed_model_providers[(model_name, key_index)] = SharedClientProvider(
+                f"Gemini ({model_name}, key #{key_index + 1})", functools.partial(_create_gemini_model, model_name, credential)
+            )
+    return provider.get()
+
+def _model_on_least_loaded_key(model):
+    """
+    Calls are routed when they are sent, not when their steps picked the model: the same model on the key that is
+    least loaded now. Models outside the pool (bound to a cached prompt prefix, on the first key) are left as they are.
+    """
+    if len(gemini_credentials) < 2 or getattr(model, 'credential', None) is None:
+        return model
+    return get_gemini_model(_short_model_name(model.model_name)) or model
+
+def get_gemini_model_for(call_type):
+    """
+    Model for a call type: GEMINI_MODEL_ROUTING, else GEMINI_MODEL_NAME; the fallback model instead while the
+    routed model is cooling down after sustained 429s.
+    """
+    model_name = config.GEMINI_MODEL_ROUTING.get(call_type, config.GEMINI_MODEL_NAME)
+    if config.GEMINI_FALLBACK_MODEL_NAME and _model_429_cooldowns.get(model_name, 0) > time.monotonic():
+        model_name = config.GEMINI_FALLBACK_MODEL_NAME
+    return get_gemini_model(model_name)
+
+def _fallback_model_after(e, model, context_description):
+    """
+    Called when a call failed for good. After sustained 429s returns the model to re-send the call to: the same model
+    on another API key if the call's key got quarantined and another one is healthy, else the fallback model (putting
+    the exhausted model in cooldown). Returns None for other errors or without a fallback model.
+    """
+    model_name = _short_model_name(getattr(model, 'model_name', config.GEMINI_MODEL_NAME))
+    if not isinstance(e, ResourceExhausted):
+        return None
+    credential = getattr(model, 'credential', None)
+    if gemini_credentials.is_quarantined(credential) and gemini_credentials.healthy_count():
+        other_key_model = get_gemini_model(model_name)
+        if other_key_model is not None:
+            logger.warning(f"[{context_description}] {credential.label} is quarantined. Re-sending to '{model_name}' on {other_key_model.credential.label}.")
+            return other_key_model
+    if not config.GEMINI_FALLBACK_MODEL_NAME or model_name == config.GEMINI_FALLBACK_MODEL_NAME:
+        return None
+    fallback_model = get_gemini_model(config.GEMINI_FALLBACK_MODEL_NAME)
+    if fallback_model is None:
+        return None
+    _model_429_cooldowns[model_name] = time.monotonic() + config.GEMINI_FALLBACK_COOLDOWN_SECONDS
+    logger.warning(
+        f"[{context_description}] Sustained 429s on '{model_name}'. Re-sending to fallback model '{config.GEMINI_FALLBACK_MODEL_NAME}' "
+        f"(used instead of '{model_name}' for the next {config.GEMINI_FALLBACK_COOLDOWN_SECONDS}s)."
+    )
+    return fallback_model
+
+def _estimate_prompt_tokens(contents):
+    """
+    Rough input-token estimate for the tokens/minute bucket: ~4 characters per token for text,
+    and a fixed `GEMINI_ESTIMATED_TOKENS_PER_VIDEO` for each video part (the real size is unknown until Gemini answers).
+    """
+    if not isinstance(contents, (list, tuple)):
+        contents = [contents]
+    estimated_tokens = 0
+    for part in contents:
+        if isinstance(part, dict) and "file_data" in part:
+            estimated_tokens += config.GEMINI_ESTIMATED_TOKENS_PER_VIDEO
+        else:
+            estimated_tokens += len(str(part)) // 4 + 1
+    return estimated_tokens
+
+def _actual_tokens_used(response):
+    """Total tokens reported by Gemini for a response, or None if the SDK didn't return usage metadata."""
+    usage_metadata = getattr(response, 'usage_metadata', None)
+    return getattr(usage_metadata, 'total_token_count', None) or None
+
+def _handle_rate_limit_error(e, attempt, context_description, call_record=None, credential=None):
+    """
+    Shared 429 handling for the sync and async retry loops: logs, works out the wait (the server's `retry_delay`,
+    else exponential backoff, plus jitter) and hands it to the key's limiter, which pauses every caller (sync and async)
+    of that key for that long. Re-raises `e` once MAX_API_RETRIES is exhausted, or as soon as the key is quarantined
+    while another key is healthy (the caller re-sends the call there, see _fallback_model_after).
+    """
+    error_message = str(e)
+    logger.warning(f"[{context_description}] Rate limit hit (429) (Attempt {attempt + 1}/{MAX_API_RETRIES + 1}): {error_message[:200]}...") # Log snippet
+    if call_record is not None:
+        call_record["retries"] = call_record.get("retries", 0) + 1
+
+    if gemini_credentials.report_rate_limited(credential) and gemini_credentials.healthy_count():
+        raise e
+    if attempt >= MAX_API_RETRIES:
+        logger.error(f"[{context_description}] Max retries ({MAX_API_RETRIES}) exceeded. Giving up.")
+        raise e # Re-raise the exception to be handled by the caller
+
+    retry_seconds_from_api = None
+    # Try to parse suggested delay from error message. Example: "retry_delay { seconds: 39 }"
+    # The regex now looks for "retry_delay" followed by optional " { seconds: " or just "="
+    match = re.search(r"retry_delay(?:=| {\s*seconds:)\s*(\d+)", error_message, re.IGNORECASE)
+    if match:
+        try:
+            retry_seconds_from_api = int(match.group(1))
+        except ValueError:
+            logger.warning(f"[{context_description}] Could not parse retry_delay value '{match.group(1)}'.")
+
+    if retry_seconds_from_api is not None:
+        wait_time = retry_seconds_from_api
+        logger.info(f"[{context_description}] API suggested retry delay: {wait_time}s.")
+    else: # Fallback to exponential backoff
+        wait_time = DEFAULT_API_RETRY_SECONDS * (2 ** attempt)
+        logger.info(f"[{context_description}] No specific retry_delay found or parsed. Using exponential backoff: {wait_time}s.")
+    
+    jitter = random.uniform(0, 0.2 * wait_time) # Add up to 20% jitter
+    actual_wait_time = wait_time + jitter
 
-def _gemini_api_call_with_retry(api_call_lambda, context_description="Gemini API Call"):
+    # The wait is applied by the shared limiter, so every caller backs off together and the
+    # next acquire (ours included) only proceeds once the pause is over.
+    _rate_limiter_for(credential).report_rate_limited(actual_wait_time)
+    logger.info(f"[{context_description}] Waiting for {actual_wait_time:.2f} seconds before retrying...")
+
+def _rate_limiter_for(credential):
+    return credential.rate_limiter if credential is not None else gemini_rate_limiter
+
+def _gemini_api_call_with_retry(api_call_lambda, context_description="Gemini API Call", estimated_tokens=0, call_record=None, credential=None):
     """
-    Wraps a Gemini API call with retry logic for 429 ResourceExhausted errors.
+    Wraps a Gemini API call with the shared rate limiter and retry logic for 429 ResourceExhausted errors.
     `api_call_lambda` should be a function that takes no arguments and performs the API call, returning the response.
     `context_description` is used for logging.
+    `estimated_tokens` is charged to the limiter's tokens/minute bucket before each attempt.
+    `call_record` (dict, optional) gets its "retries" entry incremented on every 429.
+    `credential` (the model's pooled API key, optional) selects the limiter and is charged with the call and its 429s.
     Returns the API response object on success, or raises the exception on final failure.
+    Other exceptions propagate immediately.
     """
+    rate_limiter = _rate_limiter_for(credential)
     for attempt in range(MAX_API_RETRIES + 1):
+        rate_limiter.acquire(estimated_tokens) # Waits for quota and for any shared 429 pause
         try:
-            return api_call_lambda() # Execute the actual API call
+            with gemini_credentials.calling(credential, estimated_tokens):
+                response = api_call_lambda() # Execute the actual API call
+            rate_limiter.report_success(estimated_tokens, _actual_tokens_used(response))
+            gemini_credentials.report_success(credential)
+            return response
         except ResourceExhausted as e: # Catch 429 errors specifically
-            error_message = str(e)
-            logger.warning(f"[{context_description}] Rate limit hit (429) (Attempt {attempt + 1}/{MAX_API_RETRIES + 1}): {error_message[:200]}...") # Log snippet
-            
-            if attempt >= MAX_API_RETRIES:
-                logger.error(f"[{context_description}] Max retries ({MAX_API_RETRIES}) exceeded. Giving up.")
-                raise # Re-raise the exception to be handled by the caller
-
-            retry_seconds_from_api = None
-            # Try to parse suggested delay from error message. Example: "retry_delay { seconds: 39 }"
-            # The regex now looks for "retry_delay" followed by optional " { seconds: " or just "="
-            match = re.search(r"retry_delay(?:=| {\s*seconds:)\s*(\d+)", error_message, re.IGNORECASE)
-            if match:
-                try:
-                    retry_seconds_from_api = int(match.group(1))
-                except ValueError:
-                    logger.warning(f"[{context_description}] Could not parse retry_delay value '{match.group(1)}'.")
-
-            if retry_seconds_from_api is not None:
-                wait_time = retry_seconds_from_api
-                logger.info(f"[{context_description}] API suggested retry delay: {wait_time}s.")
-            else: # Fallback to exponential backoff
-                wait_time = DEFAULT_API_RETRY_SECONDS * (2 ** attempt)
-                logger.info(f"[{context_description}] No specific retry_delay found or parsed. Using exponential backoff: {wait_time}s.")
-            
-            jitter = random.uniform(0, 0.2 * wait_time) # Add up to 20% jitter
-            actual_wait_time = wait_time + jitter
-            
-            logger.info(f"[{context_description}] Waiting for {actual_wait_time:.2f} seconds before retrying...")
-            time.sleep(actual_wait_time)
-            
-        # Important: Let other exceptions propagate immediately
-        # except Exception as e_other:
-        #     logger.error(f"[{context_description}] A non-429 error occurred: {e_other}")
-        #     raise # Re-raise immediately
+            _handle_rate_limit_error(e, attempt, context_description, call_record, credential)
     # This line should not be reached if the loop correctly re-raises or returns.
-    # If it is, it implies an issue in the loop logic.
-    # Raise an error to signify this unexpected state.
     raise RuntimeError(f"[{context_description}] Exited retry loop unexpectedly without success or re-raising an error.")
 
+async def _gemini_api_call_with_retry_async(api_coroutine_factory, context_description="Gemini API Call", estimated_tokens=0, call_record=None, credential=None):
+    """
+    Async twin of _gemini_api_call_with_retry: `api_coroutine_factory()` returns a new awaitable per attempt.
+    Waits (for the limiter and 429 pauses) with asyncio.sleep, so the event loop keeps serving other requests.
+    """
+    rate_limiter = _rate_limiter_for(credential)
+    for attempt in range(MAX_API_RETRIES + 1):
+        await rate_limiter.acquire_async(estimated_tokens)
+        try:
+            with gemini_credentials.calling(credential, estimated_tokens):
+                response = await api_coroutine_factory()
+            rate_limiter.report_success(estimated_tokens, _actual_tokens_used(response))
+            gemini_credentials.report_success(credential)
+            return response
+        except ResourceExhausted as e:
+            _handle_rate_limit_error(e, attempt, context_description, call_record, credential)
+    raise RuntimeError(f"[{context_description}] Exited retry loop unexpectedly without success or re-raising an error.")
+
+def _count_prompt_tokens(model, contents, context_description):
+    """Pre-flight `count_tokens` call. Returns the prompt's token count, or None if it couldn't be counted."""
+    try:
+        return model.count_tokens(contents).total_tokens
+    except Exception as e:
+        logger.debug(f"[{context_description}] count_tokens failed, sending without a pre-flight check: {e}")
+        return None
+
+async def _count_prompt_tokens_async(model, contents, context_description):
+    try:
+        return (await model.count_tokens_async(contents)).total_tokens
+    except Exception as e:
+        logger.debug(f"[{context_description}] count_tokens failed, sending without a pre-flight check: {e}")
+        return None
+
+def _lookup_recording(model, contents, generation_config, context_description, call_type, product):
+    """
+    Record/replay lookup done before every call. Returns (model_name, cache_key, cached_response); cache_key is None
+    in passthrough mode and cached_response is None unless a recording is replayed.
+    """
+    model_name = getattr(model, 'model_name', config.GEMINI_MODEL_NAME)
+    if gemini_response_cache.mode == "passthrough":
+        return model_name, None, None
+    # A model bound to a cached prompt prefix doesn't send the prefix in `contents`: key on the prefix's hash instead
+    prefix_hash = getattr(model, 'prompt_prefix_hash', None)
+    cache_key = gemini_response_cache.cache_key(f"{model_name}#{prefix_hash}" if prefix_hash else model_name, generation_config, contents)
+    try:
+        cached_response = gemini_response_cache.get(cache_key, context_description) # Raises GeminiReplayMiss in replay_strict
+    except GeminiReplayMiss:
+        gemini_usage.record(call_type, product, failed=True, model_name=_short_model_name(model_name))
+        raise
+    if cached_response is not None:
+        gemini_usage.record(call_type, product, cached_response, replayed=True, model_name=_short_model_name(model_name))
+    return model_name, cache_key, cached_response
+
+def _tokens_to_reserve(contents, counted_tokens, context_description, call_type, product, model_name=None):
+    """
+    Tokens to charge to the limiter: the pre-flight count when there is one (GEMINI_PREFLIGHT_TOKEN_COUNT),
+    else the character-based estimate. Raises PromptTooLarge instead of letting an oversized prompt be sent.
+    """
+    if counted_tokens is None:
+        return _estimate_prompt_tokens(contents)
+    if counted_tokens > config.GEMINI_MAX_PROMPT_TOKENS:
+        gemini_usage.record(call_type, product, failed=True, model_name=_short_model_name(model_name))
+        raise PromptTooLarge(context_description, counted_tokens, config.GEMINI_MAX_PROMPT_TOKENS)
+    return counted_tokens
+
+def _finish_call(call_type, product, response, started_at, call_record, model_name, cache_key, context_description):
+    gemini_usage.record(call_type, product, response, latency_seconds=time.monotonic() - started_at, retries=call_record["retries"],
+                        model_name=_short_model_name(model_name))
+    if cache_key is not None:
+        gemini_response_cache.put(cache_key, model_name, response, context_description)
+
+def _record_failed_call(call_type, product, started_at, call_record, model_name=None):
+    gemini_usage.record(call_type, product, latency_seconds=time.monotonic() - started_at, retries=call_record["retries"], failed=True,
+                        model_name=_short_model_name(model_name))
+
+def _generate_content(model, contents, generation_config, context_description, call_type="other", product=None):
+    """
+    Single entry point for `generate_content`: rate-limited, with 429 retries. Raises on final failure.
+    Goes through the record/replay cache first: replayed responses skip the rate limiter and the API entirely.
+    Every call is recorded in `gemini_usage` under (`call_type`, `product`). With GEMINI_PREFLIGHT_TOKEN_COUNT
+    the prompt is measured first and PromptTooLarge is raised instead of sending an oversized prompt.
+    A call still getting 429s after MAX_API_RETRIES is re-sent to GEMINI_FALLBACK_MODEL_NAME, if set.
+    """
+    model = _model_on_least_loaded_key(model)
+    model_name, cache_key, cached_response = _lookup_recording(model, contents, generation_config, context_description, call_type, product)
+    if cached_response is not None:
+        return cached_response
+    counted_tokens = _count_prompt_tokens(model, contents, context_description) if config.GEMINI_PREFLIGHT_TOKEN_COUNT else None
+    estimated_tokens = _tokens_to_reserve(contents, counted_tokens, context_description, call_type, product, model_name)
+
+    call_record = {"retries": 0}
+    api_lambda = lambda: model.generate_content(contents, generation_config=generation_config)
+    started_at = time.monotonic()
+    try:
+        response = _gemini_api_call_with_retry(api_lambda, context_description=context_description,
+                                               estimated_tokens=estimated_tokens, call_record=call_record,
+                                               credential=getattr(model, 'credential', None))
+    except Exception as e:
+        _record_failed_call(call_type, product, started_at, call_record, model_name)
+        fallback_model = _fallback_model_after(e, model, context_description)
+        if fallback_model is None:
+            raise
+        return _generate_content(fallback_model, contents, generation_config, context_description, call_type, product)
+    _finish_call(call_type, product, response, started_at, call_record, model_name, cache_key, context_description)
+    return response
+
+async def _generate_content_async(model, contents, generation_config, context_description, call_type="other", product=None):
+    """Async twin of _generate_content, on the SDK's `generate_content_async`."""
+    model = _model_on_least_loaded_key(model)
+    model_name, cache_key, cached_response = _lookup_recording(model, contents, generation_config, context_description, call_type, product)
+    if cached_response is not None:
+        return cached_response
+    counted_tokens = await _count_prompt_tokens_async(model, contents, context_description) if config.GEMINI_PREFLIGHT_TOKEN_COUNT else None
+    estimated_tokens = _tokens_to_reserve(contents, counted_tokens, context_description, call_type, product, model_name)
+
+    call_record = {"retries": 0}
+    api_coroutine_factory = lambda: model.generate_content_async(contents, generation_config=generation_config)
+    started_at = time.monotonic()
+    try:
+        response = await _gemini_api_call_with_retry_async(api_coroutine_factory, context_description=context_description,
+                                                           estimated_tokens=estimated_tokens, call_record=call_record,
+                                                           credential=getattr(model, 'credential', None))
+    except Exception as e:
+        _record_failed_call(call_type, product, started_at, call_record, model_name)
+        fallback_model = _fallback_model_after(e, model, context_description)
+        if fallback_model is None:
+            raise
+        return await _generate_content_async(fallback_model, contents, generation_config, context_description, call_type, product)
+    _finish_call(call_type, product, response, started_at, call_record, model_name, cache_key, context_description)
+    return response
+
+def _chunk_text(chunk):
+    try:
+        return chunk.text
+    except ValueError: # Chunk without text parts, e.g. the last one carrying only the finish reason
+        return ""
+
+def _generate_content_stream(model, contents, generation_config, context_description, call_type="other", product=None):
+    """
+    Streaming variant of _generate_content (`generate_content(stream=True)`): yields the response text chunk by chunk
+    as Gemini generates it. Rate limiting and 429 retries apply to the initial request; record/replay, the pre-flight
+    check and usage accounting work as in _generate_content. A replayed response is yielded as a single chunk.
+    The fallback model / another API key is only tried if the call failed before any text was yielded.
+    """
+    model = _model_on_least_loaded_key(model)
+    model_name, cache_key, cached_response = _lookup_recording(model, contents, generation_config, context_description, call_type, product)
+    if cached_response is not None:
+        yield cached_response.text
+        return
+    counted_tokens = _count_prompt_tokens(model, contents, context_description) if config.GEMINI_PREFLIGHT_TOKEN_COUNT else None
+    estimated_tokens = _tokens_to_reserve(contents, counted_tokens, context_description, call_type, product, model_name)
+
+    call_record = {"retries": 0}
+    api_lambda = lambda: model.generate_content(contents, generation_config=generation_config, stream=True)
+    started_at = time.monotonic()
+    yielded_any = False
+    try:
+        response = _gemini_api_call_with_retry(api_lambda, context_description=context_description,
+                                               estimated_tokens=estimated_tokens, call_record=call_record,
+                                               credential=getattr(model, 'credential', None))
+        for chunk in response:
+            chunk_text = _chunk_text(chunk)
+            if chunk_text:
+                yielded_any = True
+                yield chunk_text
+    except Exception as e:
+        _record_failed_call(call_type, product, started_at, call_record, model_name)
+        # Once text was handed out, re-sending the prompt elsewhere would repeat it: only fall back before that
+        fallback_model = None if yielded_any else _fallback_model_after(e, model, context_description)
+        if fallback_model is None:
+            raise
+        yield from _generate_content_stream(fallback_model, contents, generation_config, context_description, call_type, product)
+        return
+    # usage_metadata is complete once the stream has been fully consumed
+    _finish_call(call_type, product, response, started_at, call_record, model_name, cache_key, context_description)
+
+async def _generate_content_stream_async(model, contents, generation_config, context_description, call_type="other", product=None):
+    """Async twin of _generate_content_stream (`generate_content_async(stream=True)`), an async generator of text chunks."""
+    model = _model_on_least_loaded_key(model)
+    model_name, cache_key, cached_response = _lookup_recording(model, contents, generation_config, context_description, call_type, product)
+    if cached_response is not None:
+        yield cached_response.text
+        return
+    counted_tokens = await _count_prompt_tokens_async(model, contents, context_description) if config.GEMINI_PREFLIGHT_TOKEN_COUNT else None
+    estimated_tokens = _tokens_to_reserve(contents, counted_tokens, context_description, call_type, product, model_name)
+
+    call_record = {"retries": 0}
+    api_coroutine_factory = lambda: model.generate_content_async(contents, generation_config=generation_config, stream=True)
+    started_at = time.monotonic()
+    yielded_any = False
+    try:
+        response = await _gemini_api_call_with_retry_async(api_coroutine_factory, context_description=context_description,
+                                                           estimated_tokens=estimated_tokens, call_record=call_record,
+                                                           credential=getattr(model, 'credential', None))
+        async for chunk in response:
+            chunk_text = _chunk_text(chunk)
+            if chunk_text:
+                yielded_any = True
+                yield chunk_text
+    except Exception as e:
+        _record_failed_call(call_type, product, started_at, call_record, model_name)
+        fallback_model = None if yielded_any else _fallback_model_after(e, model, context_description)
+        if fallback_model is None:
+            raise
+        async for chunk_text in _generate_content_stream_async(fallback_model, contents, generation_config, context_description, call_type, product):
+            yield chunk_text
+        return
+    _finish_call(call_type, product, response, started_at, call_record, model_name, cache_key, context_description)
+
+# --- Sync / async drivers ---
+# Each public function's logic (prompt building, response parsing, error handling) is written once, as a generator
+# of "steps": it yields a GeminiCall wherever it needs Gemini and receives the response back (or gets the call's
+# exception raised at that point, so its own try/except handles it). `_run_steps` executes the calls with the blocking
+# helpers, `_run_steps_async` with the asyncio ones; the `*_async` functions are thin wrappers over the same steps.
+# A call with `on_chunk` is streamed: every text chunk is passed to `on_chunk` and None is sent back.
+# A list of GeminiCalls is sent concurrently; the list sent back holds each call's response, or its exception.
+GeminiCall = namedtuple(
+    "GeminiCall",
+    ["model", "contents", "generation_config", "context_description", "call_type", "product", "on_chunk"],
+    defaults=("other", None, None)
+)
+
+def _run_call_or_exception(call):
+    try:
+        return _generate_content(*call[:6])
+    except Exception as e:
+        return e
+
+def _run_steps(steps):
+    try:
+        call = next(steps)
+        while True:
+            if isinstance(call, list):
+                with ThreadPoolExecutor(max_workers=len(call), thread_name_prefix="gemini-call") as executor:
+                    call = steps.send(list(executor.map(_run_call_or_exception, call)))
+                continue
+            try:
+                if call.on_chunk is not None:
+                    for chunk_text in _generate_content_stream(*call[:6]):
+                        call.on_chunk(chunk_text)
+                    response = None
+                else:
+                    response = _generate_content(*call[:6])
+            except Exception as e:
+                call = steps.throw(e)
+            else:
+                call = steps.send(response)
+    except StopIteration as finished:
+        return finished.value
+
+async def _run_steps_async(steps):
+    try:
+        call = next(steps)
+        while True:
+            if isinstance(call, list):
+                responses = await asyncio.gather(*(_generate_content_async(*parallel_call[:6]) for parallel_call in call), return_exceptions=True)
+                call = steps.send(list(responses))
+                continue
+            try:
+                if call.on_chunk is not None:
+                    async for chunk_text in _generate_content_stream_async(*call[:6]):
+                        call.on_chunk(chunk_text)
+                    response = None
+                else:
+                    response = await _generate_content_async(*call[:6])
+            except Exception as e:
+                call = steps.throw(e)
+            else:
+                call = steps.send(response)
+    except StopIteration as finished:
+        return finished.value
+
+# --- Deferred driver (offline batch mode, see core/gemini_batch.py) ---
+def defer_steps(steps):
+    """
+    Runs `steps` up to its first Gemini call and returns the GeminiCalls it asks for (a list: several for a
+    segmented analysis) without sending them. Returns [] if the steps finished without needing Gemini.
+    """
+    try:
+        call = next(steps)
+    except StopIteration:
+        return []
+    steps.close()
+    return list(call) if isinstance(call, list) else [call]
+
+def _answer_first_calls(steps, responses):
+    """Steps wrapper answering the first call(s) of `steps` with `responses`; any later call is yielded as usual."""
+    try:
+        call = next(steps)
+        if isinstance(call, list):
+            call = steps.send(list(responses))
+        elif isinstance(responses[0], Exception):
+            call = steps.throw(responses[0])
+        else:
+            call = steps.send(responses[0])
+        while True:
+            try:
+                response = yield call
+            except Exception as e:
+                call = steps.throw(e)
+            else:
+                call = steps.send(response)
+    except StopIteration as finished:
+        return finished.value
+
+def resume_deferred_steps(steps, responses):
+    """
+    Runs `steps`, rebuilt from the same arguments as for `defer_steps`, with the batch results for its first call(s):
+    `responses` holds one response or exception per deferred call. Returns what the steps return.
+    """
+    return _run_steps(_answer_first_calls(steps, responses))
+
+def video_analysis_steps(kind, video_url, product_name_context, video_title_from_yt, channel_name_from_yt, duration_seconds=None):
+    """Steps of the full analysis of one video (`kind` "consumer" or "saas"), for the deferred driver."""
+    if kind == "saas":
+        return _analyze_saas_video_content_steps(video_url, product_name_context, video_title_from_yt, channel_name_from_yt)
+    return _analyze_video_content_steps(video_url, product_name_context, video_title_from_yt, channel_name_from_yt, duration_seconds)
+
+# --- Model cascade for screening calls ---
+def _response_text(response):
+    try:
+        return (response.text or "").strip() if response else ""
+    except ValueError: # Blocked candidate
+        return ""
+
+def _response_confidence(response):
+    """exp(avg_logprobs) of the first candidate, or None when the response doesn't carry log probabilities."""
+    candidates = getattr(response, 'candidates', None)
+    avg_logprobs = getattr(candidates[0], 'avg_logprobs', None) if candidates else None
+    if not avg_logprobs: # Missing, or the proto default 0.0
+        return None
+    return math.exp(avg_logprobs)
+
+def _cascade_steps(call, is_decisive):
+    """
+    Sends a screening call through the cascade (GEMINI_CASCADE_ENABLED, call type in GEMINI_CASCADE_CALL_TYPES):
+    GEMINI_CASCADE_LIGHT_MODEL_NAME answers first, and the call is escalated to its own (routed) model when the light
+    answer fails, is not decisive (`is_decisive(response)` is False, e.g. unparseable) or is not confident enough.
+    Returns the response to use; the escalated call's exception, if any, propagates to the caller's steps.
+    """
+    if not config.GEMINI_CASCADE_ENABLED or call.call_type not in config.GEMINI_CASCADE_CALL_TYPES:
+        return (yield call)
+    light_model = get_gemini_model(config.GEMINI_CASCADE_LIGHT_MODEL_NAME)
+    if light_model is None:
+        return (yield call)
+
+    try:
+        response = yield call._replace(model=light_model)
+    except Exception as e:
+        logger.warning(f"[{call.context_description}] Light model call failed, escalating: {e}")
+        response = None
+    confidence = _response_confidence(response)
+    if response is not None and is_decisive(response) and (confidence is None or confidence >= config.GEMINI_CASCADE_MIN_CONFIDENCE):
+        gemini_usage.record_cascade(call.call_type, escalated=False)
+        return response
+
+    logger.debug(
+        f"[{call.context_description}] Escalating from '{config.GEMINI_CASCADE_LIGHT_MODEL_NAME}'"
+        + (f" (confidence {confidence:.2f})" if confidence is not None else "")
+    )
+    gemini_usage.record_cascade(call.call_type, escalated=True)
+    return (yield call)
+
+def _is_json_with_keys(response, keys):
+    try:
+        parsed = json.loads(_response_text(response))
+    except json.JSONDecodeError:
+        return False
+    return isinstance(parsed, dict) and all(key in parsed for key in keys)
+
 # --- Consumer Product Functions (Modified to use retry helper) ---
-def check_video_relevance(video_title, video_description, product_name_for_relevance, product_keywords):
-    model = get_gemini_model()
-    if not model: return False
+def _check_video_relevance_steps(video_title, video_description, product_name_for_relevance, product_keywords, on_error=False):
+    """Logic of `check_video_relevance` / `check_video_relevance_async`, as steps for _run_steps (see GeminiCall)."""
+    model = get_gemini_model_for("consumer_relevance")
+    if not model: return on_error
 
     prompt = config.CONSUMER_RELEVANCE_PROMPT.format(
         video_title=video_title,
@@ -98,8 +638,11 @@ def check_video_relevance(video_title, video_description, product_name_for_relev
     logger.debug(f"[CONSUMER] Sending relevance check to Gemini for title: '{video_title}'")
     
     try:
-        api_lambda = lambda: model.generate_content(prompt, generation_config=genai.types.GenerationConfig(temperature=0.1, max_output_tokens=10))
-        response = _gemini_api_call_with_retry(api_lambda, context_description=context_desc)
+        relevance_generation_config = genai.types.GenerationConfig(temperature=0.1, max_output_tokens=10)
+        response = yield from _cascade_steps(
+            GeminiCall(model, prompt, relevance_generation_config, context_desc, call_type="consumer_relevance", product=product_name_for_relevance),
+            is_decisive=lambda response: _response_text(response).upper() in ("YES", "NO")
+        )
         
         if response and response.text:
             decision = response.text.strip().upper()
@@ -109,46 +652,260 @@ def check_video_relevance(video_title, video_description, product_name_for_relev
             logger.warning(f"[CONSUMER] Relevance check for '{video_title}': Gemini response was None or empty after retries.")
             if response and hasattr(response, 'prompt_feedback') and response.prompt_feedback:
                 logger.warning(f"Prompt Feedback for consumer relevance check: {response.prompt_feedback}")
-            return False
+            return on_error
     except ResourceExhausted:
         logger.error(f"[{context_desc}] Failed after max retries due to 429 error.")
-        return False
+        return on_error
     except Exception as e:
         logger.error(f"[{context_desc}] An unexpected error occurred: {e}")
-        return False
+        return on_error
 
-def analyze_video_content(video_url, product_name_context, video_title_from_yt, channel_name_from_yt):
-    model = get_gemini_model()
-    if not model: return None
+def check_video_relevance(video_title, video_description, product_name_for_relevance, product_keywords, on_error=False):
+    """Single-video YES/NO relevance check. Returns `on_error` (False by default) if Gemini gave no usable answer."""
+    return _run_steps(_check_video_relevance_steps(video_title, video_description, product_name_for_relevance, product_keywords, on_error))
 
-    safe_video_title = video_title_from_yt.replace('"', '\\"') # Keep this logic
-    safe_channel_name = channel_name_from_yt.replace('"', '\\"')
-    safe_product_name = product_name_context.replace('"', '\\"')
+async def check_video_relevance_async(video_title, video_description, product_name_for_relevance, product_keywords, on_error=False):
+    """Async version of `check_video_relevance`: same prompt, parsing and error handling, without blocking the event loop."""
+    return await _run_steps_async(_check_video_relevance_steps(video_title, video_description, product_name_for_relevance, product_keywords, on_error))
 
-    filled_json_structure = config.CONSUMER_JSON_REQUEST.replace(
-        "{video_url_placeholder}", video_url
-    ).replace(
-        "{video_title_placeholder}", safe_video_title
-    ).replace(
-        "{channel_name_placeholder}", safe_channel_name
-    ).replace(
-        "{product_name_placeholder}", safe_product_name
+def _parse_batch_relevance_verdicts(response_text, batch_size):
+    """
+    Parses the JSON array returned by the batched relevance prompt.
+    Returns {batch_position: bool} for every well-formed entry; malformed or out-of-range entries are left out.
+    """
+    try:
+        parsed = json.loads(response_text)
+    except json.JSONDecodeError:
+        return {}
+    if isinstance(parsed, dict): # Tolerate {"verdicts": [...]}-style wrapping
+        parsed = next((value for value in parsed.values() if isinstance(value, list)), [])
+    if not isinstance(parsed, list):
+        return {}
+
+    verdicts = {}
+    for entry in parsed:
+        if not isinstance(entry, dict):
+            continue
+        index = entry.get("index")
+        is_relevant = entry.get("is_relevant")
+        if isinstance(index, int) and 1 <= index <= batch_size and isinstance(is_relevant, bool):
+            verdicts[index - 1] = is_relevant
+    return verdicts
+
+def _check_video_relevance_batch_steps(videos, product_name_for_relevance, product_keywords):
+    """Logic of `check_video_relevance_batch` / `check_video_relevance_batch_async`, as steps for _run_steps (see GeminiCall)."""
+    verdicts = [None] * len(videos)
+    model = get_gemini_model_for("consumer_relevance_batch")
+    batch_size = max(1, config.GEMINI_RELEVANCE_BATCH_SIZE)
+
+    for batch_start in range(0, len(videos) if model else 0, batch_size): # Without a model everything falls back to single checks
+        batch = videos[batch_start:batch_start + batch_size]
+        numbered_video_list = "\n".join(
+            f'{position}. Title: "{video_title}"\n   Description: "{(video_description or "")[:250]}"'
+            for position, (video_title, video_description) in enumerate(batch, start=1)
+        )
+        prompt = config.CONSUMER_BATCH_RELEVANCE_PROMPT.format(
+            product_name_for_relevance=product_name_for_relevance,
+            product_keywords_for_relevance=str(product_keywords),
+            numbered_video_list=numbered_video_list
+        )
+        context_desc = f"Consumer Batch Relevance: {product_name_for_relevance[:30]} ({len(batch)} videos)"
+        logger.debug(f"[CONSUMER] Sending batched relevance check to Gemini for {len(batch)} videos re: '{product_name_for_relevance}'")
+
+        try:
+            batch_generation_config = genai.types.GenerationConfig(
+                response_mime_type="application/json",
+                temperature=0.1,
+                max_output_tokens=30 * len(batch) + 50
+            )
+            response = yield from _cascade_steps(
+                GeminiCall(model, prompt, batch_generation_config, context_desc, call_type="consumer_relevance_batch", product=product_name_for_relevance),
+                is_decisive=lambda response: len(_parse_batch_relevance_verdicts(_response_text(response), len(batch))) == len(batch)
+            )
+            parsed_verdicts = _parse_batch_relevance_verdicts(response.text, len(batch)) if response and response.text else {}
+            if len(parsed_verdicts) < len(batch):
+                logger.warning(f"[CONSUMER] Batched relevance check parsed {len(parsed_verdicts)}/{len(batch)} verdicts. Falling back to single checks for the rest.")
+            for position, is_relevant in parsed_verdicts.items():
+                verdicts[batch_start + position] = {"is_relevant": is_relevant, "source": "batch"}
+        except ResourceExhausted:
+            logger.error(f"[{context_desc}] Failed after max retries due to 429 error. Falling back to single checks.")
+        except Exception as e:
+            logger.error(f"[{context_desc}] An unexpected error occurred: {e}. Falling back to single checks.")
+
+    results = []
+    for index, (video_title, video_description) in enumerate(videos):
+        verdict = verdicts[index]
+        if verdict is None:
+            is_relevant = yield from _check_video_relevance_steps(video_title, video_description or "", product_name_for_relevance, product_keywords, on_error=None)
+            verdict = {
+                "is_relevant": bool(is_relevant),
+                "source": "single_fallback" if is_relevant is not None else "error"
+            }
+        else:
+            logger.info(f"[CONSUMER] Relevance check for '{video_title}': Gemini (batched) responded {'YES' if verdict['is_relevant'] else 'NO'}")
+        results.append({"index": index, "video_title": video_title, **verdict})
+    return results
+
+def check_video_relevance_batch(videos, product_name_for_relevance, product_keywords):
+    """
+    Classifies many candidate videos for one product with as few Gemini requests as possible.
+    Args:
+        videos (list): (video_title, video_description) pairs.
+        product_name_for_relevance (str): Product the videos should be about.
+        product_keywords (list): Keywords associated with the product search.
+    Returns:
+        list: One verdict dict per input video, in input order:
+              {"index": int, "video_title": str, "is_relevant": bool, "source": "batch" | "single_fallback" | "error"}.
+              Videos missing from (or unparseable in) the batched answer are re-checked with `check_video_relevance`;
+              "error" means no answer could be obtained at all (is_relevant is then False).
+    """
+    return _run_steps(_check_video_relevance_batch_steps(videos, product_name_for_relevance, product_keywords))
+
+async def check_video_relevance_batch_async(videos, product_name_for_relevance, product_keywords):
+    """Async version of `check_video_relevance_batch`: same prompt, parsing and error handling, without blocking the event loop."""
+    return await _run_steps_async(_check_video_relevance_batch_steps(videos, product_name_for_relevance, product_keywords))
+
+# Stand-ins for the per-video values in the cached (video-independent) version of the analysis instructions
+_VIDEO_DETAILS_REFERENCES = {
+    "{video_url_placeholder}": "<video URL from the video details>",
+    "{video_title_placeholder}": "<video title from the video details>",
+    "{channel_name_placeholder}": "<channel name from the video details>",
+}
+
+def _analysis_prompt(model, prompt_label, json_structure_request, product_placeholder, video_url, product_name, video_title, channel_name):
+    """
+    Full analysis prompt (CONSUMER_ANALYSIS_PROMPT around `json_structure_request`), as (model, leading_parts, prompt):
+    the contents are `leading_parts`, the video part, then `prompt`. With GEMINI_PROMPT_CACHE_ENABLED the instructions
+    and JSON structure no longer mention the video and become a prefix cached by `prompt_prefix_cache` (or sent inline
+    in `leading_parts` where caching isn't available); `prompt` then only carries the video details.
+    """
+    safe_video_title = video_title.replace('"', '\\"') # Keep this logic
+    safe_channel_name = channel_name.replace('"', '\\"')
+    safe_product_name = product_name.replace('"', '\\"')
+
+    if not config.GEMINI_PROMPT_CACHE_ENABLED:
+        filled_json_structure = json_structure_request.replace(
+            "{video_url_placeholder}", video_url
+        ).replace(
+            "{video_title_placeholder}", safe_video_title
+        ).replace(
+            "{channel_name_placeholder}", safe_channel_name
+        ).replace(
+            product_placeholder, safe_product_name
+        )
+        prompt = config.CONSUMER_ANALYSIS_PROMPT.format(
+            video_url=video_url,
+            product_name=product_name,
+            json_structure_request=filled_json_structure
+        )
+        return model, [], prompt
+
+    static_json_structure = json_structure_request.replace(product_placeholder, "<product from the video details>")
+    for placeholder, reference in _VIDEO_DETAILS_REFERENCES.items():
+        static_json_structure = static_json_structure.replace(placeholder, reference)
+    static_prompt = config.CONSUMER_ANALYSIS_PROMPT.format(
+        video_url="given in the video details",
+        product_name="<product from the video details>",
+        json_structure_request=static_json_structure
     )
-    prompt = config.CONSUMER_ANALYSIS_PROMPT.format(
-        video_url=video_url,
-        product_name=product_name_context,
-        json_structure_request=filled_json_structure
+    model, leading_parts = prompt_prefix_cache.bind(model, prompt_label, static_prompt)
+    prompt = config.CONSUMER_ANALYSIS_VIDEO_DETAILS.format(
+        video_url=video_url, video_title=safe_video_title, channel_name=safe_channel_name, product_name=safe_product_name
+    )
+    return model, leading_parts, prompt
+
+@functools.lru_cache(maxsize=None)
+def _video_segments_supported():
+    """
+    Segments are sent as `video_metadata` (start/end offsets, fps) on the video part. The Part proto of
+    google-ai-generativelanguage 0.6.x (pinned by google-generativeai 0.8.x) has no such field, and the SDK would
+    reject every segment request; checked once, and long videos are then analyzed whole.
+    """
+    part_fields = getattr(getattr(getattr(glm, "Part", None), "meta", None), "fields", None) or {}
+    if "video_metadata" in part_fields:
+        return True
+    logger.warning("[CONSUMER] VIDEO_SEGMENTED_ANALYSIS_ENABLED is set, but the installed google-ai-generativelanguage has no "
+                   "Part.video_metadata (video offsets); long videos are analyzed whole.")
+    return False
+
+def _analyze_video_segments_steps(model, video_url, product_name_context, leading_parts, prompt, generation_config, duration_seconds):
+    """
+    Segmented mode of `analyze_video_content` for long videos: one request per time window (video start/end offsets,
+    sampled at VIDEO_SEGMENT_FPS), all sent at once, then merged with video_segments.merge_segment_analyses.
+    Every segment has to succeed: a partial merge would silently drop part of the review.
+    """
+    segments = plan_segments(
+        duration_seconds, config.VIDEO_SEGMENT_LENGTH_SECONDS, config.VIDEO_SEGMENT_MAX_SEGMENTS, config.VIDEO_SEGMENT_OVERLAP_SECONDS
+    )
+    calls = []
+    for segment_number, (start_seconds, end_seconds) in enumerate(segments, start=1):
+        video_metadata = {"start_offset": {"seconds": start_seconds}, "end_offset": {"seconds": end_seconds}}
+        if config.VIDEO_SEGMENT_FPS:
+            video_metadata["fps"] = config.VIDEO_SEGMENT_FPS
+        video_file_part = {"file_data": {"mime_type": "video/mp4", "file_uri": video_url}, "video_metadata": video_metadata}
+        segment_note = config.CONSUMER_ANALYSIS_SEGMENT_NOTE.format(
+            segment_start=format_timestamp(start_seconds), segment_end=format_timestamp(end_seconds),
+            segment_number=segment_number, segment_count=len(segments)
+        )
+        calls.append(GeminiCall(
+            model, [*leading_parts, video_file_part, prompt + segment_note], generation_config,
+            f"Consumer Segment Analysis {segment_number}/{len(segments)}: {video_url}",
+            call_type="consumer_segment_analysis", product=product_name_context
+        ))
+
+    logger.info(f"[CONSUMER] Sending segmented analysis of {video_url} ({duration_seconds}s) to Gemini as {len(segments)} segments, product: {product_name_context}")
+    responses = yield calls
+
+    segment_analyses = []
+    for call, response in zip(calls, responses):
+        if isinstance(response, ResourceExhausted):
+            logger.error(f"[{call.context_description}] Failed after max retries due to 429 error.")
+            return None
+        if isinstance(response, Exception):
+            logger.error(f"[{call.context_description}] An unexpected error occurred: {response}")
+            return None
+        try:
+            segment_analyses.append(json.loads(response.text))
+        except (ValueError, AttributeError, TypeError):
+            logger.warning(f"[CONSUMER] Gemini response for [{call.context_description}] was empty or not valid JSON.")
+            if hasattr(response, 'prompt_feedback') and response.prompt_feedback:
+                logger.warning(f"Prompt Feedback: {response.prompt_feedback}")
+            return None
+        if not isinstance(segment_analyses[-1], dict):
+            logger.warning(f"[CONSUMER] Gemini response for [{call.context_description}] is not a JSON object.")
+            return None
+
+    logger.info(f"[CONSUMER] Gemini segmented analysis received for {video_url}, merging {len(segments)} segments.")
+    return json.dumps(merge_segment_analyses(segment_analyses, segments), ensure_ascii=False)
+
+def _analyze_video_content_steps(video_url, product_name_context, video_title_from_yt, channel_name_from_yt, duration_seconds=None):
+    """
+    Logic of `analyze_video_content` / `analyze_video_content_async`, as steps for _run_steps (see GeminiCall).
+    With VIDEO_SEGMENTED_ANALYSIS_ENABLED, videos of at least VIDEO_SEGMENT_MIN_DURATION_SECONDS are analyzed in segments
+    (if the installed SDK can send video offsets, see _video_segments_supported).
+    """
+    segmented = bool(config.VIDEO_SEGMENTED_ANALYSIS_ENABLED and duration_seconds
+                     and duration_seconds >= config.VIDEO_SEGMENT_MIN_DURATION_SECONDS and _video_segments_supported())
+    # Segments use the full analysis model unless they have a model of their own
+    model = get_gemini_model_for("consumer_segment_analysis" if segmented and "consumer_segment_analysis" in config.GEMINI_MODEL_ROUTING else "consumer_analysis")
+    if not model: return None
+
+    model, leading_parts, prompt = _analysis_prompt(
+        model, "consumer_analysis", config.CONSUMER_JSON_REQUEST, "{product_name_placeholder}",
+        video_url, product_name_context, video_title_from_yt, channel_name_from_yt
     )
     video_file_part = {"file_data": {"mime_type": "video/mp4", "file_uri": video_url}}
-    contents = [video_file_part, prompt]
+    contents = [*leading_parts, video_file_part, prompt]
     generation_config = genai.types.GenerationConfig(response_mime_type="application/json", temperature=0.25)
+
+    if segmented:
+        return (yield from _analyze_video_segments_steps(model, video_url, product_name_context, leading_parts, prompt, generation_config, duration_seconds))
     
     context_desc = f"Consumer Full Analysis: {video_url}"
     logger.info(f"[CONSUMER] Sending full analysis request to Gemini for video: {video_url}, product: {product_name_context}")
 
     try:
-        api_lambda = lambda: model.generate_content(contents=contents, generation_config=generation_config)
-        response = _gemini_api_call_with_retry(api_lambda, context_description=context_desc)
+        response = yield GeminiCall(model, contents, generation_config, context_desc, call_type="consumer_analysis", product=product_name_context)
 
         if response and response.text:
             logger.info(f"[CONSUMER] Gemini full analysis received for {video_url}.")
@@ -172,9 +929,126 @@ def analyze_video_content(video_url, product_name_context, video_title_from_yt,
         logger.error(f"[{context_desc}] An unexpected error occurred: {e}")
         return None
 
+def analyze_video_content(video_url, product_name_context, video_title_from_yt, channel_name_from_yt, duration_seconds=None):
+    return _run_steps(_analyze_video_content_steps(video_url, product_name_context, video_title_from_yt, channel_name_from_yt, duration_seconds))
+
+async def analyze_video_content_async(video_url, product_name_context, video_title_from_yt, channel_name_from_yt, duration_seconds=None):
+    """Async version of `analyze_video_content`: same prompt, parsing and error handling, without blocking the event loop."""
+    return await _run_steps_async(_analyze_video_content_steps(video_url, product_name_context, video_title_from_yt, channel_name_from_yt, duration_seconds))
+
+def _match_product_name(reviewed_name, product_names):
+    """
+    The product of `product_names` a multi-product section is about, from the name Gemini echoed back: an exact
+    (case-insensitive) match, else the one product whose name tokens contain, or are contained in, the echoed ones
+    ("Samsung Galaxy S24 Ultra" -> "Galaxy S24 Ultra"), the closest one if several do. None if there is no match
+    or two products are equally close.
+    """
+    reviewed_name = str(reviewed_name or "").strip()
+    exact = next((name for name in product_names if name.lower() == reviewed_name.lower()), None)
+    if exact is not None or not reviewed_name:
+        return exact
+    reviewed_tokens = set(normalize_tokens(reviewed_name))
+    candidates = []
+    for name in product_names:
+        name_tokens = set(normalize_tokens(name))
+        if name_tokens and (name_tokens <= reviewed_tokens or reviewed_tokens <= name_tokens):
+            candidates.append((len(name_tokens ^ reviewed_tokens), name))
+    candidates.sort(key=lambda candidate: candidate[0])
+    if not candidates or (len(candidates) > 1 and candidates[0][0] == candidates[1][0]):
+        return None
+    return candidates[0][1]
+
+def _analyze_video_content_multi_product_steps(video_url, product_names, video_title_from_yt, channel_name_from_yt):
+    """Logic of `analyze_video_content_multi_product` / `analyze_video_content_multi_product_async`, as steps for _run_steps (see GeminiCall)."""
+    model = get_gemini_model_for("consumer_multi_product_analysis")
+    if not model: return None
+
+    safe_video_title = video_title_from_yt.replace('"', '\\"')
+    safe_channel_name = channel_name_from_yt.replace('"', '\\"')
+
+    filled_json_structure = config.CONSUMER_JSON_REQUEST.replace(
+        "{video_url_placeholder}", video_url
+    ).replace(
+        "{video_title_placeholder}", safe_video_title
+    ).replace(
+        "{channel_name_placeholder}", safe_channel_name
+    ).replace(
+        "{product_name_placeholder}", "<product name, exactly as in the list>"
+    )
+    prompt = config.CONSUMER_MULTI_PRODUCT_ANALYSIS_PROMPT.format(
+        video_url=video_url,
+        numbered_product_list="\n".join(f"{position}. {product_name}" for position, product_name in enumerate(product_names, start=1)),
+        json_structure_request=filled_json_structure
+    )
+    video_file_part = {"file_data": {"mime_type": "video/mp4", "file_uri": video_url}}
+    contents = [video_file_part, prompt]
+    generation_config = genai.types.GenerationConfig(response_mime_type="application/json", temperature=0.25)
+
+    context_desc = f"Consumer Multi-Product Analysis: {video_url}"
+    logger.info(f"[CONSUMER] Sending multi-product analysis request to Gemini for video: {video_url}, products: {product_names}")
+
+    try:
+        response = yield GeminiCall(model, contents, generation_config, context_desc, call_type="consumer_multi_product_analysis", product=" + ".join(product_names))
+        if not (response and response.text):
+            logger.warning(f"[CONSUMER] Gemini multi-product response for {video_url} was None or empty after retries.")
+            if response and hasattr(response, 'prompt_feedback') and response.prompt_feedback:
+                logger.warning(f"Prompt Feedback: {response.prompt_feedback}")
+            return None
+
+        try:
+            analyses = json.loads(response.text).get("analyses")
+        except (json.JSONDecodeError, AttributeError):
+            logger.warning(f"[CONSUMER] Gemini multi-product response for {video_url} not valid JSON.")
+            logger.debug(f"[CONSUMER] Raw response: {response.text[:500]}...")
+            return None
+        if not isinstance(analyses, list):
+            logger.warning(f"[CONSUMER] Gemini multi-product response for {video_url} has no 'analyses' list.")
+            return None
+
+        # Match by the product name Gemini echoed back. Sections that match no product are dropped: their products are
+        # left out of the result and analyzed on their own by the caller, never filed under a guessed product.
+        analyses_by_product = {}
+        for analysis in analyses:
+            if not isinstance(analysis, dict):
+                continue
+            reviewed_name = (analysis.get("video_metadata") or {}).get("product_reviewed", "")
+            product_name = _match_product_name(reviewed_name, product_names)
+            if product_name is None:
+                logger.warning(f"[CONSUMER] Multi-product section for '{reviewed_name}' in {video_url} matches none of {product_names}. Ignoring it.")
+                continue
+            if product_name in analyses_by_product:
+                continue
+            video_metadata = analysis.setdefault("video_metadata", {})
+            video_metadata["product_reviewed"] = product_name
+            video_metadata["co_analyzed_products"] = [name for name in product_names if name != product_name]
+            analyses_by_product[product_name] = json.dumps(analysis, ensure_ascii=False)
+
+        logger.info(f"[CONSUMER] Gemini multi-product analysis received for {video_url}: {len(analyses_by_product)}/{len(product_names)} products.")
+        return analyses_by_product
+    except ResourceExhausted:
+        logger.error(f"[{context_desc}] Failed after max retries due to 429 error.")
+        return None
+    except Exception as e:
+        logger.error(f"[{context_desc}] An unexpected error occurred: {e}")
+        return None
+
+def analyze_video_content_multi_product(video_url, product_names, video_title_from_yt, channel_name_from_yt):
+    """
+    Full multimodal analysis of one video for several consumer products in a single request.
+    Returns {product_name: analysis_json_str} for every product Gemini returned a well-formed analysis for
+    (possibly a subset of `product_names`), or None if the request failed.
+    Each analysis has the same structure as `analyze_video_content` output, plus 'video_metadata.co_analyzed_products'.
+    """
+    return _run_steps(_analyze_video_content_multi_product_steps(video_url, product_names, video_title_from_yt, channel_name_from_yt))
+
+async def analyze_video_content_multi_product_async(video_url, product_names, video_title_from_yt, channel_name_from_yt):
+    """Async version of `analyze_video_content_multi_product`: same prompt, parsing and error handling, without blocking the event loop."""
+    return await _run_steps_async(_analyze_video_content_multi_product_steps(video_url, product_names, video_title_from_yt, channel_name_from_yt))
+
 # --- NEW SaaS Product Functions (Modified to use retry helper) ---
-def check_saas_video_relevance_tier1(video_title, video_description, channel_title, saas_product_name):
-    model = get_gemini_model()
+def _check_saas_video_relevance_tier1_steps(video_title, video_description, channel_title, saas_product_name):
+    """Logic of `check_saas_video_relevance_tier1` / `check_saas_video_relevance_tier1_async`, as steps for _run_steps (see GeminiCall)."""
+    model = get_gemini_model_for("saas_tier1")
     if not model: return None
 
     prompt = config.SAAS_TIER1_RELEVANCE_PROMPT.format(
@@ -188,8 +1062,10 @@ def check_saas_video_relevance_tier1(video_title, video_description, channel_tit
     
     try:
         tier1_generation_config = genai.types.GenerationConfig(response_mime_type="application/json", temperature=0.1, max_output_tokens=100)
-        api_lambda = lambda: model.generate_content(prompt, generation_config=tier1_generation_config)
-        response = _gemini_api_call_with_retry(api_lambda, context_description=context_desc)
+        response = yield from _cascade_steps(
+            GeminiCall(model, prompt, tier1_generation_config, context_desc, call_type="saas_tier1", product=saas_product_name),
+            is_decisive=lambda response: _is_json_with_keys(response, ("is_relevant_to_product", "video_type"))
+        )
 
         if response and response.text:
             try:
@@ -215,10 +1091,18 @@ def check_saas_video_relevance_tier1(video_title, video_description, channel_tit
         logger.error(f"[{context_desc}] An unexpected error occurred: {e}")
         return None
 
+def check_saas_video_relevance_tier1(video_title, video_description, channel_title, saas_product_name):
+    return _run_steps(_check_saas_video_relevance_tier1_steps(video_title, video_description, channel_title, saas_product_name))
+
+async def check_saas_video_relevance_tier1_async(video_title, video_description, channel_title, saas_product_name):
+    """Async version of `check_saas_video_relevance_tier1`: same prompt, parsing and error handling, without blocking the event loop."""
+    return await _run_steps_async(_check_saas_video_relevance_tier1_steps(video_title, video_description, channel_title, saas_product_name))
+
 
-def check_saas_video_relevance_tier2(video_title, video_description, channel_title, saas_product_name, video_type_from_tier1):
-    model = get_gemini_model()
-    if not model: return False
+def _check_saas_video_relevance_tier2_steps(video_title, video_description, channel_title, saas_product_name, video_type_from_tier1, on_error=False):
+    """Logic of `check_saas_video_relevance_tier2` / `check_saas_video_relevance_tier2_async`, as steps for _run_steps (see GeminiCall)."""
+    model = get_gemini_model_for("saas_tier2")
+    if not model: return on_error
 
     prompt = config.SAAS_TIER2_SUITABILITY_PROMPT.format(
         saas_product_name=saas_product_name,
@@ -232,8 +1116,10 @@ def check_saas_video_relevance_tier2(video_title, video_description, channel_tit
     
     try:
         tier2_generation_config = genai.types.GenerationConfig(temperature=0.1, max_output_tokens=20)
-        api_lambda = lambda: model.generate_content(prompt, generation_config=tier2_generation_config)
-        response = _gemini_api_call_with_retry(api_lambda, context_description=context_desc)
+        response = yield from _cascade_steps(
+            GeminiCall(model, prompt, tier2_generation_config, context_desc, call_type="saas_tier2", product=saas_product_name),
+            is_decisive=lambda response: _response_text(response).upper() in ("YES_SUITABLE", "NO_UNSUITABLE")
+        )
 
         if response and response.text:
             decision = response.text.strip().upper()
@@ -243,47 +1129,103 @@ def check_saas_video_relevance_tier2(video_title, video_description, channel_tit
             logger.warning(f"[SAAS Tier 2] Response for '{video_title}' was None or empty after retries.")
             if response and hasattr(response, 'prompt_feedback') and response.prompt_feedback:
                 logger.warning(f"Prompt Feedback: {response.prompt_feedback}")
-            return False
+            return on_error
     except ResourceExhausted:
         logger.error(f"[{context_desc}] Failed after max retries due to 429 error.")
-        return False
+        return on_error
     except Exception as e:
         logger.error(f"[{context_desc}] An unexpected error occurred: {e}")
-        return False
+        return on_error
 
+def check_saas_video_relevance_tier2(video_title, video_description, channel_title, saas_product_name, video_type_from_tier1, on_error=False):
+    """Tier 2 suitability check. Returns `on_error` (False by default) if Gemini gave no usable answer."""
+    return _run_steps(_check_saas_video_relevance_tier2_steps(video_title, video_description, channel_title, saas_product_name, video_type_from_tier1, on_error))
 
-def analyze_saas_video_content(video_url, saas_product_name_context, video_title_from_yt, channel_name_from_yt):
-    model = get_gemini_model()
-    if not model: return None
+async def check_saas_video_relevance_tier2_async(video_title, video_description, channel_title, saas_product_name, video_type_from_tier1, on_error=False):
+    """Async version of `check_saas_video_relevance_tier2`: same prompt, parsing and error handling, without blocking the event loop."""
+    return await _run_steps_async(_check_saas_video_relevance_tier2_steps(video_title, video_description, channel_title, saas_product_name, video_type_from_tier1, on_error))
 
-    safe_video_title = video_title_from_yt.replace('"', '\\"')
-    safe_channel_name = channel_name_from_yt.replace('"', '\\"')
-    safe_saas_product_name = saas_product_name_context.replace('"', '\\"')
 
-    filled_json_structure = config.SAAS_JSON_REQUEST.replace(
-        "{video_url_placeholder}", video_url
-    ).replace(
-        "{video_title_placeholder}", safe_video_title
-    ).replace(
-        "{channel_name_placeholder}", safe_channel_name
-    ).replace(
-        "{saas_product_name_placeholder}", safe_saas_product_name
+def _check_saas_video_screening_fused_steps(video_title, video_description, channel_title, saas_product_name):
+    """Logic of `check_saas_video_screening_fused` / `check_saas_video_screening_fused_async`, as steps for _run_steps (see GeminiCall)."""
+    model = get_gemini_model_for("saas_fused")
+    if not model: return None
+
+    prompt = config.SAAS_FUSED_SCREENING_PROMPT.format(
+        saas_product_name=saas_product_name,
+        video_title=video_title,
+        channel_title=channel_title,
+        video_description_snippet=video_description[:500]
     )
-    prompt = config.CONSUMER_ANALYSIS_PROMPT.format( # Re-using this template, ensure it's generic enough
-        video_url=video_url,
-        product_name=saas_product_name_context,
-        json_structure_request=filled_json_structure
+    context_desc = f"SaaS Fused: {video_title[:30]}"
+    logger.debug(f"[SAAS Fused] Sending screening check for '{video_title}' re: '{saas_product_name}'")
+
+    try:
+        fused_generation_config = genai.types.GenerationConfig(response_mime_type="application/json", temperature=0.1, max_output_tokens=120)
+        response = yield from _cascade_steps(
+            GeminiCall(model, prompt, fused_generation_config, context_desc, call_type="saas_fused", product=saas_product_name),
+            is_decisive=lambda response: _is_json_with_keys(response, ("is_relevant_to_product", "video_type", "is_suitable_for_analysis"))
+        )
+
+        if response and response.text:
+            try:
+                result_json = json.loads(response.text)
+                if all(key in result_json for key in ("is_relevant_to_product", "video_type", "is_suitable_for_analysis")):
+                    # A video that isn't about the product can never be suitable, whatever the model said
+                    result_json["is_suitable_for_analysis"] = bool(result_json["is_relevant_to_product"]) and bool(result_json["is_suitable_for_analysis"])
+                    logger.info(
+                        f"[SAAS Fused] Result for '{video_title}': Relevant={result_json['is_relevant_to_product']}, "
+                        f"Type='{result_json['video_type']}', Suitable={result_json['is_suitable_for_analysis']}"
+                    )
+                    return result_json
+                else:
+                    logger.warning(f"[SAAS Fused] Unexpected JSON for '{video_title}': {response.text}")
+                    return None
+            except json.JSONDecodeError:
+                logger.warning(f"[SAAS Fused] Invalid JSON for '{video_title}': {response.text}")
+                return None
+        else:
+            logger.warning(f"[SAAS Fused] Response for '{video_title}' was None or empty after retries.")
+            if response and hasattr(response, 'prompt_feedback') and response.prompt_feedback:
+                logger.warning(f"Prompt Feedback: {response.prompt_feedback}")
+            return None
+    except ResourceExhausted:
+        logger.error(f"[{context_desc}] Failed after max retries due to 429 error.")
+        return None
+    except Exception as e:
+        logger.error(f"[{context_desc}] An unexpected error occurred: {e}")
+        return None
+
+def check_saas_video_screening_fused(video_title, video_description, channel_title, saas_product_name):
+    """
+    Tier 1 (relevance & type) and Tier 2 (suitability) in a single structured-output request.
+    Returns a dict with "is_relevant_to_product", "video_type" and "is_suitable_for_analysis", or None on failure.
+    """
+    return _run_steps(_check_saas_video_screening_fused_steps(video_title, video_description, channel_title, saas_product_name))
+
+async def check_saas_video_screening_fused_async(video_title, video_description, channel_title, saas_product_name):
+    """Async version of `check_saas_video_screening_fused`: same prompt, parsing and error handling, without blocking the event loop."""
+    return await _run_steps_async(_check_saas_video_screening_fused_steps(video_title, video_description, channel_title, saas_product_name))
+
+
+def _analyze_saas_video_content_steps(video_url, saas_product_name_context, video_title_from_yt, channel_name_from_yt):
+    """Logic of `analyze_saas_video_content` / `analyze_saas_video_content_async`, as steps for _run_steps (see GeminiCall)."""
+    model = get_gemini_model_for("saas_analysis")
+    if not model: return None
+
+    model, leading_parts, prompt = _analysis_prompt( # Re-using the consumer analysis template with the SaaS JSON structure
+        model, "saas_analysis", config.SAAS_JSON_REQUEST, "{saas_product_name_placeholder}",
+        video_url, saas_product_name_context, video_title_from_yt, channel_name_from_yt
     )
     video_file_part = {"file_data": {"mime_type": "video/mp4", "file_uri": video_url}}
-    contents = [video_file_part, prompt]
+    contents = [*leading_parts, video_file_part, prompt]
     generation_config = genai.types.GenerationConfig(response_mime_type="application/json", temperature=0.25)
     
     context_desc = f"SaaS Full Analysis: {video_url}"
     logger.info(f"[SAAS] Sending full analysis request to Gemini for video: {video_url}, product: {saas_product_name_context}")
 
     try:
-        api_lambda = lambda: model.generate_content(contents=contents, generation_config=generation_config)
-        response = _gemini_api_call_with_retry(api_lambda, context_description=context_desc)
+        response = yield GeminiCall(model, contents, generation_config, context_desc, call_type="saas_analysis", product=saas_product_name_context)
 
         if response and response.text:
             logger.info(f"[SAAS] Gemini full analysis received for {video_url}.")
@@ -307,18 +1249,171 @@ def analyze_saas_video_content(video_url, saas_product_name_context, video_title
         logger.error(f"[{context_desc}] An unexpected error occurred: {e}")
         return None
 
-def synthesize_analyses_with_gemini(prompt_template, prompt_fill_data, data_batch_for_prompt):
+def analyze_saas_video_content(video_url, saas_product_name_context, video_title_from_yt, channel_name_from_yt):
+    return _run_steps(_analyze_saas_video_content_steps(video_url, saas_product_name_context, video_title_from_yt, channel_name_from_yt))
+
+async def analyze_saas_video_content_async(video_url, saas_product_name_context, video_title_from_yt, channel_name_from_yt):
+    """Async version of `analyze_saas_video_content`: same prompt, parsing and error handling, without blocking the event loop."""
+    return await _run_steps_async(_analyze_saas_video_content_steps(video_url, saas_product_name_context, video_title_from_yt, channel_name_from_yt))
+
+_SYNTHESIS_PART1_MARKER = "Part 1: Textual Summary"
+_SYNTHESIS_PART2_MARKER = "Part 2: Structured JSON Output"
+
+class SynthesisStreamParser:
     """
-    Sends a batch of existing JSON analyses and a synthesis prompt to Gemini.
-    Args:
-        prompt_template (str): The template string for the synthesis prompt.
-        prompt_fill_data (dict): Dictionary to format into the prompt_template.
-        data_batch_for_prompt (str): A string representing the batch of JSON analyses
-                                     (e.g., multiple JSON strings concatenated, or a JSON array string).
-    Returns:
-        tuple: (textual_summary_str, structured_json_output_str) or (None, None) on error.
+    Incremental Part 1 / Part 2 split of a streamed synthesis response.
+    - Text after the Part 1 marker goes to `on_text` as soon as it can no longer be the start of the Part 2 marker,
+      so a report file can be written while Gemini is still generating.
+    - After the Part 2 marker, the JSON block is followed brace by brace (ignoring braces inside strings):
+      it is complete, and validated, the moment its closing brace arrives; anything after it is ignored.
+    `finish()` returns (textual_summary, json_output_str) like the non-streaming parse.
+    """
+
+    MAX_PREAMBLE_CHARS = 2000 # Without a Part 1 marker by then, the response is treated as plain summary text
+
+    def __init__(self, context_desc, on_text=None):
+        self.context_desc = context_desc
+        self.on_text = on_text
+        self._state = "preamble" # -> "summary" -> "json" -> "done"
+        self._pending = ""
+        self._summary_parts = []
+        self._json_chars = []
+        self._json_depth = 0
+        self._in_string = False
+        self._escaped = False
+        self.json_output_str = None
+
+    def _emit(self, text):
+        if not self._summary_parts:
+            text = text.lstrip()
+        if text:
+            self._summary_parts.append(text)
+            if self.on_text is not None:
+                self.on_text(text)
+
+    def feed(self, text):
+        if self._state == "preamble":
+            self._pending += text
+            marker_index = self._pending.find(_SYNTHESIS_PART1_MARKER)
+            if marker_index != -1:
+                self._pending = self._pending[marker_index + len(_SYNTHESIS_PART1_MARKER):]
+            elif len(self._pending) > self.MAX_PREAMBLE_CHARS:
+                logger.warning(f"[{self.context_desc}] No 'Part 1' marker at the start of the streamed synthesis; treating it as summary text.")
+            else:
+                return
+            self._state = "summary"
+            text = ""
+
+        if self._state == "summary":
+            self._pending += text
+            marker_index = self._pending.find(_SYNTHESIS_PART2_MARKER)
+            if marker_index == -1:
+                # Hold back a tail that could be the beginning of a Part 2 marker split across chunks
+                safe_length = len(self._pending) - (len(_SYNTHESIS_PART2_MARKER) - 1)
+                if safe_length > 0:
+                    self._emit(self._pending[:safe_length])
+                    self._pending = self._pending[safe_length:]
+                return
+            self._emit(self._pending[:marker_index])
+            text = self._pending[marker_index + len(_SYNTHESIS_PART2_MARKER):]
+            self._pending = ""
+            self._state = "json"
+
+        if self._state == "json":
+            self._feed_json(text)
+
+    def _feed_json(self, text):
+        for position, char in enumerate(text):
+            if self._json_depth == 0:
+                if char != "{":
+                    continue # Text/code fences before the JSON block
+            elif self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                self._json_chars.append(char)
+                continue
+            elif char == '"':
+                self._in_string = True
+
+            self._json_chars.append(char)
+            if char == "{":
+                self._json_depth += 1
+            elif char == "}":
+                self._json_depth -= 1
+                if self._json_depth == 0:
+                    self._close_json()
+                    return
+
+    def _close_json(self):
+        self._state = "done"
+        json_output_str = "".join(self._json_chars).strip()
+        try:
+            json.loads(json_output_str)
+            self.json_output_str = json_output_str
+            logger.info(f"[{self.context_desc}] Successfully extracted textual summary and valid JSON output for synthesis.")
+        except json.JSONDecodeError as je:
+            logger.error(f"[{self.context_desc}] Extracted JSON from Part 2 is invalid: {je}")
+            logger.debug(f"[{self.context_desc}] Problematic JSON block: {json_output_str}")
+            self._emit("\n\n[ERROR: Could not parse structured JSON from Gemini's Part 2 response. The AI's output for this part was malformed.]")
+
+    def finish(self):
+        """Flushes held-back text at the end of the stream. Returns (textual_summary, json_output_str)."""
+        if self._state in ("preamble", "summary"):
+            if self._state == "preamble":
+                logger.warning(f"[{self.context_desc}] Synthesis response did not contain the expected 'Part 1' marker. Treating entire response as textual summary.")
+            else:
+                logger.warning(f"[{self.context_desc}] Synthesis response did not contain the expected 'Part 2' marker. Treating it as textual summary only.")
+            self._emit(self._pending)
+            self._pending = ""
+        elif self._state == "json":
+            logger.warning(f"[{self.context_desc}] Could not clearly delimit JSON block in Part 2 of synthesis response (stream ended inside it).")
+            self._emit("\n\n[ERROR: The structured JSON in Gemini's Part 2 response was incomplete.]")
+        textual_summary = "".join(self._summary_parts).strip() or None
+        return textual_summary, self.json_output_str
+
+# Start of each analysis in a batch built by report_generator.format_analyses_for_prompt
+_ANALYSIS_BLOCK_START = re.compile(r"^(?=--- Review Analysis \d+ ---$)", re.MULTILINE)
+
+def _split_analyses_batch(data_batch_for_prompt):
+    """Splits a batch of formatted analyses in two halves at analysis boundaries. Returns None if it holds fewer than two."""
+    blocks = [block for block in _ANALYSIS_BLOCK_START.split(data_batch_for_prompt) if block.strip()]
+    if len(blocks) < 2:
+        return None
+    middle = len(blocks) // 2
+    return "".join(blocks[:middle]), "".join(blocks[middle:])
+
+def _synthesize_in_parts_steps(prompt_template, prompt_fill_data, data_batch_for_prompt, context_desc, on_text=None):
     """
-    model = get_gemini_model()
+    Map-reduce for a batch too large for one prompt: each half is synthesized on its own (and split again if
+    still too large), then the partial syntheses are merged by running the same prompt over them.
+    Only the final merge is passed to `on_text`.
+    """
+    halves = _split_analyses_batch(data_batch_for_prompt)
+    if halves is None:
+        logger.error(f"[{context_desc}] A single analysis is over the prompt limit; cannot split further.")
+        return None, None
+
+    partial_blocks = []
+    for part_number, half in enumerate(halves, start=1):
+        textual_summary, json_output_str = yield from _synthesize_analyses_steps(prompt_template, dict(prompt_fill_data), half)
+        if textual_summary is None and json_output_str is None:
+            logger.error(f"[{context_desc}] Partial synthesis {part_number}/{len(halves)} failed.")
+            return None, None
+        partial_blocks.append(
+            f"--- Partial Synthesis {part_number} of {len(halves)} (covers a subset of the review analyses) ---\n"
+            f"Textual Summary:\n{textual_summary or 'N/A'}\n"
+            f"Structured Output:\n{json_output_str or 'N/A'}\n"
+        )
+    logger.info(f"[{context_desc}] Merging {len(partial_blocks)} partial syntheses.")
+    return (yield from _synthesize_analyses_steps(prompt_template, dict(prompt_fill_data), "\n".join(partial_blocks), on_text=on_text))
+
+def _synthesize_analyses_steps(prompt_template, prompt_fill_data, data_batch_for_prompt, on_text=None):
+    """Logic of `synthesize_analyses_with_gemini` / `synthesize_analyses_with_gemini_async`, as steps for _run_steps (see GeminiCall)."""
+    model = get_gemini_model_for("synthesis")
     if not model:
         logger.error("Cannot synthesize analyses: Gemini model not initialized.")
         return None, None
@@ -329,7 +1424,8 @@ def synthesize_analyses_with_gemini(prompt_template, prompt_fill_data, data_batc
     full_prompt = prompt_template.format(**prompt_fill_data)
 
     # For logging context in the retry helper
-    context_desc = f"Synthesis for: {prompt_fill_data.get('brand_name', prompt_fill_data.get('comparison_title', 'Unknown Synthesis'))[:50]}"
+    synthesis_label = prompt_fill_data.get('brand_name', prompt_fill_data.get('comparison_title', 'Unknown Synthesis'))
+    context_desc = f"Synthesis for: {synthesis_label[:50]}"
     logger.info(f"Sending synthesis request to Gemini. Prompt length (approx): {len(full_prompt)} chars. Context: {context_desc}")
     logger.debug(f"Synthesis prompt (first 500 chars): {full_prompt[:500]}...")
     
@@ -343,11 +1439,15 @@ def synthesize_analyses_with_gemini(prompt_template, prompt_fill_data, data_batc
             # max_output_tokens can be quite large for these summaries, consider setting if needed
         )
         
-        # Define the API call as a lambda for the retry helper
-        api_lambda = lambda: model.generate_content(full_prompt, generation_config=synthesis_generation_config)
-        
-        # Call the API through the retry helper
-        response = _gemini_api_call_with_retry(api_lambda, context_description=context_desc)
+        if on_text is not None and config.GEMINI_SYNTHESIS_STREAMING:
+            stream_parser = SynthesisStreamParser(context_desc, on_text)
+            yield GeminiCall(model, full_prompt, synthesis_generation_config, context_desc,
+                             call_type="synthesis", product=synthesis_label, on_chunk=stream_parser.feed)
+            logger.info(f"[{context_desc}] Gemini synthesis stream finished.")
+            return stream_parser.finish()
+
+        # Call the API through the shared rate limiter + retry helper
+        response = yield GeminiCall(model, full_prompt, synthesis_generation_config, context_desc, call_type="synthesis", product=synthesis_label)
 
         if response and response.text: # Check if response exists and has text after potential retries
             logger.info(f"[{context_desc}] Gemini synthesis response received.")
@@ -394,6 +1494,8 @@ def synthesize_analyses_with_gemini(prompt_template, prompt_fill_data, data_batc
                 logger.warning(f"[{context_desc}] Synthesis response did not contain expected 'Part 1' and 'Part 2' markers. Treating entire response as textual summary.")
                 textual_summary = raw_response_text
             
+            if on_text is not None and textual_summary:
+                on_text(textual_summary)
             return textual_summary, json_output_str
             
         else: # Handles case where response is None or response.text is empty after retries
@@ -402,6 +1504,12 @@ def synthesize_analyses_with_gemini(prompt_template, prompt_fill_data, data_batc
                 logger.warning(f"[{context_desc}] Prompt Feedback for synthesis: {response.prompt_feedback}")
             return None, None
 
+    except PromptTooLarge as e: # Only raised with GEMINI_PREFLIGHT_TOKEN_COUNT on
+        if config.GEMINI_OVERSIZED_SYNTHESIS == "split":
+            logger.warning(f"{e}. Splitting the batch into partial syntheses.")
+            return (yield from _synthesize_in_parts_steps(prompt_template, prompt_fill_data, data_batch_for_prompt, context_desc, on_text))
+        logger.error(f"{e}. Synthesis rejected.")
+        return None, None
     except ResourceExhausted: # This will be caught if _gemini_api_call_with_retry re-raises it after max retries
         logger.error(f"[{context_desc}] Synthesis failed after max retries due to 429 error.")
         return None, None
@@ -412,6 +1520,28 @@ def synthesize_analyses_with_gemini(prompt_template, prompt_fill_data, data_batc
              logger.warning(f"[{context_desc}] Prompt Feedback (on error): {response.prompt_feedback}")
         return None, None
 
+def synthesize_analyses_with_gemini(prompt_template, prompt_fill_data, data_batch_for_prompt, on_text=None):
+    """
+    Sends a batch of existing JSON analyses and a synthesis prompt to Gemini.
+    Args:
+        prompt_template (str): The template string for the synthesis prompt.
+        prompt_fill_data (dict): Dictionary to format into the prompt_template.
+        data_batch_for_prompt (str): A string representing the batch of JSON analyses
+                                     (e.g., multiple JSON strings concatenated, or a JSON array string).
+        on_text (callable, optional): Receives the textual summary. With GEMINI_SYNTHESIS_STREAMING the response is
+                                      streamed and `on_text` gets each piece of the summary as it is generated;
+                                      otherwise it is called once with the whole summary.
+    Returns:
+        tuple: (textual_summary_str, structured_json_output_str) or (None, None) on error.
+    With GEMINI_PREFLIGHT_TOKEN_COUNT on, a batch over GEMINI_MAX_PROMPT_TOKENS is split and merged
+    (GEMINI_OVERSIZED_SYNTHESIS = "split") or rejected.
+    """
+    return _run_steps(_synthesize_analyses_steps(prompt_template, prompt_fill_data, data_batch_for_prompt, on_text))
+
+async def synthesize_analyses_with_gemini_async(prompt_template, prompt_fill_data, data_batch_for_prompt, on_text=None):
+    """Async version of `synthesize_analyses_with_gemini`: same prompt, parsing and error handling, without blocking the event loop."""
+    return await _run_steps_async(_synthesize_analyses_steps(prompt_template, prompt_fill_data, data_batch_for_prompt, on_text))
+
 
 if __name__ == '__main__':
     # Ensure logging is configured for standalone testing of this module
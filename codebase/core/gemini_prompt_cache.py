@@ -0,0 +1,145 @@
+import time
+import hashlib
+import threading
+import logging
+from datetime import timedelta
+import google.generativeai as genai
+import config
+
+logger = logging.getLogger(__name__)
+
+
+def cached_content_name(model):
+    """Name of the cached content a model is bound to ("cachedContents/..."), or None."""
+    cached_content = getattr(model, "cached_content", None)
+    return getattr(cached_content, "name", cached_content) if cached_content else None
+
+
+class _CachedPrefix:
+    """A static prompt prefix held by Gemini context caching; calls go to a model bound to it."""
+
+    def __init__(self, cached_content, model, prefix_hash, ttl_seconds):
+        self.cached_content = cached_content
+        self.model = model
+        self.model.prompt_prefix_hash = prefix_hash # Keeps record/replay keys tied to the prefix's content
+        self.prefix_hash = prefix_hash
+        self.expires_at = time.monotonic() + ttl_seconds
+
+    def bind(self, model):
+        return self.model, []
+
+
+class _InlinePrefix:
+    """Local stand-in when context caching isn't available: the same prefix, sent inline as the first part."""
+
+    def __init__(self, static_text, prefix_hash):
+        self.static_text = static_text
+        self.prefix_hash = prefix_hash
+
+    def bind(self, model):
+        return model, [self.static_text]
+
+
+class PromptPrefixCache:
+    """
+    Gemini context caching for the static part of prompts (instructions + JSON schema), one cached prefix per
+    (model, prompt label). Lifecycle:
+    - create: on first use; a cache left by an earlier run with the same content (display name "<label>-<hash>")
+      is reused, caches of the same label with another hash (the templates changed) are deleted.
+    - refresh: the TTL is extended once less than `refresh_margin_seconds` of it is left.
+    - invalidate: a prefix whose text changed within the run replaces the old cache, which is deleted.
+    If caching fails (SDK without `caching`, model without caching support, prefix under the minimum cacheable size...)
+    the prefix is sent inline instead, for the rest of the run. Safe to share between threads.
+    """
+
+    def __init__(self, ttl_seconds=3600, refresh_margin_seconds=300):
+        self.ttl_seconds = ttl_seconds
+        self.refresh_margin_seconds = refresh_margin_seconds
+        self.stats = {"created": 0, "reused": 0, "refreshed": 0, "invalidated": 0, "inline": 0}
+        self._prefixes = {} # (model_name, label) -> _CachedPrefix | _InlinePrefix
+        self._lock = threading.Lock()
+
+    def bind(self, model, label, static_text):
+        """
+        Returns (model_to_call, leading_parts): a model bound to the cached prefix and [], or (fallback)
+        the model unchanged and [static_text]. The per-call parts go after `leading_parts`.
+        """
+        model_name = getattr(model, "model_name", config.GEMINI_MODEL_NAME)
+        prefix_hash = hashlib.sha256(static_text.encode("utf-8")).hexdigest()[:16]
+        with self._lock:
+            prefix = self._prefixes.get((model_name, label))
+            if prefix is not None and prefix.prefix_hash != prefix_hash:
+                self._delete(prefix, label)
+                prefix = None
+            if prefix is None:
+                prefix = self._prefixes[(model_name, label)] = self._open(model_name, label, static_text, prefix_hash)
+            elif isinstance(prefix, _CachedPrefix) and prefix.expires_at - time.monotonic() < self.refresh_margin_seconds:
+                prefix = self._prefixes[(model_name, label)] = self._refresh(prefix, model_name, label, static_text)
+        return prefix.bind(model)
+
+    def _open(self, model_name, label, static_text, prefix_hash):
+        display_name = f"{label}-{prefix_hash}"
+        try:
+            from google.generativeai import caching
+            cached_content = None
+            for existing in caching.CachedContent.list():
+                if existing.model != model_name or not (existing.display_name or "").startswith(f"{label}-"):
+                    continue
+                if existing.display_name == display_name and cached_content is None:
+                    cached_content = existing
+                    cached_content.update(ttl=timedelta(seconds=self.ttl_seconds)) # Its remaining TTL is unknown here
+                    self.stats["reused"] += 1
+                else: # Stale: built from older templates (or a duplicate)
+                    existing.delete()
+                    self.stats["invalidated"] += 1
+                    logger.info(f"[GEMINI PROMPT CACHE] Deleted stale cached prefix '{existing.display_name}' ({existing.name}).")
+            if cached_content is None:
+                cached_content = caching.CachedContent.create(
+                    model=model_name,
+                    display_name=display_name,
+                    system_instruction=static_text,
+                    ttl=timedelta(seconds=self.ttl_seconds)
+                )
+                self.stats["created"] += 1
+            logger.info(f"[GEMINI PROMPT CACHE] Prompt prefix '{display_name}' cached as {cached_content.name} on '{model_name}'.")
+            return _CachedPrefix(cached_content, genai.GenerativeModel.from_cached_content(cached_content=cached_content), prefix_hash, self.ttl_seconds)
+        except Exception as e:
+            self.stats["inline"] += 1
+            logger.warning(f"[GEMINI PROMPT CACHE] Context caching unavailable for '{label}' on '{model_name}', sending the prompt inline: {e}")
+            return _InlinePrefix(static_text, prefix_hash)
+
+    def _refresh(self, prefix, model_name, label, static_text):
+        try:
+            prefix.cached_content.update(ttl=timedelta(seconds=self.ttl_seconds))
+            prefix.expires_at = time.monotonic() + self.ttl_seconds
+            self.stats["refreshed"] += 1
+            logger.debug(f"[GEMINI PROMPT CACHE] Extended {prefix.cached_content.name} by {self.ttl_seconds}s.")
+            return prefix
+        except Exception as e: # Typically already expired: cache it again
+            logger.info(f"[GEMINI PROMPT CACHE] Could not extend {prefix.cached_content.name} ({e}); caching the prefix again.")
+            return self._open(model_name, label, static_text, prefix.prefix_hash)
+
+    def _delete(self, prefix, label):
+        self.stats["invalidated"] += 1
+        if not isinstance(prefix, _CachedPrefix):
+            return
+        try:
+            prefix.cached_content.delete()
+            logger.info(f"[GEMINI PROMPT CACHE] Prompt for '{label}' changed; deleted {prefix.cached_content.name}.")
+        except Exception as e:
+            logger.warning(f"[GEMINI PROMPT CACHE] Could not delete {prefix.cached_content.name} (it expires with its TTL): {e}")
+
+    def log_summary(self):
+        if not config.GEMINI_PROMPT_CACHE_ENABLED:
+            return
+        with self._lock:
+            logger.info(
+                f"[GEMINI PROMPT CACHE] {self.stats['created']} prefixes cached, {self.stats['reused']} reused from earlier runs, "
+                f"{self.stats['refreshed']} TTL refreshes, {self.stats['invalidated']} invalidated, {self.stats['inline']} sent inline."
+            )
+
+
+prompt_prefix_cache = PromptPrefixCache(
+    ttl_seconds=config.GEMINI_PROMPT_CACHE_TTL_SECONDS,
+    refresh_margin_seconds=config.GEMINI_PROMPT_CACHE_REFRESH_MARGIN_SECONDS
+)
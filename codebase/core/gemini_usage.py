@@ -0,0 +1,124 @@
+import threading
+import logging
+from datetime import datetime, timezone
+import config
+from core import database_manager
+
+logger = logging.getLogger(__name__)
+
+_COUNTERS = ("calls", "failed", "replayed", "retries", "prompt_tokens", "candidates_tokens", "total_tokens", "latency_seconds")
+
+
+class PromptTooLarge(Exception):
+    """Raised by the pre-flight check instead of sending a prompt over GEMINI_MAX_PROMPT_TOKENS."""
+
+    def __init__(self, context_description, prompt_tokens, max_prompt_tokens):
+        super().__init__(f"[{context_description}] Prompt has {prompt_tokens} tokens, over the limit of {max_prompt_tokens}")
+        self.prompt_tokens = prompt_tokens
+        self.max_prompt_tokens = max_prompt_tokens
+
+
+class GeminiUsageTracker:
+    """
+    Tallies every Gemini call of the run: tokens from `usage_metadata` (prompt, candidates, total), latency,
+    429 retries, replayed (record/replay cache) and failed calls, per (call type, product, model);
+    plus the outcome of cascaded screening calls (answered by the light model, or escalated) per call type.
+    Safe to share between threads.
+    """
+
+    def __init__(self):
+        self.run_started_at = datetime.now(timezone.utc)
+        self._totals = {} # (call_type, product, model_name) -> {counter: value, "max_prompt_tokens": int}
+        self._cascade = {} # call_type -> {"accepted": int, "escalated": int}
+        self._lock = threading.Lock()
+
+    def record(self, call_type, product, response=None, latency_seconds=0.0, retries=0, replayed=False, failed=False, model_name=None):
+        usage_metadata = getattr(response, 'usage_metadata', None)
+        prompt_tokens = getattr(usage_metadata, 'prompt_token_count', 0) or 0
+        candidates_tokens = getattr(usage_metadata, 'candidates_token_count', 0) or 0
+        total_tokens = getattr(usage_metadata, 'total_token_count', 0) or 0
+        with self._lock:
+            totals = self._totals.setdefault((call_type, product or "", model_name or ""), dict.fromkeys(_COUNTERS + ("max_prompt_tokens",), 0))
+            totals["calls"] += 1
+            totals["failed"] += failed
+            totals["replayed"] += replayed
+            totals["retries"] += retries
+            totals["prompt_tokens"] += prompt_tokens
+            totals["candidates_tokens"] += candidates_tokens
+            totals["total_tokens"] += total_tokens
+            totals["latency_seconds"] += latency_seconds
+            totals["max_prompt_tokens"] = max(totals["max_prompt_tokens"], prompt_tokens)
+        logger.debug(
+            f"[GEMINI USAGE] {call_type} '{product}' ({model_name}): {prompt_tokens} prompt + {candidates_tokens} output tokens, "
+            f"{latency_seconds:.1f}s, {retries} retries{' (replayed)' if replayed else ''}{' (failed)' if failed else ''}"
+        )
+
+    def record_cascade(self, call_type, escalated):
+        with self._lock:
+            outcomes = self._cascade.setdefault(call_type, {"accepted": 0, "escalated": 0})
+            outcomes["escalated" if escalated else "accepted"] += 1
+
+    def _summarize(self, group_by_index):
+        """Sums the totals by call type (group_by_index=0), product (1) or model (2)."""
+        with self._lock:
+            items = [(key, dict(totals)) for key, totals in self._totals.items()]
+        summary = {}
+        for key, totals in items:
+            group = summary.setdefault(key[group_by_index], dict.fromkeys(_COUNTERS + ("max_prompt_tokens",), 0))
+            for counter in _COUNTERS:
+                group[counter] += totals[counter]
+            group["max_prompt_tokens"] = max(group["max_prompt_tokens"], totals["max_prompt_tokens"])
+        return summary
+
+    def _cascade_snapshot(self):
+        with self._lock:
+            return {call_type: dict(outcomes) for call_type, outcomes in self._cascade.items()}
+
+    def run_totals(self):
+        totals = dict.fromkeys(_COUNTERS, 0)
+        for call_type_totals in self._summarize(0).values():
+            for counter in _COUNTERS:
+                totals[counter] += call_type_totals[counter]
+        return totals
+
+    def log_summary(self):
+        for call_type, totals in sorted(self._summarize(0).items()):
+            logger.info(
+                f"[GEMINI USAGE] {call_type}: {totals['calls']} calls ({totals['failed']} failed, {totals['replayed']} replayed, "
+                f"{totals['retries']} retries), {totals['prompt_tokens']} prompt + {totals['candidates_tokens']} output tokens, "
+                f"largest prompt {totals['max_prompt_tokens']}, {totals['latency_seconds']:.0f}s total latency."
+            )
+        for model_name, totals in sorted(self._summarize(2).items()):
+            logger.info(
+                f"[GEMINI USAGE] Model {model_name or '(unknown)'}: {totals['calls']} calls ({totals['failed']} failed), "
+                f"{totals['total_tokens']} tokens, {totals['latency_seconds'] / max(1, totals['calls']):.1f}s average latency."
+            )
+        for call_type, outcomes in sorted(self._cascade_snapshot().items()):
+            logger.info(
+                f"[GEMINI USAGE] Cascade {call_type}: {outcomes['accepted'] + outcomes['escalated']} screened by the light model, "
+                f"{outcomes['accepted']} accepted, {outcomes['escalated']} escalated."
+            )
+        totals = self.run_totals()
+        logger.info(f"[GEMINI USAGE] Run total: {totals['calls']} calls, {totals['total_tokens']} tokens.")
+
+    def persist(self, run_label):
+        """Saves this run's totals (overall, per call type, per product, per model, cascade outcomes) to the gemini_usage_runs collection."""
+        run_summary = {
+            "run_label": run_label,
+            "app_mode": config.APP_MODE,
+            "model_name": config.GEMINI_MODEL_NAME,
+            "run_started_at": self.run_started_at,
+            "run_finished_at": datetime.now(timezone.utc),
+            "totals": self.run_totals(),
+            # MongoDB field names can't contain dots, product names can
+            "by_call_type": self._summarize(0),
+            "by_product": [dict(totals, product=product) for product, totals in sorted(self._summarize(1).items())],
+            "by_model": [dict(totals, model_name=model_name) for model_name, totals in sorted(self._summarize(2).items())],
+            "cascade": self._cascade_snapshot(),
+        }
+        if run_summary["totals"]["calls"] == 0:
+            return False
+        return database_manager.save_gemini_usage_run(run_summary)
+
+
+gemini_usage = GeminiUsageTracker()
@@ -0,0 +1,108 @@
+import queue
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+_STAGE_DONE = object() # Sentinel pushed through a stage queue once its producers have finished
+
+
+class PipelineStage:
+    """
+    One step of a `StagedPipeline`.
+    `handler(item, emit)` processes a single item and calls `emit(next_item)` zero or more times
+    to pass results to the next stage. Every stage reads from its own bounded queue, so a slow
+    stage makes upstream `emit` calls block (backpressure) instead of buffering unbounded work.
+    `on_finish(emit)`, if given, runs once after the stage's last item, e.g. to flush results it held back.
+    """
+
+    def __init__(self, name, handler, workers=1, queue_size=8, on_finish=None):
+        self.name = name
+        self.handler = handler
+        self.on_finish = on_finish
+        self.workers = max(1, int(workers))
+        self.input_queue = queue.Queue(maxsize=max(1, int(queue_size)))
+        self.processed_count = 0
+        self.failed_count = 0
+        self._stats_lock = threading.Lock()
+
+
+class StagedPipeline:
+    """Runs a linear chain of `PipelineStage`s, each on its own pool of worker threads."""
+
+    def __init__(self, name="pipeline"):
+        self.name = name
+        self.stages = []
+
+    def add_stage(self, name, handler, workers=1, queue_size=8, on_finish=None):
+        self.stages.append(PipelineStage(name, handler, workers=workers, queue_size=queue_size, on_finish=on_finish))
+        return self
+
+    def _make_emit(self, stage_index):
+        if stage_index + 1 >= len(self.stages):
+            return lambda item: None # Output of the last stage is discarded
+        next_queue = self.stages[stage_index + 1].input_queue
+        return lambda item: next_queue.put(item) # Blocks while the next stage is saturated
+
+    def _worker_loop(self, stage_index, remaining_workers, remaining_lock):
+        stage = self.stages[stage_index]
+        emit = self._make_emit(stage_index)
+        while True:
+            item = stage.input_queue.get()
+            if item is _STAGE_DONE:
+                break
+            try:
+                stage.handler(item, emit)
+                with stage._stats_lock:
+                    stage.processed_count += 1
+            except Exception as e:
+                with stage._stats_lock:
+                    stage.failed_count += 1
+                logger.error(f"[{self.name}:{stage.name}] Item failed: {e}")
+
+        # The last worker of a stage to exit tells every worker of the next stage to stop
+        with remaining_lock:
+            remaining_workers[stage_index] -= 1
+            is_last_worker = remaining_workers[stage_index] == 0
+        if is_last_worker and stage.on_finish:
+            try:
+                stage.on_finish(emit)
+            except Exception as e:
+                logger.error(f"[{self.name}:{stage.name}] on_finish failed: {e}")
+        if is_last_worker and stage_index + 1 < len(self.stages):
+            next_stage = self.stages[stage_index + 1]
+            for _ in range(next_stage.workers):
+                next_stage.input_queue.put(_STAGE_DONE)
+
+    def run(self, source_items):
+        """Feeds `source_items` (any iterable, consumed lazily) into the first stage and blocks until every stage has drained."""
+        if not self.stages:
+            return
+
+        remaining_workers = [stage.workers for stage in self.stages]
+        remaining_lock = threading.Lock()
+        threads = []
+        for stage_index, stage in enumerate(self.stages):
+            for worker_number in range(stage.workers):
+                thread = threading.Thread(
+                    target=self._worker_loop,
+                    args=(stage_index, remaining_workers, remaining_lock),
+                    name=f"{self.name}-{stage.name}-{worker_number + 1}",
+                    daemon=True
+                )
+                thread.start()
+                threads.append(thread)
+        logger.info(f"[{self.name}] Started stages: " + ", ".join(f"{s.name} x{s.workers}" for s in self.stages))
+
+        first_stage = self.stages[0]
+        try:
+            for item in source_items:
+                first_stage.input_queue.put(item)
+        finally:
+            for _ in range(first_stage.workers):
+                first_stage.input_queue.put(_STAGE_DONE)
+            for thread in threads:
+                thread.join()
+
+        for stage in self.stages:
+            logger.info(f"[{self.name}] Stage '{stage.name}': {stage.processed_count} processed, {stage.failed_count} failed.")
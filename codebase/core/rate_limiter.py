@@ -0,0 +1,139 @@
+import asyncio
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """
+    Classic token bucket refilled continuously at `rate_per_minute`.
+    Reservations are taken immediately (the level may go negative) and the caller is told how long
+    to wait before using them, so concurrent callers are served in arrival order instead of racing.
+    Not thread-safe on its own: `AdaptiveRateLimiter` guards it with its lock.
+    """
+
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate_per_minute = float(rate_per_minute)
+        self.capacity = float(capacity if capacity is not None else rate_per_minute)
+        self.level = self.capacity
+        self._last_refill = time.monotonic()
+
+    def _refill(self, now):
+        elapsed = now - self._last_refill
+        self._last_refill = now
+        self.level = min(self.capacity, self.level + elapsed * self.rate_per_minute / 60.0)
+
+    def reserve(self, amount, now):
+        """Takes `amount` tokens and returns the seconds to wait before they are actually available."""
+        self._refill(now)
+        amount = min(float(amount), self.capacity) # A single request larger than the bucket must still be able to pass
+        self.level -= amount
+        if self.level >= 0 or self.rate_per_minute <= 0:
+            return 0.0
+        return -self.level * 60.0 / self.rate_per_minute
+
+    def refund(self, amount, now):
+        self._refill(now)
+        self.level = min(self.capacity, self.level + amount)
+
+    def set_rate(self, rate_per_minute, now):
+        self._refill(now)
+        self.rate_per_minute = float(rate_per_minute)
+
+
+class AdaptiveRateLimiter:
+    """
+    Process-wide limiter with separate buckets for requests/minute and tokens/minute.
+
+    The effective rate is `configured limit * rate_fraction`:
+    - every 429 multiplies `rate_fraction` by `decrease_factor` and pauses ALL callers until the
+      server's suggested `retry_delay` (or the caller's backoff) has passed, so threads back off together
+      instead of each retrying on its own;
+    - every `increase_after_successes` consecutive successes raise it again by `increase_step`
+      (additive increase, multiplicative decrease), up to the configured limit.
+    """
+
+    def __init__(self, requests_per_minute, tokens_per_minute, name="rate_limiter",
+                 min_rate_fraction=0.1, decrease_factor=0.5, increase_step=0.1, increase_after_successes=10):
+        self.name = name
+        self.requests_per_minute = float(requests_per_minute)
+        self.tokens_per_minute = float(tokens_per_minute)
+        self.min_rate_fraction = min_rate_fraction
+        self.decrease_factor = decrease_factor
+        self.increase_step = increase_step
+        self.increase_after_successes = increase_after_successes
+
+        self.rate_fraction = 1.0
+        self._consecutive_successes = 0
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+        self._request_bucket = TokenBucket(self.requests_per_minute, capacity=max(1.0, self.requests_per_minute / 6.0)) # ~10 s burst
+        self._token_bucket = TokenBucket(self.tokens_per_minute)
+
+        self.stats = {"acquired": 0, "rate_limited": 0, "total_wait_seconds": 0.0}
+
+    def _apply_rate_fraction(self, now):
+        self._request_bucket.set_rate(self.requests_per_minute * self.rate_fraction, now)
+        self._token_bucket.set_rate(self.tokens_per_minute * self.rate_fraction, now)
+
+    def _reserve(self, estimated_tokens):
+        """Reserves one request carrying `estimated_tokens` and returns how long the caller must wait before sending it."""
+        with self._lock:
+            now = time.monotonic()
+            wait_seconds = max(
+                self._paused_until - now,
+                self._request_bucket.reserve(1, now),
+                self._token_bucket.reserve(estimated_tokens, now)
+            )
+            wait_seconds = max(0.0, wait_seconds)
+            self.stats["acquired"] += 1
+            self.stats["total_wait_seconds"] += wait_seconds
+
+        if wait_seconds > 0:
+            logger.debug(f"[{self.name}] Throttling for {wait_seconds:.2f}s (rate at {self.rate_fraction:.0%} of limit).")
+        return wait_seconds
+
+    def acquire(self, estimated_tokens=0):
+        """Blocks until one request carrying `estimated_tokens` may be sent. Returns the seconds waited."""
+        wait_seconds = self._reserve(estimated_tokens)
+        if wait_seconds > 0:
+            time.sleep(wait_seconds)
+        return wait_seconds
+
+    async def acquire_async(self, estimated_tokens=0):
+        """Like `acquire`, but waits with asyncio.sleep so the event loop keeps running other requests meanwhile."""
+        wait_seconds = self._reserve(estimated_tokens)
+        if wait_seconds > 0:
+            await asyncio.sleep(wait_seconds)
+        return wait_seconds
+
+    def report_success(self, estimated_tokens=0, actual_tokens=None):
+        """Records a successful call. If the real token usage is known, the token bucket is corrected by the difference."""
+        with self._lock:
+            now = time.monotonic()
+            if actual_tokens is not None and estimated_tokens:
+                self._token_bucket.refund(estimated_tokens - actual_tokens, now)
+
+            self._consecutive_successes += 1
+            if self._consecutive_successes >= self.increase_after_successes and self.rate_fraction < 1.0:
+                self.rate_fraction = min(1.0, self.rate_fraction + self.increase_step)
+                self._consecutive_successes = 0
+                self._apply_rate_fraction(now)
+                logger.info(f"[{self.name}] Raising rate to {self.rate_fraction:.0%} of configured limit.")
+
+    def report_rate_limited(self, retry_delay_seconds=None):
+        """Records a 429: slows the shared rate down and pauses every caller for `retry_delay_seconds`."""
+        with self._lock:
+            now = time.monotonic()
+            self.stats["rate_limited"] += 1
+            self._consecutive_successes = 0
+            self.rate_fraction = max(self.min_rate_fraction, self.rate_fraction * self.decrease_factor)
+            self._apply_rate_fraction(now)
+            if retry_delay_seconds:
+                self._paused_until = max(self._paused_until, now + retry_delay_seconds)
+            logger.warning(
+                f"[{self.name}] 429 observed. Rate lowered to {self.rate_fraction:.0%} of configured limit"
+                + (f"; all callers paused for {retry_delay_seconds:.1f}s." if retry_delay_seconds else ".")
+            )
@@ -0,0 +1,165 @@
+import re
+import threading
+import logging
+import config
+
+logger = logging.getLogger(__name__)
+
+# Decisions returned by prefilter_video
+ACCEPT = "accept"         # Clearly relevant: skip the Gemini relevance check
+REJECT = "reject"         # Clearly irrelevant: drop without calling Gemini
+ASK_GEMINI = "ask_gemini" # Ambiguous: let Gemini decide
+
+_stats_lock = threading.Lock()
+prefilter_stats = {
+    "consumer": {ACCEPT: 0, REJECT: 0, ASK_GEMINI: 0},
+    "saas": {ACCEPT: 0, REJECT: 0, ASK_GEMINI: 0},
+}
+
+_negative_pattern_cache = {}
+
+
+def normalize_tokens(text):
+    """Lower-cases and splits on anything that isn't a letter or digit ("iPhone 15 Pro-Max!" -> ['iphone', '15', 'pro', 'max'])."""
+    return re.findall(r"[^\W_]+", (text or "").lower())
+
+
+def _find_phrase(tokens, phrase_tokens):
+    """Returns the start positions where `phrase_tokens` occurs as a contiguous n-gram in `tokens`."""
+    n = len(phrase_tokens)
+    if n == 0:
+        return []
+    return [i for i in range(len(tokens) - n + 1) if tokens[i:i + n] == phrase_tokens]
+
+
+def product_phrases(product_config):
+    """
+    Phrases that identify a product: full name, the name without its brand prefix if at least two words are left
+    ("Salesforce Sales Cloud" -> "Sales Cloud") and generation; for products without a generation (e.g. SaaS) the brand counts too.
+    """
+    phrases = [product_config['name']]
+    name_tokens = normalize_tokens(product_config['name'])
+    brand_tokens = normalize_tokens(product_config.get('brand'))
+    if brand_tokens and name_tokens[:len(brand_tokens)] == brand_tokens and len(name_tokens) - len(brand_tokens) >= 2:
+        phrases.append(" ".join(name_tokens[len(brand_tokens):]))
+    if product_config.get('generation'):
+        phrases.append(product_config['generation'])
+    elif product_config.get('brand'):
+        phrases.append(product_config['brand'])
+    return phrases
+
+
+def _compiled_negative_patterns(patterns):
+    cache_key = tuple(patterns)
+    if cache_key not in _negative_pattern_cache:
+        _negative_pattern_cache[cache_key] = [re.compile(pattern, re.IGNORECASE) for pattern in patterns]
+    return _negative_pattern_cache[cache_key]
+
+
+def score_video(product_config, video_meta):
+    """
+    Scores a search hit for a product using only its title and description.
+    Returns (score, reasons). Higher means more likely to be a relevant review.
+      +4  product name / generation found as an n-gram in the title (+1 if only in the description)
+      +2  a review-intent term in the title ("review", "months later", "recensione", ...)
+      +0.5 per other keyword from `keywords_for_relevance` (max +1)
+      -7  the title names a different model variant (e.g. "15 Pro Max" when the product is "15 Pro")
+      -3  per negative pattern hit in the title (shorts, unboxing-only, leaks/rumours, news recaps, per-product
+          `negative_patterns`; the latter also in the description if the product sets `negative_patterns_in_description`)
+    """
+    title_tokens = normalize_tokens(video_meta.get('title'))
+    description_tokens = normalize_tokens(video_meta.get('description'))
+    score = 0.0
+    reasons = []
+
+    product_phrase_tokens = [normalize_tokens(phrase) for phrase in product_phrases(product_config)]
+
+    title_match_positions = []
+    for phrase_tokens in product_phrase_tokens:
+        title_match_positions += [(start, len(phrase_tokens)) for start in _find_phrase(title_tokens, phrase_tokens)]
+    if title_match_positions:
+        score += 4
+        reasons.append("product in title")
+    elif any(_find_phrase(description_tokens, phrase_tokens) for phrase_tokens in product_phrase_tokens):
+        score += 1
+        reasons.append("product in description only")
+
+    # Wrong model variant: every product-phrase hit in the title is immediately followed by a variant word
+    # that isn't part of this product's own name (e.g. "iphone 15 pro" + "max").
+    own_tokens = set(token for phrase_tokens in product_phrase_tokens for token in phrase_tokens)
+    variant_tokens = set(config.PREFILTER_MODEL_VARIANT_TOKENS) - own_tokens
+    if title_match_positions and all(
+        start + length < len(title_tokens) and title_tokens[start + length] in variant_tokens
+        for start, length in title_match_positions
+    ):
+        score -= 7 # Enough to take "product in title" + "review term" below 0, i.e. reject a clean "<other variant> review"
+        reasons.append("different model variant in title")
+
+    title_text = " ".join(title_tokens)
+    if any(re.search(rf"\b{re.escape(' '.join(normalize_tokens(term)))}\b", title_text) for term in config.PREFILTER_REVIEW_TERMS):
+        score += 2
+        reasons.append("review term in title")
+
+    # Remaining relevance keywords (the product name itself and review terms are already counted above)
+    keyword_bonus = 0.0
+    all_tokens = title_tokens + description_tokens
+    for keyword in product_config.get('keywords_for_relevance', []):
+        keyword_tokens = normalize_tokens(keyword)
+        if keyword_tokens in product_phrase_tokens or keyword.lower() in config.PREFILTER_REVIEW_TERMS:
+            continue
+        if _find_phrase(all_tokens, keyword_tokens):
+            keyword_bonus += 0.5
+    if keyword_bonus:
+        score += min(1.0, keyword_bonus)
+        reasons.append(f"keywords +{min(1.0, keyword_bonus)}")
+
+    # Titles only by default: reviewers' description boilerplate (giveaways, accessory affiliate links, channel blurbs)
+    # would otherwise reject genuine reviews before Gemini ever sees them
+    raw_title = video_meta.get('title') or ''
+    product_pattern_text = raw_title
+    if product_config.get('negative_patterns_in_description'):
+        product_pattern_text = f"{raw_title}\n{video_meta.get('description') or ''}"
+    for patterns, text in ((config.PREFILTER_NEGATIVE_PATTERNS, raw_title), (product_config.get('negative_patterns', []), product_pattern_text)):
+        for pattern in _compiled_negative_patterns(patterns):
+            if pattern.search(text):
+                score -= 3
+                reasons.append(f"negative pattern '{pattern.pattern}'")
+
+    return score, reasons
+
+
+def prefilter_video(product_config, video_meta, pipeline_kind="consumer", allow_accept=True):
+    """
+    Decides locally whether a candidate needs a Gemini relevance check.
+    Returns ACCEPT, REJECT or ASK_GEMINI. With `allow_accept=False` (used for SaaS, where Gemini also
+    classifies the video type) confident hits still go to Gemini and only clear misses are dropped.
+    """
+    if not config.PREFILTER_ENABLED:
+        return ASK_GEMINI
+
+    score, reasons = score_video(product_config, video_meta)
+    if score >= config.PREFILTER_ACCEPT_SCORE and allow_accept:
+        decision = ACCEPT
+    elif score <= config.PREFILTER_REJECT_SCORE:
+        decision = REJECT
+    else:
+        decision = ASK_GEMINI
+
+    with _stats_lock:
+        prefilter_stats[pipeline_kind][decision] += 1
+    logger.debug(f"[PREFILTER] '{video_meta.get('title')}' for '{product_config['name']}': score={score} ({', '.join(reasons) or 'no signals'}) -> {decision}")
+    return decision
+
+
+def log_prefilter_summary():
+    """Logs how many candidates were decided locally, i.e. how many Gemini screening calls were avoided."""
+    with _stats_lock:
+        for pipeline_kind, counts in prefilter_stats.items():
+            evaluated = sum(counts.values())
+            if not evaluated:
+                continue
+            decided_locally = counts[ACCEPT] + counts[REJECT]
+            logger.info(
+                f"[PREFILTER] {pipeline_kind}: {evaluated} candidates scored, {counts[ACCEPT]} accepted, {counts[REJECT]} rejected, "
+                f"{counts[ASK_GEMINI]} sent to Gemini. Gemini screening checks avoided: {decided_locally} ({decided_locally / evaluated:.0%})."
+            )
@@ -0,0 +1,182 @@
+import math
+from collections import Counter
+
+# Sentiment scale used to combine per-segment feature / overall sentiments
+_SENTIMENT_SCORES = {"Very Positive": 2, "Positive": 1, "Neutral": 0, "Negative": -1, "Very Negative": -2}
+_SCORE_SENTIMENTS = {score: sentiment for sentiment, score in _SENTIMENT_SCORES.items()}
+_UNKNOWN_VALUES = ("", "Not Mentioned", "Not Clear", None)
+_OVERALL_SENTIMENTS = {"Very Positive": "Positive", "Very Negative": "Negative"} # Onto overall_sentiment's shorter ENUM
+
+
+def plan_segments(duration_seconds, segment_length_seconds, max_segments, overlap_seconds=0):
+    """
+    Splits a video of `duration_seconds` into at most `max_segments` windows of roughly `segment_length_seconds`
+    (equal lengths, each extended by `overlap_seconds` into the next one so nothing said across a cut is lost).
+    Returns [(start_seconds, end_seconds)], a single window if the video needs no splitting.
+    """
+    segment_count = max(1, min(max_segments, math.ceil(duration_seconds / segment_length_seconds)))
+    window = math.ceil(duration_seconds / segment_count)
+    return [
+        (index * window, min(duration_seconds, (index + 1) * window + overlap_seconds))
+        for index in range(segment_count)
+    ]
+
+
+def format_timestamp(seconds):
+    return f"{int(seconds) // 60:02d}:{int(seconds) % 60:02d}"
+
+
+def _first_known(values):
+    return next((value for value in values if value not in _UNKNOWN_VALUES), None)
+
+
+def _last_known(values):
+    return _first_known(reversed(list(values)))
+
+
+def _unique(items, key=lambda item: item):
+    """Keeps the first occurrence of each item (by `key`), in order."""
+    seen = set()
+    unique_items = []
+    for item in items:
+        item_key = key(item)
+        if item_key in seen:
+            continue
+        seen.add(item_key)
+        unique_items.append(item)
+    return unique_items
+
+
+def _combine_sentiments(sentiments, weights):
+    """
+    Duration-weighted combination of ENUM sentiments. Positive and negative opinions in different segments give
+    "Mixed"; otherwise the weighted mean is rounded back onto the scale. Unknown values are ignored.
+    """
+    known = [(sentiment, weight) for sentiment, weight in zip(sentiments, weights) if sentiment not in _UNKNOWN_VALUES]
+    if not known:
+        return _first_known(sentiments) or (sentiments[0] if sentiments else "Not Mentioned")
+    if len({sentiment for sentiment, _ in known}) == 1:
+        return known[0][0]
+    scored = [(_SENTIMENT_SCORES[sentiment], weight) for sentiment, weight in known if sentiment in _SENTIMENT_SCORES]
+    if len(scored) < len(known) or (any(score > 0 for score, _ in scored) and any(score < 0 for score, _ in scored)):
+        return "Mixed"
+    mean_score = sum(score * weight for score, weight in scored) / sum(weight for _, weight in scored)
+    return _SCORE_SENTIMENTS[int(math.floor(mean_score + 0.5))]
+
+
+def _most_common(values, weights):
+    """Duration-weighted most frequent known value; ties go to the earliest segment."""
+    totals = Counter()
+    for value, weight in zip(values, weights):
+        if value not in _UNKNOWN_VALUES:
+            totals[value] += weight
+    if not totals:
+        return _first_known(values) or (values[0] if values else "Not Clear")
+    best = max(totals.values())
+    return next(value for value in values if totals.get(value) == best)
+
+
+def _join_texts(texts, labels):
+    """Joins the distinct non-empty texts, each prefixed with its segment label when there are several."""
+    labelled = _unique([(label, text.strip()) for label, text in zip(labels, texts) if isinstance(text, str) and text.strip()],
+                       key=lambda item: item[1])
+    if len(labelled) == 1:
+        return labelled[0][1]
+    return " ".join(f"[{label}] {text}" for label, text in labelled)
+
+
+def _merge_feature_analysis(analyses, weights, labels):
+    features = {} # normalized feature name -> [(segment position, entry)]
+    for position, analysis in enumerate(analyses):
+        for entry in analysis.get("feature_analysis") or []:
+            if isinstance(entry, dict) and entry.get("feature_name"):
+                features.setdefault(entry["feature_name"].strip().lower(), []).append((position, entry))
+
+    merged = []
+    for entries in features.values(): # dicts keep first-appearance order
+        positions = [position for position, _ in entries]
+        merged.append({
+            "feature_name": entries[0][1]["feature_name"].strip(),
+            "sentiment": _combine_sentiments([entry.get("sentiment") for _, entry in entries], [weights[p] for p in positions]),
+            "specific_comments": _join_texts([entry.get("specific_comments") for _, entry in entries], [labels[p] for p in positions]),
+            "key_quote_feature": _first_known(entry.get("key_quote_feature") for _, entry in entries) or "",
+        })
+    return merged
+
+
+def _merge_non_verbal_cues(analyses, weights, labels):
+    cues = [analysis.get("non_verbal_cues") or {} for analysis in analyses]
+    return {
+        "overall_reviewer_demeanour": _most_common([cue.get("overall_reviewer_demeanour") for cue in cues], weights),
+        "demeanour_justification": _join_texts([cue.get("demeanour_justification") for cue in cues], labels),
+        "notable_facial_expressions": [item for cue in cues for item in cue.get("notable_facial_expressions") or []],
+        "tone_of_voice_analysis": [item for cue in cues for item in cue.get("tone_of_voice_analysis") or []],
+        "gestures_and_body_language": [item for cue in cues for item in cue.get("gestures_and_body_language") or []],
+    }
+
+
+def _merge_overall_assessment(analyses, weights):
+    assessments = [analysis.get("overall_assessment") or {} for analysis in analyses]
+    numeric_scores = [(assessment.get("sentiment_score_numeric"), weight) for assessment, weight in zip(assessments, weights)
+                      if isinstance(assessment.get("sentiment_score_numeric"), (int, float))]
+    overall_sentiment = _combine_sentiments([assessment.get("overall_sentiment") for assessment in assessments], weights)
+    if overall_sentiment in _UNKNOWN_VALUES:
+        overall_sentiment = "Neutral"
+    return {
+        "overall_sentiment": _OVERALL_SENTIMENTS.get(overall_sentiment, overall_sentiment),
+        "sentiment_score_numeric": round(sum(score * weight for score, weight in numeric_scores) / sum(weight for _, weight in numeric_scores), 2)
+                                   if numeric_scores else None,
+        "summary_review": _last_known(assessment.get("summary_review") for assessment in assessments) or "", # The verdict usually comes at the end
+        "key_positive_takeaways": _unique(item for assessment in assessments for item in assessment.get("key_positive_takeaways") or []),
+        "key_negative_takeaways": _unique(item for assessment in assessments for item in assessment.get("key_negative_takeaways") or []),
+    }
+
+
+def merge_segment_analyses(segment_analyses, segments):
+    """
+    Deterministic merge of per-segment consumer analyses (same JSON structure as a whole-video analysis) into one.
+    segment_analyses: parsed analysis dicts, in segment order; segments: the matching (start_seconds, end_seconds).
+    - feature_analysis: one entry per feature name; sentiments combined by segment duration, comments labelled by time range.
+    - non_verbal_cues: most common demeanour (by duration); expressions, tone and gesture lists concatenated in order.
+    - overall_assessment: sentiments combined by segment duration like the features' ("Mixed" only if some segments are
+      positive and others negative), duration-weighted numeric score, last segment's summary, takeaways de-duplicated.
+    - Other sections: the first segment that has the information (target audience: the last one).
+    `video_metadata.analyzed_segments` records the windows.
+    """
+    weights = [max(1, end - start) for start, end in segments]
+    labels = [f"{format_timestamp(start)}-{format_timestamp(end)}" for start, end in segments]
+
+    pricing_sections = [analysis.get("pricing_and_value") or {} for analysis in segment_analyses]
+    comparison_sections = [analysis.get("comparison_context") or {} for analysis in segment_analyses]
+    brand_sections = [analysis.get("brand_perception") or {} for analysis in segment_analyses]
+    additional_sections = [analysis.get("additional_elements") or {} for analysis in segment_analyses]
+
+    merged = {
+        "video_metadata": dict(segment_analyses[0].get("video_metadata") or {}),
+        "overall_assessment": _merge_overall_assessment(segment_analyses, weights),
+        "feature_analysis": _merge_feature_analysis(segment_analyses, weights, labels),
+        "pricing_and_value": next((section for section in pricing_sections if section.get("price_mention") is True), pricing_sections[0]),
+        "comparison_context": {
+            "vs_previous_generation": next(
+                (section.get("vs_previous_generation") for section in comparison_sections
+                 if (section.get("vs_previous_generation") or {}).get("mentioned") is True),
+                comparison_sections[0].get("vs_previous_generation") or {}
+            ),
+            "vs_competitors": _unique(
+                (item for section in comparison_sections for item in section.get("vs_competitors") or [] if isinstance(item, dict)),
+                key=lambda item: str(item.get("competitor_name", "")).strip().lower() + "|" + str(item.get("comparison_points", ""))
+            ),
+        },
+        "brand_perception": next((section for section in brand_sections if section.get("brand_sentiment") not in _UNKNOWN_VALUES), brand_sections[0]),
+        "target_audience": {
+            "suggested_by_reviewer": _last_known((analysis.get("target_audience") or {}).get("suggested_by_reviewer") for analysis in segment_analyses) or ""
+        },
+        "non_verbal_cues": _merge_non_verbal_cues(segment_analyses, weights, labels),
+        "additional_elements": {
+            "key_quote_overall_positive": _first_known(section.get("key_quote_overall_positive") for section in additional_sections) or "",
+            "key_quote_overall_negative": _first_known(section.get("key_quote_overall_negative") for section in additional_sections) or "",
+            "notable_mentions": _unique(item for section in additional_sections for item in section.get("notable_mentions") or []),
+        },
+    }
+    merged["video_metadata"]["analyzed_segments"] = [{"start_seconds": start, "end_seconds": end} for start, end in segments]
+    return merged
@@ -0,0 +1,89 @@
+import threading
+import logging
+from datetime import datetime, timezone, timedelta
+import config
+from core import database_manager
+
+logger = logging.getLogger(__name__)
+
+
+class DiscoveryWatermarks:
+    """
+    Per-(source, product) discovery watermarks. A source is a reviewer channel ("channel:<id>") or a
+    general search query ("query:<text>"). Searches ask only for videos published after the stored
+    watermark. New watermarks are written once, at the end of the run (`commit`), and only for the
+    sources where everything worked: the search, the screening and every full analysis. A source with
+    any failure, or whose results since the watermark were not all screened (search capped, screening
+    stopped early), keeps its old watermark, so its videos are seen again next time. Watermarked searches are
+    sorted newest first (`SEARCH_ORDER`), so what a cap leaves unread is always older than what was screened:
+    a capped first scan still sets the baseline, as the searches never read past their cap anyway.
+    """
+
+    SEARCH_ORDER = "date"
+
+    def __init__(self, enabled=True, overlap_hours=48):
+        self.enabled = enabled
+        self.full_rescan = False
+        self.overlap = timedelta(hours=overlap_hours)
+        self.run_started_at = datetime.now(timezone.utc)
+        self._stored = None # Loaded on first use: {(source_key, product_config_name): datetime}
+        self._sources = {} # (source_key, product_config_name) -> True if anything failed for it in this run
+        self._watermarked = set() # Sources of this run that already had a stored watermark
+        self._lock = threading.Lock()
+
+    def begin(self, source_key, product_config_name):
+        """
+        Registers a discovery source for this run and returns the RFC 3339 `publishedAfter` to search with,
+        or None for a full scan (first run, `--full-rescan`, or watermarks disabled).
+        """
+        if not self.enabled:
+            return None
+        with self._lock:
+            self._sources.setdefault((source_key, product_config_name), False)
+            if self._stored is None:
+                self._stored = database_manager.get_discovery_watermarks()
+                logger.info(f"[WATERMARKS] Loaded {len(self._stored)} discovery watermarks.")
+            watermark = self._stored.get((source_key, product_config_name))
+            if watermark is not None:
+                self._watermarked.add((source_key, product_config_name))
+        if watermark is None or self.full_rescan:
+            return None
+        return (watermark - self.overlap).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+    def mark_failed(self, source_key, product_config_name):
+        """Keeps the source's watermark where it is: something found through it was not fully processed."""
+        if not self.enabled or source_key is None:
+            return
+        with self._lock:
+            self._sources[(source_key, product_config_name)] = True
+
+    def mark_incomplete(self, source_key, product_config_name):
+        """
+        Keeps the source's watermark where it is: some of its results were never screened (capped or cut short).
+        Ignored for a source without a stored watermark: its first scan sets the baseline however far it got.
+        """
+        with self._lock:
+            watermarked = (source_key, product_config_name) in self._watermarked
+        if watermarked:
+            self.mark_failed(source_key, product_config_name)
+
+    def commit(self):
+        """Advances the watermark of every source that was searched to the end without failures to the start of this run."""
+        if not self.enabled:
+            return
+        with self._lock:
+            sources = dict(self._sources)
+        advanced = 0
+        for (source_key, product_config_name), failed in sources.items():
+            if failed:
+                logger.info(f"[WATERMARKS] Not advancing '{source_key}' for '{product_config_name}': it had failures or unscreened results in this run.")
+                continue
+            if database_manager.save_discovery_watermark(source_key, product_config_name, self.run_started_at):
+                advanced += 1
+        logger.info(f"[WATERMARKS] Advanced {advanced}/{len(sources)} discovery watermarks to {self.run_started_at.isoformat()}.")
+
+
+discovery_watermarks = DiscoveryWatermarks(
+    enabled=config.DISCOVERY_WATERMARKS_ENABLED,
+    overlap_hours=config.DISCOVERY_WATERMARK_OVERLAP_HOURS
+)
@@ -0,0 +1,135 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+import logging
+import config
+
+logger = logging.getLogger(__name__)
+
+
+def _normalize_params(params):
+    """Drops empty values and normalizes whitespace/case where YouTube doesn't care, so equivalent requests share a key."""
+    normalized = {}
+    for name, value in params.items():
+        if value is None or value == "":
+            continue
+        if name == 'q':
+            value = " ".join(str(value).lower().split())
+        normalized[name] = str(value)
+    return normalized
+
+
+class YouTubeResponseCache:
+    """
+    Disk-backed (SQLite) cache of YouTube Data API responses, keyed by endpoint + normalized request parameters.
+    - Entries expire after a per-endpoint TTL (`ttl_seconds_by_endpoint`; endpoints without a TTL are not cached).
+    - The table is kept at `max_entries` by evicting the least recently used rows.
+    - `bypass=True` skips lookups (fresh results are still stored), e.g. to force a refresh.
+    Safe to share between threads.
+    """
+
+    def __init__(self, path, ttl_seconds_by_endpoint, max_entries=20000, enabled=True, bypass=False):
+        self.path = path
+        self.ttl_seconds_by_endpoint = dict(ttl_seconds_by_endpoint)
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self.bypass = bypass
+        self.stats = {}  # endpoint -> {"hits": int, "misses": int}
+        self._lock = threading.Lock()
+        self._connection = None
+
+    def _get_connection(self):
+        if self._connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._connection = sqlite3.connect(self.path, check_same_thread=False)
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " cache_key TEXT PRIMARY KEY, endpoint TEXT, response_json TEXT, created_at REAL, last_access REAL)"
+            )
+            self._connection.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses(last_access)")
+            self._connection.commit()
+            logger.info(f"YouTube response cache opened at '{self.path}'.")
+        return self._connection
+
+    def _cache_key(self, endpoint, params):
+        key_material = endpoint + "|" + json.dumps(_normalize_params(params), sort_keys=True)
+        return hashlib.sha256(key_material.encode("utf-8")).hexdigest()
+
+    def _count(self, endpoint, outcome):
+        endpoint_stats = self.stats.setdefault(endpoint, {"hits": 0, "misses": 0})
+        endpoint_stats[outcome] += 1
+
+    def _is_cacheable(self, endpoint):
+        return self.enabled and self.ttl_seconds_by_endpoint.get(endpoint)
+
+    def get(self, endpoint, params):
+        """Returns the cached response dict, or None on a miss (or when caching/lookups are disabled)."""
+        if not self._is_cacheable(endpoint) or self.bypass:
+            return None
+        cache_key = self._cache_key(endpoint, params)
+        now = time.time()
+        try:
+            with self._lock:
+                connection = self._get_connection()
+                row = connection.execute(
+                    "SELECT response_json, created_at FROM responses WHERE cache_key = ?", (cache_key,)
+                ).fetchone()
+                if row is None or now - row[1] > self.ttl_seconds_by_endpoint[endpoint]:
+                    if row is not None:
+                        connection.execute("DELETE FROM responses WHERE cache_key = ?", (cache_key,))
+                        connection.commit()
+                    self._count(endpoint, "misses")
+                    return None
+                connection.execute("UPDATE responses SET last_access = ? WHERE cache_key = ?", (now, cache_key))
+                connection.commit()
+                self._count(endpoint, "hits")
+            logger.debug(f"[YT CACHE] Hit for {endpoint} {_normalize_params(params)}")
+            return json.loads(row[0])
+        except (sqlite3.Error, json.JSONDecodeError) as e:
+            logger.warning(f"[YT CACHE] Lookup failed for {endpoint}, treating as a miss: {e}")
+            return None
+
+    def put(self, endpoint, params, response):
+        if not self._is_cacheable(endpoint):
+            return
+        cache_key = self._cache_key(endpoint, params)
+        now = time.time()
+        try:
+            with self._lock:
+                connection = self._get_connection()
+                connection.execute(
+                    "INSERT OR REPLACE INTO responses (cache_key, endpoint, response_json, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                    (cache_key, endpoint, json.dumps(response), now, now)
+                )
+                # LRU eviction: keep only the `max_entries` most recently used rows
+                connection.execute(
+                    "DELETE FROM responses WHERE cache_key IN ("
+                    " SELECT cache_key FROM responses ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,)
+                )
+                connection.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"[YT CACHE] Could not store response for {endpoint}: {e}")
+
+    def log_summary(self):
+        with self._lock:
+            for endpoint, endpoint_stats in sorted(self.stats.items()):
+                lookups = endpoint_stats["hits"] + endpoint_stats["misses"]
+                logger.info(
+                    f"[YT CACHE] {endpoint}: {endpoint_stats['hits']} hits, {endpoint_stats['misses']} misses "
+                    f"({endpoint_stats['hits'] / lookups:.0%} hit rate)."
+                )
+
+
+response_cache = YouTubeResponseCache(
+    path=config.YOUTUBE_CACHE_PATH,
+    ttl_seconds_by_endpoint=config.YOUTUBE_CACHE_TTL_SECONDS,
+    max_entries=config.YOUTUBE_CACHE_MAX_ENTRIES,
+    enabled=config.YOUTUBE_CACHE_ENABLED,
+    bypass=config.YOUTUBE_CACHE_BYPASS
+)
@@ -1,27 +1,24 @@
 import json
+import re
+import functools
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 import config # To access YOUTUBE_API_KEY and other configs
+from core.youtube_cache import response_cache
+from core.youtube_quota import quota_budget, QuotaBudgetExceeded, seconds_until_quota_reset
+from core.client_providers import ThreadLocalClientProvider
+from core.credential_pool import CredentialPool
 import logging # Import logging
 
 logger = logging.getLogger(__name__) # Use module-level logger
 
-youtube_service = None
-
-def get_youtube_service():
-    """Initializes and returns the YouTube API service object."""
-    global youtube_service
-    if youtube_service:
-        return youtube_service
-    
-    if not config.YOUTUBE_API_KEY:
-        logger.error("YouTube API Key is not configured.") # Use logger
-        return None
-        
+def _build_youtube_service(credential):
+    """Builds a new YouTube API service object for one pooled key (one per thread and key, see youtube_service_providers)."""
     try:
-        youtube_service = build('youtube', 'v3', developerKey=config.YOUTUBE_API_KEY, cache_discovery=False) # Added cache_discovery=False
-        logger.info("YouTube API service initialized successfully.") # Use logger
-        return youtube_service
+        service = build('youtube', 'v3', developerKey=credential.key, cache_discovery=False) # Added cache_discovery=False
+        service.credential = credential # Errors and quota are charged to this key
+        logger.info(f"YouTube API service initialized successfully ({credential.label}).") # Use logger
+        return service
     except HttpError as e:
         error_details = json.loads(e.content.decode('utf-8'))
         logger.error(f"An HTTP error {e.resp.status} occurred during YouTube service initialization:") # Use logger
@@ -31,68 +28,235 @@ def get_youtube_service():
         logger.error(f"An error occurred during YouTube service initialization: {e}") # Use logger
         return None
 
-def find_videos_by_channel(channel_id, query_string, max_results=config.DEFAULT_MAX_VIDEO_RESULTS_PER_QUERY, order=config.VIDEO_ORDER_PREFERENCE):
+youtube_credentials = CredentialPool(
+    "YouTube", config.YOUTUBE_API_KEYS,
+    quarantine_after_errors=config.CREDENTIAL_QUARANTINE_AFTER_ERRORS,
+    quarantine_seconds=config.CREDENTIAL_QUARANTINE_SECONDS
+)
+# A service's HTTP connection is not thread-safe, so every thread gets its own service (per key) and calls never wait on each other
+youtube_service_providers = [
+    ThreadLocalClientProvider(f"YouTube ({credential.label})", functools.partial(_build_youtube_service, credential))
+    for credential in youtube_credentials.credentials
+]
+
+def get_youtube_service():
+    """Returns the calling thread's YouTube API service object for the least-loaded healthy key (built on first use)."""
+    credential = youtube_credentials.pick()
+    if credential is None:
+        logger.error("YouTube API Key is not configured.")
+        return None
+    return youtube_service_providers[credential.index].get()
+
+def _http_error_reason(e):
+    try:
+        return json.loads(e.content.decode('utf-8')).get('error', {}).get('errors', [{}])[0].get('reason')
+    except Exception:
+        return None
+
+def _report_http_error(youtube, e):
     """
-    Finds videos for a specific channel ID and a search query.
-    (Renamed from find_videos for clarity)
+    Charges a 429 / rate-limit / quotaExceeded error to the key that made the call (see youtube_credentials).
+    quotaExceeded quarantines the key at once, until the quota resets; once no other key is left, the whole day's
+    budget is spent. Returns True if the error was one of these (the call may be worth re-sending with another key).
     """
-    youtube = get_youtube_service()
-    if not youtube:
-        logger.warning("YouTube service not available for find_videos_by_channel.") # Use logger
-        return [] 
+    reason = _http_error_reason(e)
+    if e.resp.status != 429 and reason not in ('quotaExceeded', 'rateLimitExceeded', 'userRateLimitExceeded'):
+        return False
+    credential = getattr(youtube, 'credential', None)
+    youtube_credentials.report_rate_limited(credential, seconds_until_quota_reset() if reason == 'quotaExceeded' else None)
+    if reason == 'quotaExceeded' and not youtube_credentials.healthy_count(exclude=credential):
+        quota_budget.mark_exhausted() # Refuse further calls today instead of collecting more 403s
+    return True
+
+def _execute_cached(youtube, endpoint, params):
+    """
+    Runs `<resource>().list(**params)` for an endpoint such as "search.list", served from the on-disk response cache when possible.
+    Returns (response, from_cache). Cached responses cost no quota; real calls are charged to the daily
+    quota budget first and raise QuotaBudgetExceeded instead of going over it. A call refused for its key's quota or
+    rate limit is re-sent with the next healthy key (each key tried at most once) before the error is raised.
+    """
+    cached_response = response_cache.get(endpoint, params)
+    if cached_response is not None:
+        return cached_response, True
+    quota_budget.spend(endpoint)
+    resource_name = endpoint.split('.')[0]
+    tried_credentials = []
+    while True:
+        credential = getattr(youtube, 'credential', None)
+        tried_credentials.append(credential)
+        with youtube_credentials.calling(credential, quota_budget.cost_of(endpoint)):
+            try:
+                response = getattr(youtube, resource_name)().list(**params).execute()
+                break
+            except HttpError as e:
+                if not _report_http_error(youtube, e) or credential is None:
+                    raise
+                next_credential = youtube_credentials.pick(exclude=credential)
+                if next_credential is None or next_credential in tried_credentials or youtube_credentials.is_quarantined(next_credential):
+                    raise
+                logger.warning(f"{endpoint} refused for {credential.label} (HTTP {e.resp.status}); re-sending with {next_credential.label}.")
+                youtube = youtube_service_providers[next_credential.index].get()
+                if youtube is None:
+                    raise
+    youtube_credentials.report_success(credential)
+    response_cache.put(endpoint, params, response)
+    return response, False
 
-    videos_found = []
+def _video_info_from_search_item(item):
+    video_id = item['id']['videoId']
+    return {
+        'title': item['snippet']['title'],
+        'video_id': video_id,
+        'published_at': item['snippet']['publishedAt'],
+        'description': item['snippet']['description'],
+        'url': f"https://www.youtube.com/watch?v={video_id}",
+        'channel_id': item['snippet']['channelId'], # Important to capture the channel
+        'channel_title': item['snippet']['channelTitle']
+    }
+
+def _log_http_error(e, action_description):
+    error_details = json.loads(e.content.decode('utf-8'))
+    logger.error(f"An HTTP error {e.resp.status} occurred while {action_description}:")
+    logger.error(json.dumps(error_details, indent=2))
+    if e.resp.status == 403:
+        reason = error_details.get('error',{}).get('errors',[{}])[0].get('reason')
+        if reason == 'quotaExceeded':
+            logger.critical("CRITICAL: YouTube API daily quota exceeded.") # The key is quarantined by _report_http_error
+        elif reason == 'forbidden' or reason == 'developerKeyInvalid':
+            logger.critical("CRITICAL: YouTube API Key invalid or access denied.")
+
+def _iter_search_results(search_params, max_results, max_quota_units, action_description, on_error=None, on_incomplete=None):
+    """
+    Pages through `search().list` following `nextPageToken`, yielding video_info dicts as each page arrives.
+    Stops after `max_results` videos, when the next page would exceed `max_quota_units` (None = no limit),
+    when there are no more pages, or as soon as the caller stops iterating (no further pages are requested).
+    Errors are logged and end the iteration, like the list-returning functions which return [] on error;
+    `on_error()` is called first, so callers can tell a failed search from one that simply found nothing.
+    `on_incomplete()` is called when the search ends (without error) before its last result: `max_results` or
+    `max_quota_units` reached while more results remained, or the caller stopped iterating.
+    """
+    if not get_youtube_service():
+        logger.warning(f"YouTube service not available for {action_description}.")
+        if on_error:
+            on_error()
+        return
+
+    videos_yielded = 0
+    pages_fetched = 0
+    quota_units_spent = 0
+    page_token = None
+    complete = False # Every result of the search was yielded
+    failed = False
     try:
-        search_params = {
-            'part': 'snippet',
-            'channelId': channel_id,
-            'q': query_string,
-            'maxResults': max_results,
-            'order': order,
-            'type': 'video'
-        }
-        logger.info(f"Searching YouTube (Channel Specific): channel='{channel_id}', query='{query_string}', max_results={max_results}, order='{order}'") # Use logger
-        search_response = youtube.search().list(**search_params).execute()
-
-        for item in search_response.get('items', []):
-            if item.get('id', {}).get('kind') == 'youtube#video':
-                video_id = item['id']['videoId']
-                video_info = {
-                    'title': item['snippet']['title'],
-                    'video_id': video_id,
-                    'published_at': item['snippet']['publishedAt'],
-                    'description': item['snippet']['description'],
-                    'url': f"https://www.youtube.com/watch?v={video_id}",
-                    'channel_id': item['snippet']['channelId'], # Store channelId
-                    'channel_title': item['snippet']['channelTitle']
-                }
-                videos_found.append(video_info)
-        
-        logger.info(f"Found {len(videos_found)} video(s) for query '{query_string}' in channel {channel_id}.") # Use logger
-        return videos_found
+        while videos_yielded < max_results:
+            if max_quota_units is not None and quota_units_spent + config.SEARCH_LIST_QUOTA_COST > max_quota_units:
+                logger.info(f"Stopping {action_description}: next page would exceed the quota cap of {max_quota_units} units.")
+                break
+            page_params = dict(search_params, maxResults=min(50, max_results - videos_yielded)) # 50 is the API maximum per page
+            if page_token:
+                page_params['pageToken'] = page_token
+            # Pages may be pulled from different threads (lazy SaaS search), so take the current thread's service each time
+            search_response, from_cache = _execute_cached(get_youtube_service(), 'search.list', page_params)
+            pages_fetched += 1
+            if not from_cache:
+                quota_units_spent += config.SEARCH_LIST_QUOTA_COST
+
+            page_videos = [item for item in search_response.get('items', []) if item.get('id', {}).get('kind') == 'youtube#video']
+            videos_wanted = max_results - videos_yielded
+            for item in page_videos[:videos_wanted]:
+                videos_yielded += 1
+                yield _video_info_from_search_item(item)
 
+            page_token = search_response.get('nextPageToken')
+            if not page_token:
+                complete = len(page_videos) <= videos_wanted
+                break
+    except QuotaBudgetExceeded as e:
+        failed = True
+        logger.warning(f"Stopping {action_description}: {e}.")
+        if on_error:
+            on_error()
     except HttpError as e:
-        error_details = json.loads(e.content.decode('utf-8'))
-        logger.error(f"An HTTP error {e.resp.status} occurred while searching YouTube (Channel Specific):") # Use logger
-        logger.error(json.dumps(error_details, indent=2)) # Use logger
-        if e.resp.status == 403:
-            reason = error_details.get('error',{}).get('errors',[{}])[0].get('reason')
-            if reason == 'quotaExceeded':
-                logger.critical("CRITICAL: YouTube API daily quota exceeded.") # Use logger
-            elif reason == 'forbidden' or reason == 'developerKeyInvalid':
-                logger.critical("CRITICAL: YouTube API Key invalid or access denied.") # Use logger
-        return []
+        failed = True
+        _log_http_error(e, action_description)
+        if on_error:
+            on_error()
     except Exception as e:
-        logger.error(f"A generic error occurred while searching YouTube (Channel Specific): {e}") # Use logger
-        return []
+        failed = True
+        logger.error(f"A generic error occurred while {action_description}: {e}")
+        if on_error:
+            on_error()
+    finally:
+        # Also runs when the caller stops early (generator closed)
+        logger.info(f"Finished {action_description}: {videos_yielded} video(s) from {pages_fetched} page(s) ({quota_units_spent} quota units)"
+                    + ("." if complete or failed else ", more results left unread."))
+        if not complete and not failed and on_incomplete:
+            on_incomplete()
+
+def iter_videos_by_channel(channel_id, query_string, max_results=config.DEFAULT_MAX_VIDEO_RESULTS_PER_QUERY, order=config.VIDEO_ORDER_PREFERENCE,
+                           max_quota_units=None, published_after=None, on_error=None, on_incomplete=None):
+    """
+    Streaming variant of `find_videos_by_channel`: yields video_info dicts page by page.
+    Stop iterating to stop paging; `max_results` / `max_quota_units` cap the total fetched.
+    `published_after` (RFC 3339, e.g. "2024-05-01T00:00:00Z") restricts results to newer videos.
+    """
+    search_params = {
+        'part': 'snippet',
+        'channelId': channel_id,
+        'q': query_string,
+        'order': order,
+        'type': 'video'
+    }
+    if published_after:
+        search_params['publishedAfter'] = published_after
+    logger.info(f"Searching YouTube (Channel Specific): channel='{channel_id}', query='{query_string}', max_results={max_results}, order='{order}', published_after='{published_after}'")
+    return _iter_search_results(search_params, max_results, max_quota_units, f"searching YouTube (Channel Specific) for '{query_string}' in channel {channel_id}",
+                                on_error=on_error, on_incomplete=on_incomplete)
+
+def find_videos_by_channel(channel_id, query_string, max_results=config.DEFAULT_MAX_VIDEO_RESULTS_PER_QUERY, order=config.VIDEO_ORDER_PREFERENCE):
+    """
+    Finds videos for a specific channel ID and a search query.
+    (Renamed from find_videos for clarity)
+    """
+    return list(iter_videos_by_channel(channel_id, query_string, max_results=max_results, order=order))
+
+def iter_general_videos_by_query(query_string, max_results=config.DEFAULT_MAX_VIDEO_RESULTS_PER_QUERY, order=config.VIDEO_ORDER_PREFERENCE,
+                                 region_code=None, relevance_language=None, max_quota_units=None, published_after=None, on_error=None,
+                                 on_incomplete=None):
+    """
+    Streaming variant of `find_general_videos_by_query`: yields video_info dicts page by page.
+    Args are the same, plus:
+        max_quota_units (int, optional): Stop before a page that would take the quota spent above this
+                                         (each page costs config.SEARCH_LIST_QUOTA_COST units).
+        published_after (str, optional): RFC 3339 timestamp; only videos published after it are returned.
+        on_error (callable, optional): Called if the search stops because of an error.
+        on_incomplete (callable, optional): Called if the search stops before its last result (caps, or the caller stopping).
+    Stop iterating (e.g. `break`) to stop paging early.
+    """
+    search_params = {
+        'part': 'snippet',
+        'q': query_string,
+        'order': order,
+        'type': 'video' # Ensure we only get videos
+    }
+    # Add optional parameters if provided
+    if region_code:
+        search_params['regionCode'] = region_code
+    if relevance_language:
+        search_params['relevanceLanguage'] = relevance_language
+    if published_after:
+        search_params['publishedAfter'] = published_after
+
+    logger.info(f"Searching YouTube (General): query='{query_string}', max_results={max_results}, order='{order}', region='{region_code}', lang='{relevance_language}', published_after='{published_after}'")
+    return _iter_search_results(search_params, max_results, max_quota_units, f"performing general YouTube search for '{query_string}'",
+                                on_error=on_error, on_incomplete=on_incomplete)
 
-# --- NEW FUNCTION TO ADD ---
 def find_general_videos_by_query(query_string, max_results=config.DEFAULT_MAX_VIDEO_RESULTS_PER_QUERY, order=config.VIDEO_ORDER_PREFERENCE, region_code=None, relevance_language=None):
     """
     Performs a general YouTube search for videos based on a query string, not tied to a specific channel.
     Args:
         query_string (str): The search query.
-        max_results (int): Maximum number of results to return.
+        max_results (int): Maximum number of results to return (more than 50 are fetched over several pages).
         order (str): Order of results ('date', 'relevance', 'rating', 'title', 'viewCount').
         region_code (str, optional): An ISO 3166-1 alpha-2 country code (e.g., "US", "GB", "IT").
                                      This biases search results towards content relevant to that region.
@@ -101,61 +265,176 @@ def find_general_videos_by_query(query_string, max_results=config.DEFAULT_MAX_VI
     Returns:
         list: A list of video_info dictionaries, or an empty list on error.
     """
+    return list(iter_general_videos_by_query(query_string, max_results=max_results, order=order,
+                                             region_code=region_code, relevance_language=relevance_language))
+
+# --- Channel Uploads (quota-cheap discovery: 1 unit per call instead of 100 for search.list) ---
+
+def get_uploads_playlist_id(channel_id):
+    """Returns the ID of a channel's "uploads" playlist (channels.list, 1 quota unit), or None on error."""
     youtube = get_youtube_service()
     if not youtube:
-        logger.warning("YouTube service not available for find_general_videos_by_query.") # Use logger
-        return []
+        logger.warning("YouTube service not available for get_uploads_playlist_id.")
+        return None
+    try:
+        channels_response, _ = _execute_cached(youtube, 'channels.list', {'part': 'contentDetails', 'id': channel_id})
+        items = channels_response.get('items', [])
+        if not items:
+            logger.warning(f"Channel {channel_id} not found.")
+            return None
+        return items[0]['contentDetails']['relatedPlaylists']['uploads']
+    except QuotaBudgetExceeded as e:
+        logger.warning(f"Not looking up the uploads playlist of channel {channel_id}: {e}.")
+        return None
+    except HttpError as e:
+        _log_http_error(e, f"looking up the uploads playlist of channel {channel_id}")
+        return None
+    except Exception as e:
+        logger.error(f"A generic error occurred while looking up the uploads playlist of channel {channel_id}: {e}")
+        return None
 
-    videos_found = []
+def iter_channel_uploads(channel_id, max_videos=None, published_after=None):
+    """
+    Yields video_info dicts (same keys as search results) for a channel's uploads, newest first,
+    paging through playlistItems.list (1 quota unit per page of 50).
+    Args:
+        max_videos (int, optional): Stop after this many videos.
+        published_after (str, optional): ISO 8601 timestamp; paging stops at the first older upload.
+    """
+    uploads_playlist_id = get_uploads_playlist_id(channel_id)
+    if not uploads_playlist_id:
+        return
+
+    videos_yielded = 0
+    pages_fetched = 0
+    pages_from_cache = 0
+    page_token = None
     try:
-        search_params = {
-            'part': 'snippet',
-            'q': query_string,
-            'maxResults': max_results,
-            'order': order,
-            'type': 'video' # Ensure we only get videos
-        }
-        # Add optional parameters if provided
-        if region_code:
-            search_params['regionCode'] = region_code
-        if relevance_language:
-            search_params['relevanceLanguage'] = relevance_language
-
-        logger.info(f"Searching YouTube (General): query='{query_string}', max_results={max_results}, order='{order}', region='{region_code}', lang='{relevance_language}'") # Use logger
-        search_response = youtube.search().list(**search_params).execute()
-
-        for item in search_response.get('items', []):
-            if item.get('id', {}).get('kind') == 'youtube#video':
-                video_id = item['id']['videoId']
-                video_info = {
-                    'title': item['snippet']['title'],
+        while max_videos is None or videos_yielded < max_videos:
+            page_params = {'part': 'snippet,contentDetails', 'playlistId': uploads_playlist_id, 'maxResults': 50}
+            if page_token:
+                page_params['pageToken'] = page_token
+            playlist_response, from_cache = _execute_cached(get_youtube_service(), 'playlistItems.list', page_params)
+            pages_fetched += 1
+            pages_from_cache += from_cache
+
+            for item in playlist_response.get('items', []):
+                snippet = item['snippet']
+                if snippet.get('title') in ('Private video', 'Deleted video'):
+                    continue
+                published_at = item.get('contentDetails', {}).get('videoPublishedAt') or snippet['publishedAt']
+                if published_after and published_at < published_after:
+                    return # Uploads are newest first: everything after this is older too
+                video_id = snippet['resourceId']['videoId']
+                yield {
+                    'title': snippet['title'],
                     'video_id': video_id,
-                    'published_at': item['snippet']['publishedAt'],
-                    'description': item['snippet']['description'],
+                    'published_at': published_at,
+                    'description': snippet.get('description', ''),
                     'url': f"https://www.youtube.com/watch?v={video_id}",
-                    'channel_id': item['snippet']['channelId'], # Important to capture the channel
-                    'channel_title': item['snippet']['channelTitle']
+                    'channel_id': snippet.get('videoOwnerChannelId', channel_id),
+                    'channel_title': snippet.get('videoOwnerChannelTitle', snippet.get('channelTitle'))
                 }
-                videos_found.append(video_info)
-        
-        logger.info(f"Found {len(videos_found)} video(s) for general query '{query_string}'.") # Use logger
-        return videos_found
+                videos_yielded += 1
+                if max_videos is not None and videos_yielded >= max_videos:
+                    break
 
+            page_token = playlist_response.get('nextPageToken')
+            if not page_token:
+                break
+    except QuotaBudgetExceeded as e:
+        logger.warning(f"Stopping the uploads listing of channel {channel_id}: {e}.")
     except HttpError as e:
-        error_details = json.loads(e.content.decode('utf-8'))
-        logger.error(f"An HTTP error {e.resp.status} occurred while performing general YouTube search:") # Use logger
-        logger.error(json.dumps(error_details, indent=2)) # Use logger
-        if e.resp.status == 403: # Identical error handling as the other function
-            reason = error_details.get('error',{}).get('errors',[{}])[0].get('reason')
-            if reason == 'quotaExceeded':
-                logger.critical("CRITICAL: YouTube API daily quota exceeded.")
-            elif reason == 'forbidden' or reason == 'developerKeyInvalid':
-                logger.critical("CRITICAL: YouTube API Key invalid or access denied.")
-        return []
+        _log_http_error(e, f"listing uploads of channel {channel_id}")
     except Exception as e:
-        logger.error(f"A generic error occurred while performing general YouTube search: {e}") # Use logger
-        return []
-# --- END OF NEW FUNCTION ---
+        logger.error(f"A generic error occurred while listing uploads of channel {channel_id}: {e}")
+    finally:
+        logger.info(f"Listed {videos_yielded} upload(s) of channel {channel_id} from {pages_fetched} page(s), {pages_from_cache} of them cached.")
+
+# --- Video Details Enrichment ---
+
+_ISO8601_DURATION_PATTERN = re.compile(r"P(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?")
+
+def _parse_iso8601_duration(duration):
+    """'PT1H2M3S' -> 3723. Returns None if the value can't be parsed."""
+    match = _ISO8601_DURATION_PATTERN.fullmatch(duration or "")
+    if not match:
+        return None
+    days, hours, minutes, seconds = (int(part) if part else 0 for part in match.groups())
+    return ((days * 24 + hours) * 60 + minutes) * 60 + seconds
+
+def _video_details_from_item(item):
+    content_details = item.get('contentDetails', {})
+    statistics = item.get('statistics', {})
+    snippet = item.get('snippet', {})
+    return {
+        'duration_seconds': _parse_iso8601_duration(content_details.get('duration')),
+        'view_count': int(statistics['viewCount']) if 'viewCount' in statistics else None,
+        'has_captions': content_details.get('caption') == 'true',
+        'language': snippet.get('defaultAudioLanguage') or snippet.get('defaultLanguage'),
+        'live_broadcast_content': snippet.get('liveBroadcastContent', 'none') # "live" / "upcoming" for streams
+    }
+
+def enrich_videos(videos):
+    """
+    Adds 'duration_seconds', 'view_count', 'has_captions', 'language' and 'live_broadcast_content' to each video_info
+    dict (in place) using videos.list with up to 50 ids per call (1 quota unit each). Uncached calls are sent
+    together as one batch HTTP request. Videos whose details can't be fetched are left unchanged.
+    Returns the same list.
+    """
+    youtube = get_youtube_service()
+    if not youtube or not videos:
+        return videos
+
+    video_ids = list(dict.fromkeys(video['video_id'] for video in videos if 'duration_seconds' not in video))
+    details_by_video_id = {}
+    uncached_params = []
+    cached_chunks = 0
+    for chunk_start in range(0, len(video_ids), 50):
+        params = {'part': 'contentDetails,statistics,snippet', 'id': ",".join(video_ids[chunk_start:chunk_start + 50]), 'maxResults': 50}
+        cached_response = response_cache.get('videos.list', params)
+        if cached_response is not None:
+            details_by_video_id.update((item['id'], _video_details_from_item(item)) for item in cached_response.get('items', []))
+            cached_chunks += 1
+            continue
+        try:
+            quota_budget.spend('videos.list')
+        except QuotaBudgetExceeded as e:
+            logger.warning(f"Skipping video details for the remaining {len(video_ids) - chunk_start} video(s): {e}.")
+            break
+        uncached_params.append(params)
+
+    if uncached_params:
+        def _on_response(request_id, response, exception):
+            if exception is not None:
+                if isinstance(exception, HttpError):
+                    _report_http_error(youtube, exception)
+                    _log_http_error(exception, "fetching video details")
+                else:
+                    logger.error(f"A generic error occurred while fetching video details: {exception}")
+                return
+            youtube_credentials.report_success(credential)
+            response_cache.put('videos.list', uncached_params[int(request_id)], response)
+            details_by_video_id.update((item['id'], _video_details_from_item(item)) for item in response.get('items', []))
+
+        credential = getattr(youtube, 'credential', None)
+        try:
+            batch = youtube.new_batch_http_request(callback=_on_response)
+            for request_index, params in enumerate(uncached_params):
+                batch.add(youtube.videos().list(**params), request_id=str(request_index))
+            with youtube_credentials.calling(credential, quota_budget.cost_of('videos.list', len(uncached_params))):
+                batch.execute()
+        except HttpError as e:
+            _report_http_error(youtube, e)
+            _log_http_error(e, "fetching video details (batch request)")
+        except Exception as e:
+            logger.error(f"A generic error occurred while fetching video details (batch request): {e}")
+
+    for video in videos:
+        video.update(details_by_video_id.get(video['video_id'], {}))
+    logger.info(f"Enriched {len(details_by_video_id)} of {len(video_ids)} video(s) with videos.list "
+                f"({len(uncached_params)} API call(s), {cached_chunks} from cache).")
+    return videos
 
 if __name__ == '__main__':
     # Ensure logging is configured for standalone testing
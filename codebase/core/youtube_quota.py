@@ -0,0 +1,141 @@
+import math
+import threading
+import logging
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+import config
+from core import database_manager
+
+logger = logging.getLogger(__name__)
+
+_QUOTA_TIMEZONE = ZoneInfo("America/Los_Angeles") # YouTube Data API quotas reset at midnight Pacific time
+
+
+class QuotaBudgetExceeded(Exception):
+    """Raised instead of making a YouTube API call that would go over today's quota budget."""
+
+
+def current_quota_day():
+    return datetime.now(_QUOTA_TIMEZONE).date().isoformat()
+
+
+def seconds_until_quota_reset():
+    """Seconds until the next Pacific-time midnight, when the daily quotas reset."""
+    now = datetime.now(_QUOTA_TIMEZONE)
+    next_midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time(), tzinfo=_QUOTA_TIMEZONE)
+    return max(1.0, (next_midnight - now).total_seconds())
+
+
+class YouTubeQuotaBudget:
+    """
+    Tracks YouTube Data API quota spent per Pacific-time day, persisted in MongoDB so that several runs
+    on the same day share one budget. `spend()` is called before every real (uncached) API call and
+    raises `QuotaBudgetExceeded` when the call would exceed `daily_budget`. Safe to share between threads.
+    """
+
+    def __init__(self, daily_budget, endpoint_costs):
+        self.daily_budget = daily_budget
+        self.endpoint_costs = dict(endpoint_costs)
+        self._quota_day = None
+        self._used_units = 0
+        self._run_units = 0
+        self._lock = threading.Lock()
+
+    def cost_of(self, endpoint, calls=1):
+        return self.endpoint_costs.get(endpoint, 1) * calls
+
+    def _roll_day(self):
+        """Loads the stored usage on first use and whenever the Pacific-time day changes. Caller holds the lock."""
+        quota_day = current_quota_day()
+        if quota_day != self._quota_day:
+            stored_units = database_manager.get_youtube_quota_usage(quota_day)
+            self._quota_day = quota_day
+            self._used_units = stored_units or 0
+            logger.info(f"[YT QUOTA] {quota_day} (Pacific): {self._used_units}/{self.daily_budget} units already used.")
+
+    def remaining_units(self):
+        with self._lock:
+            self._roll_day()
+            return max(0, self.daily_budget - self._used_units)
+
+    def spend(self, endpoint, calls=1):
+        """Charges `calls` calls to `endpoint` against today's budget, or raises QuotaBudgetExceeded without charging anything."""
+        units = self.cost_of(endpoint, calls)
+        with self._lock:
+            self._roll_day()
+            if self._used_units + units > self.daily_budget:
+                raise QuotaBudgetExceeded(
+                    f"{endpoint} needs {units} units but only {self.daily_budget - self._used_units} of today's {self.daily_budget} are left"
+                )
+            self._used_units += units
+            self._run_units += units
+            quota_day = self._quota_day
+        database_manager.add_youtube_quota_usage(quota_day, endpoint, units)
+
+    def mark_exhausted(self):
+        """The API answered quotaExceeded (e.g. the key is shared with another tool): refuse everything else today."""
+        with self._lock:
+            self._roll_day()
+            self._used_units = max(self._used_units, self.daily_budget)
+
+    def log_summary(self):
+        with self._lock:
+            logger.info(f"[YT QUOTA] This run used {self._run_units} units; {self._used_units}/{self.daily_budget} used today ({self._quota_day}, Pacific).")
+
+
+def estimate_discovery_units(product_config, reviewers, indexed_channel_ids):
+    """
+    Upper-bound estimate of the YouTube quota one product's discovery needs (cache hits and watermarks make
+    the real cost lower). `indexed_channel_ids` is the set of channels already counted in the channel_index mode,
+    whose uploads are listed once per run for all products; it is updated in place.
+    """
+    videos_list_cost = config.YOUTUBE_QUOTA_COSTS["videos.list"] if config.VIDEO_ENRICHMENT_ENABLED else 0
+    if reviewers is None: # General search (SaaS)
+        max_results = product_config.get('initial_search_max_results', config.SAAS_INITIAL_SEARCH_MAX_RESULTS)
+        pages = math.ceil(max_results / 50)
+        search_units = min(pages * config.SEARCH_LIST_QUOTA_COST,
+                           product_config.get('search_max_quota_units', config.SAAS_SEARCH_MAX_QUOTA_UNITS))
+        return search_units + pages * videos_list_cost
+
+    if config.CONSUMER_DISCOVERY_MODE == "channel_index":
+        units = 0
+        pages_per_channel = math.ceil(config.CHANNEL_INDEX_MAX_VIDEOS_PER_CHANNEL / 50)
+        for reviewer_info in reviewers:
+            if reviewer_info['id'] not in indexed_channel_ids:
+                indexed_channel_ids.add(reviewer_info['id'])
+                units += config.YOUTUBE_QUOTA_COSTS["channels.list"] + pages_per_channel * config.YOUTUBE_QUOTA_COSTS["playlistItems.list"]
+            units += videos_list_cost
+        return units
+
+    return len(reviewers) * (config.SEARCH_LIST_QUOTA_COST + videos_list_cost)
+
+
+def plan_discovery(product_entries, remaining_units):
+    """
+    Plans the run's discovery calls against what is left of today's budget.
+    product_entries: (category, product_config, reviewers or None) tuples, in processing order.
+    Returns the entries that fit, in order; logs the estimate for every product and which ones don't fit.
+    """
+    fitting_entries = []
+    planned_units = 0
+    indexed_channel_ids = set()
+    for entry in product_entries:
+        category, product_config, reviewers = entry
+        estimated_units = estimate_discovery_units(product_config, reviewers, indexed_channel_ids)
+        fits = planned_units + estimated_units <= remaining_units
+        if fits:
+            planned_units += estimated_units
+            fitting_entries.append(entry)
+        logger.info(f"[YT QUOTA] Plan: '{product_config['name']}' ({category}) needs up to {estimated_units} units -> {'fits' if fits else 'does NOT fit'}.")
+
+    logger.info(
+        f"[YT QUOTA] Plan: {len(fitting_entries)}/{len(product_entries)} products fit into the {remaining_units} units left today "
+        f"(up to {planned_units} units planned)."
+    )
+    return fitting_entries
+
+
+quota_budget = YouTubeQuotaBudget(
+    daily_budget=config.YOUTUBE_DAILY_QUOTA_BUDGET,
+    endpoint_costs=config.YOUTUBE_QUOTA_COSTS
+)
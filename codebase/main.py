@@ -1,8 +1,21 @@
-import time
 import config # This will now have IS_TEST_MODE and test limits defined
-from core import youtube_client, gemini_client, database_manager
+from core import youtube_client, gemini_client, database_manager, relevance_prefilter
+from core.channel_index import uploads_index
+from core.youtube_cache import response_cache
+from core.watermarks import discovery_watermarks
+from core.youtube_quota import quota_budget, plan_discovery
+from core.gemini_cache import gemini_response_cache, GEMINI_CACHE_MODES
+from core.gemini_usage import gemini_usage
+from core.gemini_batch import AnalysisBatchWriter, list_batches, ingest_batch
+from core.gemini_prompt_cache import prompt_prefix_cache
+from core.executors import SequentialTaskRunner, create_task_runner
+from core.pipeline import StagedPipeline
+from core.client_providers import warm_up_clients
+import argparse
+import functools
 import logging # Standard library
 import sys
+import threading
 from utils import logging_config # Your custom module for centralized logging
 
 # --- Centralized Logging Setup ---
@@ -14,241 +27,789 @@ logging_config.setup_logging(level=LOGGING_LEVEL)
 # Get a logger for this specific module (main.py)
 logger = logging.getLogger(__name__) # This will use the name "main" if run directly, or "main_orchestrator" if you prefer
 
-def process_consumer_product_with_curated_reviewers(product_config, reviewers_list_for_product):
-    """Processes a consumer product using a predefined list of reviewers."""
+# --- Stored Screening Verdicts ---
+# Gemini screening answers are kept in the 'relevance_verdicts' collection, keyed by (video_id, product, prompt version).
+# They are bulk-loaded once per product per run, so a re-run only pays for candidates that were never screened
+# (or whose verdict expired, or whose screening prompt changed since).
+
+_verdict_cache = {} # (product_config_name, prompt_version) -> {video_id: {"decision", "video_type"}}
+_verdict_cache_lock = threading.Lock()
+verdict_stats = {"reused": 0, "stored": 0}
+
+# --- Offline Batch Mode (--gemini-batch-submit) ---
+# When set, full analyses are not run: their Gemini requests are added to this batch (see defer_analysis)
+analysis_batch_writer = None
+
+
+def _verdict_cache_key(product_config, kind):
+    if kind == 'saas':
+        screening_mode = product_config.get('screening_mode', config.SAAS_DEFAULT_SCREENING_MODE)
+        screening_kind = "saas_fused" if screening_mode == "fused" else "saas_two_tier"
+    else:
+        screening_kind = "consumer_relevance"
+    return product_config['name'], config.get_screening_prompt_version(screening_kind)
+
+
+def prefetch_stored_verdicts(product_config, kind):
+    """Loads all stored verdicts for a product into memory with a single query (no-op if already loaded this run)."""
+    cache_key = _verdict_cache_key(product_config, kind)
+    with _verdict_cache_lock:
+        if cache_key in _verdict_cache:
+            return
+        _verdict_cache[cache_key] = database_manager.get_relevance_verdicts_for_product(*cache_key)
+        logger.info(f"Loaded {len(_verdict_cache[cache_key])} stored screening verdicts for '{cache_key[0]}' (prompt version {cache_key[1]}).")
+
+
+def get_stored_verdict(product_config, kind, video_id):
+    prefetch_stored_verdicts(product_config, kind)
+    with _verdict_cache_lock:
+        verdict = _verdict_cache[_verdict_cache_key(product_config, kind)].get(video_id)
+        if verdict:
+            verdict_stats["reused"] += 1
+        return verdict
+
+
+def record_verdict(product_config, kind, video_id, decision, video_type=None):
+    """Remembers a Gemini screening verdict in memory and in MongoDB. Only call this for real answers, never for API failures."""
+    cache_key = _verdict_cache_key(product_config, kind)
+    with _verdict_cache_lock:
+        _verdict_cache.setdefault(cache_key, {})[video_id] = {"decision": decision, "video_type": video_type}
+        verdict_stats["stored"] += 1
+    database_manager.save_relevance_verdict(
+        video_id, cache_key[0], cache_key[1], decision,
+        video_type=video_type,
+        ttl_days=config.RELEVANCE_VERDICT_TTL_DAYS
+    )
+
+
+# --- Shared Screening / Analysis Steps (used by every execution mode) ---
+
+def mark_discovery_failed(product_config, video_meta):
+    """A video from this discovery source wasn't fully processed: keep the source's watermark so it's found again next run."""
+    discovery_watermarks.mark_failed(video_meta.get('discovery_source'), product_config['name'])
+
+
+def mark_discovery_incomplete(product_config, video_meta):
+    """Screening of this video's discovery source stopped before its last result: keep the source's watermark."""
+    discovery_watermarks.mark_incomplete(video_meta.get('discovery_source'), product_config['name'])
+
+
+def get_video_filters(product_config):
+    """Category thresholds from CATEGORY_VIDEO_FILTERS, with the product's own "video_filters" keys on top."""
+    category = next((category for category, product_configs in config.PRODUCTS_TO_ANALYZE.items()
+                     if any(candidate is product_config for candidate in product_configs)), None)
+    return dict(config.CATEGORY_VIDEO_FILTERS.get(category, {}), **product_config.get('video_filters', {}))
+
+
+def _video_filter_rejection_reason(video_meta, video_filters):
+    """Returns why a video fails the thresholds, or None. Missing details never reject a video."""
+    duration_seconds = video_meta.get('duration_seconds')
+    view_count = video_meta.get('view_count')
+    if video_filters.get('exclude_live') and video_meta.get('live_broadcast_content') in ('live', 'upcoming'):
+        return "live/upcoming stream"
+    if duration_seconds is not None and duration_seconds < video_filters.get('min_duration_seconds', 0):
+        return f"too short ({duration_seconds}s)"
+    if duration_seconds is not None and video_filters.get('max_duration_seconds') and duration_seconds > video_filters['max_duration_seconds']:
+        return f"too long ({duration_seconds}s)"
+    if view_count is not None and view_count < video_filters.get('min_view_count', 0):
+        return f"too few views ({view_count})"
+    if video_filters.get('require_captions') and video_meta.get('has_captions') is False:
+        return "no captions"
+    return None
+
+
+def apply_video_filters(product_config, candidate_videos, log_prefix):
+    """Enriches candidates with videos.list details (one batched request) and drops those outside the product's thresholds."""
+    video_filters = get_video_filters(product_config)
+    if not candidate_videos or not video_filters or not config.VIDEO_ENRICHMENT_ENABLED:
+        return candidate_videos
+    youtube_client.enrich_videos(candidate_videos)
+    kept_videos = []
+    for video_meta in candidate_videos:
+        rejection_reason = _video_filter_rejection_reason(video_meta, video_filters)
+        if rejection_reason:
+            logger.info(f"{log_prefix} Video '{video_meta['title']}' (ID: {video_meta['video_id']}) filtered out before screening: {rejection_reason}.")
+            continue
+        kept_videos.append(video_meta)
+    return kept_videos
+
+
+def iter_filtered_videos(product_config, candidate_videos, log_prefix, chunk_size=50):
+    """Lazy `apply_video_filters` for streamed search results: enriches one chunk (one search page) at a time."""
+    chunk = []
+    for video_meta in candidate_videos:
+        chunk.append(video_meta)
+        if len(chunk) >= chunk_size:
+            yield from apply_video_filters(product_config, chunk, log_prefix)
+            chunk = []
+    if chunk:
+        yield from apply_video_filters(product_config, chunk, log_prefix)
+
+
+def filter_relevant_consumer_videos(product_config, candidate_videos):
+    """
+    Runs the Gemini relevance check for a list of consumer candidate videos (typically one reviewer's search results)
+    using batched requests. Returns the relevant videos, in their original order.
+    """
+    if not candidate_videos:
+        return []
     product_name_from_config = product_config['name']
     product_keywords = product_config.get('keywords_for_relevance', [product_name_from_config])
 
+    # Stored verdicts and the local pre-filter first: only new, ambiguous candidates are sent to Gemini
+    is_relevant_by_video_id = {}
+    videos_for_gemini = []
+    for video_meta in candidate_videos:
+        stored_verdict = get_stored_verdict(product_config, 'consumer', video_meta['video_id'])
+        if stored_verdict:
+            is_relevant_by_video_id[video_meta['video_id']] = (stored_verdict['decision'] == "relevant")
+            logger.info(f"[CONSUMER] Reusing stored verdict '{stored_verdict['decision']}' for '{video_meta['title']}' and '{product_name_from_config}'.")
+            continue
+        decision = relevance_prefilter.prefilter_video(product_config, video_meta, pipeline_kind="consumer")
+        if decision == relevance_prefilter.ASK_GEMINI:
+            videos_for_gemini.append(video_meta)
+        else:
+            is_relevant_by_video_id[video_meta['video_id']] = (decision == relevance_prefilter.ACCEPT)
+            logger.info(f"[CONSUMER] Pre-filter {decision.upper()}ED '{video_meta['title']}' for '{product_name_from_config}' without a Gemini call.")
+
+    if videos_for_gemini:
+        logger.info(f"[CONSUMER] Checking relevance of {len(videos_for_gemini)} video(s) for product '{product_name_from_config}'...")
+        verdicts = gemini_client.check_video_relevance_batch(
+            videos=[(video_meta['title'], video_meta['description']) for video_meta in videos_for_gemini],
+            product_name_for_relevance=product_name_from_config,
+            product_keywords=product_keywords
+        )
+        sys.stdout.flush()
+        for video_meta, verdict in zip(videos_for_gemini, verdicts):
+            is_relevant_by_video_id[video_meta['video_id']] = verdict['is_relevant']
+            if verdict['source'] != "error": # Failed checks are retried on the next run
+                record_verdict(product_config, 'consumer', video_meta['video_id'], "relevant" if verdict['is_relevant'] else "not_relevant")
+            else:
+                mark_discovery_failed(product_config, video_meta)
+
+    relevant_videos = []
+    for video_meta in candidate_videos:
+        if not is_relevant_by_video_id.get(video_meta['video_id']):
+            logger.info(f"[CONSUMER] Video '{video_meta['title']}' deemed NOT RELEVANT for full analysis of '{product_name_from_config}'. Skipping.")
+            continue
+        logger.info(f"[CONSUMER] Video '{video_meta['title']}' IS RELEVANT. Proceeding with full analysis for '{product_name_from_config}'.")
+        relevant_videos.append(video_meta)
+    return relevant_videos
+
+
+def is_saas_video_suitable(product_config, video_meta):
+    """
+    Screens one SaaS candidate video. Uses the product's "screening_mode" from the catalog:
+    "two_tier" runs the Tier 1 (relevance & type) and Tier 2 (suitability) checks, "fused" asks both in one request.
+    """
+    product_name_from_config = product_config['name']
+    video_title_yt = video_meta['title']
+    video_description_yt = video_meta['description']
+
+    stored_verdict = get_stored_verdict(product_config, 'saas', video_meta['video_id'])
+    if stored_verdict:
+        logger.info(f"[SAAS] Reusing stored verdict '{stored_verdict['decision']}' (Type: {stored_verdict.get('video_type')}) for '{video_title_yt}'.")
+        return stored_verdict['decision'] == "suitable"
+
+    # A. Local pre-filter: drop obvious misses before any Gemini call (never accepts, Gemini still classifies the type)
+    if relevance_prefilter.prefilter_video(product_config, video_meta, pipeline_kind="saas", allow_accept=False) == relevance_prefilter.REJECT:
+        logger.info(f"[SAAS] Pre-filter: Video '{video_title_yt}' clearly NOT relevant to product '{product_name_from_config}'. Skipping without a Gemini call.")
+        return False
+
+    screening_mode = product_config.get('screening_mode', config.SAAS_DEFAULT_SCREENING_MODE)
+    if screening_mode == "fused":
+        logger.debug(f"[SAAS] Fused Tier 1 + Tier 2 Screening for '{video_title_yt}'...")
+        fused_result = gemini_client.check_saas_video_screening_fused(
+            video_title=video_title_yt,
+            video_description=video_description_yt,
+            channel_title=video_meta.get('channel_title', 'Unknown Channel'),
+            saas_product_name=product_name_from_config
+        )
+        sys.stdout.flush()
+
+        if not fused_result:
+            logger.info(f"[SAAS] Fused: No usable screening result for '{video_title_yt}'. Skipping.")
+            mark_discovery_failed(product_config, video_meta)
+            return False
+        video_type = fused_result.get("video_type", "Other")
+        if not fused_result.get("is_relevant_to_product"):
+            logger.info(f"[SAAS] Fused: Video '{video_title_yt}' NOT relevant to product '{product_name_from_config}'. Skipping.")
+            record_verdict(product_config, 'saas', video_meta['video_id'], "not_relevant", video_type=video_type)
+            return False
+        if not fused_result.get("is_suitable_for_analysis"):
+            logger.info(f"[SAAS] Fused: Video '{video_title_yt}' (Type: {video_type}) NOT suitable for detailed analysis. Skipping.")
+            record_verdict(product_config, 'saas', video_meta['video_id'], "not_suitable", video_type=video_type)
+            return False
+        logger.info(f"[SAAS] Fused: Video '{video_title_yt}' (Type: {video_type}) IS SUITABLE for detailed analysis.")
+        record_verdict(product_config, 'saas', video_meta['video_id'], "suitable", video_type=video_type)
+        return True
+
+    # B. Tier 1 Relevance & Type Classification
+    logger.debug(f"[SAAS] Tier 1 Relevance Check for '{video_title_yt}'...")
+    tier1_result = gemini_client.check_saas_video_relevance_tier1(
+        video_title=video_title_yt,
+        video_description=video_description_yt,
+        channel_title=video_meta.get('channel_title', 'Unknown Channel'),
+        saas_product_name=product_name_from_config
+    )
+    sys.stdout.flush()
+
+    if not tier1_result:
+        logger.info(f"[SAAS] Tier 1: No usable result for '{video_title_yt}'. Skipping.")
+        mark_discovery_failed(product_config, video_meta)
+        return False
+
+    video_type_from_tier1 = tier1_result.get("video_type", "Other")
+    if not tier1_result.get("is_relevant_to_product"):
+        logger.info(f"[SAAS] Tier 1: Video '{video_title_yt}' NOT relevant to product '{product_name_from_config}'. Skipping.")
+        record_verdict(product_config, 'saas', video_meta['video_id'], "not_relevant", video_type=video_type_from_tier1)
+        return False
+
+    logger.info(f"[SAAS] Tier 1: Video '{video_title_yt}' IS relevant. Type: '{video_type_from_tier1}'. Proceeding to Tier 2.")
+
+    # C. Tier 2 Suitability for Detailed Analysis
+    logger.debug(f"[SAAS] Tier 2 Suitability Check for '{video_title_yt}' (Type: {video_type_from_tier1})...")
+    is_suitable_for_analysis = gemini_client.check_saas_video_relevance_tier2(
+        video_title=video_title_yt,
+        video_description=video_description_yt,
+        channel_title=video_meta.get('channel_title', 'Unknown Channel'),
+        saas_product_name=product_name_from_config,
+        video_type_from_tier1=video_type_from_tier1,
+        on_error=None
+    )
+    sys.stdout.flush()
+
+    if is_suitable_for_analysis is None:
+        logger.info(f"[SAAS] Tier 2: No usable result for '{video_title_yt}'. Skipping.")
+        mark_discovery_failed(product_config, video_meta)
+        return False
+    if not is_suitable_for_analysis:
+        logger.info(f"[SAAS] Tier 2: Video '{video_title_yt}' (Type: {video_type_from_tier1}) NOT suitable for detailed analysis. Skipping.")
+        record_verdict(product_config, 'saas', video_meta['video_id'], "not_suitable", video_type=video_type_from_tier1)
+        return False
+
+    logger.info(f"[SAAS] Tier 2: Video '{video_title_yt}' (Type: {video_type_from_tier1}) IS SUITABLE for detailed analysis.")
+    record_verdict(product_config, 'saas', video_meta['video_id'], "suitable", video_type=video_type_from_tier1)
+    return True
+
+
+def run_full_analysis(analysis_job):
+    """
+    Runs the full multimodal Gemini analysis for one analysis job.
+    An analysis job is a dict with keys: 'kind' ('consumer' or 'saas'), 'product_config', 'video_meta',
+    'reviewer_channel_id' and 'reviewer_name'.
+    Returns the JSON string from Gemini, or None on failure.
+    """
+    product_config = analysis_job['product_config']
+    video_meta = analysis_job['video_meta']
+
+    # Pacing is handled by the shared rate limiter inside gemini_client
+    if analysis_job['kind'] == 'saas':
+        logger.info(f"[SAAS] Performing FULL analysis for: '{video_meta['title']}' (URL: {video_meta['url']})")
+        # Use the specific SaaS analysis function
+        analysis_json_str = gemini_client.analyze_saas_video_content(
+            video_url=video_meta['url'],
+            saas_product_name_context=product_config['name'],
+            video_title_from_yt=video_meta['title'],
+            channel_name_from_yt=analysis_job['reviewer_name']
+        )
+    else:
+        analysis_json_str = gemini_client.analyze_video_content( # Your existing full analysis for consumer products
+            video_url=video_meta['url'],
+            product_name_context=product_config['name'],
+            video_title_from_yt=video_meta['title'],
+            channel_name_from_yt=video_meta.get('channel_title', analysis_job['reviewer_name']),
+            duration_seconds=video_meta.get('duration_seconds') # From enrichment; long videos may be analyzed in segments
+        )
+    sys.stdout.flush()
+    return analysis_json_str
+
+
+def persist_analysis(analysis_job, analysis_json_str):
+    """Stores a successful analysis (or logs the failure). Returns True if the analysis was saved."""
+    product_config = analysis_job['product_config']
+    video_meta = analysis_job['video_meta']
+    log_prefix = "[SAAS]" if analysis_job['kind'] == 'saas' else "[CONSUMER]"
+
+    if not analysis_json_str:
+        analysis_label = "full SaaS analysis" if analysis_job['kind'] == 'saas' else "full analysis"
+        logger.error(f"{log_prefix} Failed to get Gemini {analysis_label} for video: '{video_meta['title']}' (ID: {video_meta['video_id']})")
+        mark_discovery_failed(product_config, video_meta)
+        return False
+
+    saved_id = database_manager.save_video_analysis(
+        product_config=product_config, # Pass the original product_config
+        video_id=video_meta['video_id'],
+        video_url=video_meta['url'],
+        video_title_from_yt=video_meta['title'],
+        video_published_at_str=video_meta['published_at'],
+        reviewer_channel_id=analysis_job['reviewer_channel_id'],
+        reviewer_name=analysis_job['reviewer_name'],
+        analysis_json_str=analysis_json_str
+    )
+    if saved_id is None: # Invalid JSON or a database error, already logged by save_video_analysis
+        logger.error(f"{log_prefix} Analyzed but could not save: '{video_meta['title']}' (ID: {video_meta['video_id']}) for '{product_config['name']}'")
+        mark_discovery_failed(product_config, video_meta)
+        return False
+    logger.info(f"{log_prefix} Successfully analyzed and saved: '{video_meta['title']}' (ID: {video_meta['video_id']}) for '{product_config['name']}'")
+    return True
+
+
+def analysis_steps(analysis_job):
+    """The Gemini steps of `run_full_analysis`, for the deferred (batch) driver."""
+    video_meta = analysis_job['video_meta']
+    return gemini_client.video_analysis_steps(
+        analysis_job['kind'],
+        video_url=video_meta['url'],
+        product_name_context=analysis_job['product_config']['name'],
+        video_title_from_yt=video_meta['title'],
+        channel_name_from_yt=analysis_job['reviewer_name'] if analysis_job['kind'] == 'saas' else video_meta.get('channel_title', analysis_job['reviewer_name']),
+        duration_seconds=video_meta.get('duration_seconds')
+    )
+
+
+def defer_analysis(analysis_job):
+    """
+    Batch mode counterpart of `analyze_and_save_video`: adds the job's Gemini request(s) to the run's batch instead of
+    sending them. The discovery watermark is held back until the batch is ingested, so a video whose batch result
+    fails is found again by a later run.
+    """
+    product_config = analysis_job['product_config']
+    video_meta = analysis_job['video_meta']
+    log_prefix = "[SAAS]" if analysis_job['kind'] == 'saas' else "[CONSUMER]"
+    calls = gemini_client.defer_steps(analysis_steps(analysis_job))
+    if not calls:
+        return persist_analysis(analysis_job, None) # Logs the failure
+    job_key = f"{analysis_job['kind']}:{product_config['name']}:{video_meta['video_id']}"
+    if analysis_batch_writer.add(job_key, analysis_job, calls):
+        logger.info(f"{log_prefix} Deferred full analysis of '{video_meta['title']}' (ID: {video_meta['video_id']}) to batch {analysis_batch_writer.batch_id}.")
+    else:
+        logger.info(f"{log_prefix} Full analysis of '{video_meta['title']}' (ID: {video_meta['video_id']}) is already waiting in a batch.")
+    mark_discovery_failed(product_config, video_meta)
+    return False
+
+
+def ingest_deferred_analysis(analysis_job, responses):
+    """Finishes a deferred analysis with its batch results (same parsing as an interactive run) and saves it."""
+    video_meta = analysis_job['video_meta']
+    if database_manager.is_video_analyzed(video_meta['video_id'], analysis_job['product_config']['name']):
+        logger.info(f"Video '{video_meta['title']}' (ID: {video_meta['video_id']}) was analyzed in the meantime. Skipping its batch result.")
+        return False
+    analysis_json_str = gemini_client.resume_deferred_steps(analysis_steps(analysis_job), responses)
+    return persist_analysis(analysis_job, analysis_json_str)
+
+
+def ingest_analysis_batches(batch_ids=None):
+    """Ingests the given batches (default: every submitted batch not ingested yet) whose results are available."""
+    batch_ids = batch_ids or list_batches(pending_only=True)
+    if not batch_ids:
+        logger.info("[GEMINI BATCH] No pending batches to ingest.")
+    for batch_id in batch_ids:
+        ingest_batch(batch_id, ingest_deferred_analysis)
+
+
+def analyze_and_save_video(analysis_job):
+    """Full analysis + persistence for one analysis job. Safe to run in a worker thread."""
+    if analysis_batch_writer is not None:
+        return defer_analysis(analysis_job)
+    if analysis_job['kind'] == 'saas':
+        video_meta = analysis_job['video_meta']
+        # Redundant check, but good for safety, as filtering might take time (in-process set, no DB round-trip)
+        if database_manager.is_video_analyzed_cached(video_meta['video_id'], analysis_job['product_config']['name']):
+            logger.info(f"[SAAS] Video '{video_meta['title']}' (ID: {video_meta['video_id']}) re-checked and already analyzed. Skipping full analysis.")
+            return False
+    return persist_analysis(analysis_job, run_full_analysis(analysis_job))
+
+
+def run_multi_product_analysis(analysis_jobs):
+    """
+    Analyzes one video for several consumer products (cross-product mode) with a single multi-product request.
+    Products the combined answer misses are analyzed individually. Returns [(analysis_job, analysis_json_str)].
+    """
+    video_meta = analysis_jobs[0]['video_meta']
+    product_names = [job['product_config']['name'] for job in analysis_jobs]
+    logger.info(f"[CONSUMER] Video '{video_meta['title']}' (ID: {video_meta['video_id']}) matches {len(analysis_jobs)} products {product_names}. Running one multi-product analysis.")
+    analyses_by_product = gemini_client.analyze_video_content_multi_product(
+        video_url=video_meta['url'],
+        product_names=product_names,
+        video_title_from_yt=video_meta['title'],
+        channel_name_from_yt=video_meta.get('channel_title', analysis_jobs[0]['reviewer_name'])
+    ) or {}
+    sys.stdout.flush()
+
+    results = []
+    for analysis_job in analysis_jobs:
+        analysis_json_str = analyses_by_product.get(analysis_job['product_config']['name'])
+        if analysis_json_str is None:
+            logger.warning(f"[CONSUMER] Multi-product analysis gave no section for '{analysis_job['product_config']['name']}'. Analyzing it on its own.")
+            analysis_json_str = run_full_analysis(analysis_job)
+        results.append((analysis_job, analysis_json_str))
+    return results
+
+
+def analyze_and_save_video_group(analysis_jobs):
+    """Cross-product counterpart of `analyze_and_save_video`: one video, several products, one document saved per product."""
+    pending_jobs = [job for job in analysis_jobs
+                    if not database_manager.is_video_analyzed_cached(job['video_meta']['video_id'], job['product_config']['name'])]
+    if len(pending_jobs) <= 1:
+        for analysis_job in pending_jobs:
+            analyze_and_save_video(analysis_job)
+        return
+    for analysis_job, analysis_json_str in run_multi_product_analysis(pending_jobs):
+        persist_analysis(analysis_job, analysis_json_str)
+
+
+class CrossProductAnalysisDispatcher:
+    """
+    Collects consumer analysis jobs while screening runs, instead of starting them right away, and groups
+    the ones that share a video_id so `analyze_and_save_video_group` can analyze each video only once.
+    """
+
+    def __init__(self, max_products_per_request):
+        self.max_products_per_request = max(1, max_products_per_request)
+        self._jobs_by_video_id = {} # video_id -> analysis jobs, in the order they were screened
+        self._lock = threading.Lock()
+
+    def add(self, analysis_job):
+        with self._lock:
+            jobs = self._jobs_by_video_id.setdefault(analysis_job['video_meta']['video_id'], [])
+            if all(job['product_config']['name'] != analysis_job['product_config']['name'] for job in jobs):
+                jobs.append(analysis_job)
+
+    def drain(self):
+        """Returns the collected work as lists of jobs (one list per video, split at `max_products_per_request`) and resets."""
+        with self._lock:
+            jobs_by_video_id, self._jobs_by_video_id = self._jobs_by_video_id, {}
+        job_groups = []
+        for jobs in jobs_by_video_id.values():
+            for group_start in range(0, len(jobs), self.max_products_per_request):
+                job_groups.append(jobs[group_start:group_start + self.max_products_per_request])
+        shared_count = sum(1 for group in job_groups if len(group) > 1)
+        logger.info(f"[CONSUMER] Cross-product analysis: {len(job_groups)} videos to analyze, {shared_count} of them shared by several products.")
+        return job_groups
+
+
+def submit_analysis(task_runner, analysis_job, analysis_dispatcher=None):
+    """Hands an analysis job to the task runner, or to the cross-product dispatcher (consumer jobs only) when one is active."""
+    if analysis_dispatcher is not None and analysis_job['kind'] == 'consumer':
+        analysis_dispatcher.add(analysis_job)
+    else:
+        task_runner.submit(analyze_and_save_video, analysis_job)
+
+
+def make_consumer_analysis_job(product_config, video_meta, reviewer_channel_id, reviewer_name):
+    return {
+        'kind': 'consumer',
+        'product_config': product_config,
+        'video_meta': video_meta,
+        'reviewer_channel_id': reviewer_channel_id, # This is known for curated reviewers
+        'reviewer_name': reviewer_name              # This is known
+    }
+
+
+def make_saas_analysis_job(product_config, video_meta):
+    # For SaaS general search, reviewer info comes from the video metadata itself
+    return {
+        'kind': 'saas',
+        'product_config': product_config,
+        'video_meta': video_meta,
+        'reviewer_channel_id': video_meta['channel_id'],
+        'reviewer_name': video_meta['channel_title']
+    }
+
+
+def search_consumer_candidates(product_config, reviewer_info):
+    """Searches one curated reviewer's channel for a consumer product (search.list, or the local uploads index)."""
+    product_name_from_config = product_config['name']
+    product_keywords = product_config.get('keywords_for_relevance', [product_name_from_config])
+    if config.CONSUMER_DISCOVERY_MODE == "channel_index":
+        logger.info(f"[CONSUMER] Matching '{product_name_from_config}' against the uploads index of '{reviewer_info['name']}' (ID: {reviewer_info['id']})")
+        return uploads_index.find_candidates(product_config, reviewer_info['id'], max_results=config.DEFAULT_MAX_VIDEO_RESULTS_PER_QUERY)
+
+    logger.info(f"[CONSUMER] Searching videos from '{reviewer_info['name']}' (ID: {reviewer_info['id']}) for product keywords '{product_keywords}'")
+
+    source_key = f"channel:{reviewer_info['id']}"
+    published_after = discovery_watermarks.begin(source_key, product_name_from_config) # Only uploads newer than the last complete run
+    return list(_tag_discovery_source(youtube_client.iter_videos_by_channel(
+        channel_id=reviewer_info['id'],
+        query_string=product_name_from_config,
+        max_results=config.DEFAULT_MAX_VIDEO_RESULTS_PER_QUERY,
+        order=discovery_watermarks.SEARCH_ORDER if discovery_watermarks.enabled else config.VIDEO_ORDER_PREFERENCE,
+        published_after=published_after,
+        on_error=lambda: discovery_watermarks.mark_failed(source_key, product_name_from_config),
+        on_incomplete=lambda: discovery_watermarks.mark_incomplete(source_key, product_name_from_config)
+    ), source_key))
+
+
+def _tag_discovery_source(videos, source_key):
+    """Records on each video_info which watermarked source (channel or query) found it."""
+    for video_meta in videos:
+        video_meta['discovery_source'] = source_key
+        yield video_meta
+
+
+def search_saas_candidates(product_config):
+    """
+    General YouTube search for a SaaS product. Returns a generator: result pages are fetched only as the caller
+    iterates, so stopping once enough suitable videos are found also stops paging (and quota spend).
+    """
+    product_name_from_config = product_config['name']
+    product_keywords = product_config.get('keywords_for_relevance', [product_name_from_config])
+    # For SaaS, you might want more candidates for initial filtering
+    saas_initial_search_max_results = product_config.get('initial_search_max_results', config.SAAS_INITIAL_SEARCH_MAX_RESULTS)
+    logger.info(f"[SAAS] Performing general YouTube search for keywords '{product_keywords}'")
+
+    # You can add region_code or relevance_language from product_config if needed
+    general_search_query = " ".join(product_keywords) # Combine keywords for a search query
+    source_key = f"query:{general_search_query}"
+    published_after = discovery_watermarks.begin(source_key, product_name_from_config) # Only videos newer than the last complete run
+    return _tag_discovery_source(youtube_client.iter_general_videos_by_query(
+        query_string=general_search_query,
+        max_results=saas_initial_search_max_results,
+        order=discovery_watermarks.SEARCH_ORDER if discovery_watermarks.enabled else 'relevance', # Or 'viewCount'
+        relevance_language=product_config.get('search_language', 'en'), # Default to English
+        max_quota_units=product_config.get('search_max_quota_units', config.SAAS_SEARCH_MAX_QUOTA_UNITS),
+        published_after=published_after,
+        on_error=lambda: discovery_watermarks.mark_failed(source_key, product_name_from_config),
+        on_incomplete=lambda: discovery_watermarks.mark_incomplete(source_key, product_name_from_config)
+    ), source_key)
+
+
+# --- Sequential / Concurrent Execution Modes ---
+
+def process_consumer_product_with_curated_reviewers(product_config, reviewers_list_for_product, task_runner=None, analysis_dispatcher=None):
+    """
+    Processes a consumer product using a predefined list of reviewers.
+    Discovery and relevance checks run in the calling thread; full analyses are handed to `task_runner`
+    (run inline when None, or on a worker pool in concurrent mode), or collected by `analysis_dispatcher` in cross-product mode.
+    """
+    task_runner = task_runner or SequentialTaskRunner()
+    product_name_from_config = product_config['name']
+
     logger.info(f"--- [CONSUMER] Processing Product Config: {product_name_from_config} ---")
 
     if not reviewers_list_for_product:
         logger.warning(f"[CONSUMER] No reviewers to process for product: {product_name_from_config}.")
         return
+    prefetch_stored_verdicts(product_config, 'consumer')
 
     for reviewer_info in reviewers_list_for_product:
         reviewer_name = reviewer_info['name']
         reviewer_channel_id = reviewer_info['id']
-        logger.info(f"[CONSUMER] Searching videos from '{reviewer_name}' (ID: {reviewer_channel_id}) for product keywords '{product_keywords}'")
 
-        # Use the renamed function for clarity
-        videos_metadata = youtube_client.find_videos_by_channel(
-            channel_id=reviewer_channel_id,
-            query_string=product_name_from_config,
-            max_results=config.DEFAULT_MAX_VIDEO_RESULTS_PER_QUERY
-        )
+        videos_metadata = search_consumer_candidates(product_config, reviewer_info)
 
         if not videos_metadata:
             logger.info(f"[CONSUMER] No initial videos found for '{product_name_from_config}' from '{reviewer_name}'.")
             continue
 
-        relevant_videos_found_for_reviewer = 0
+        new_videos = []
         for video_meta in videos_metadata:
             video_id = video_meta['video_id']
             video_title_yt = video_meta['title']
-            video_url = video_meta['url']
-            video_description_yt = video_meta['description']
-            video_published_at = video_meta['published_at']
 
-            if database_manager.is_video_analyzed(video_id, product_name_from_config):
+            if database_manager.is_video_analyzed_cached(video_id, product_name_from_config):
                 logger.info(f"[CONSUMER] Video '{video_title_yt}' (ID: {video_id}) for product config '{product_name_from_config}' already analyzed. Skipping.")
                 continue
+            new_videos.append(video_meta)
 
-            logger.info(f"[CONSUMER] Checking relevance of video: '{video_title_yt}' for product '{product_name_from_config}'...")
-            is_relevant = gemini_client.check_video_relevance( # This is your existing relevance check
-                video_title=video_title_yt,
-                video_description=video_description_yt,
-                product_name_for_relevance=product_name_from_config,
-                product_keywords=product_keywords
-            )
-            sys.stdout.flush()
-
-            if not is_relevant:
-                logger.info(f"[CONSUMER] Video '{video_title_yt}' deemed NOT RELEVANT for full analysis of '{product_name_from_config}'. Skipping.")
-                continue
+        # Duration/view thresholds, then one batched relevance request for the reviewer's remaining search results
+        new_videos = apply_video_filters(product_config, new_videos, "[CONSUMER]")
+        relevant_videos = filter_relevant_consumer_videos(product_config, new_videos)
+        for video_meta in relevant_videos:
+            submit_analysis(task_runner, make_consumer_analysis_job(product_config, video_meta, reviewer_channel_id, reviewer_name), analysis_dispatcher)
 
-            logger.info(f"[CONSUMER] Video '{video_title_yt}' IS RELEVANT. Proceeding with full analysis for '{product_name_from_config}'.")
-            relevant_videos_found_for_reviewer += 1
-
-            analysis_json_str = gemini_client.analyze_video_content( # Your existing full analysis for consumer products
-                video_url=video_url,
-                product_name_context=product_name_from_config,
-                video_title_from_yt=video_title_yt,
-                channel_name_from_yt=video_meta.get('channel_title', reviewer_name)
-            )
-            sys.stdout.flush()
-
-            if analysis_json_str:
-                database_manager.save_video_analysis(
-                    product_config=product_config,
-                    video_id=video_id,
-                    video_url=video_url,
-                    video_title_from_yt=video_title_yt,
-                    video_published_at_str=video_published_at,
-                    reviewer_channel_id=reviewer_channel_id, # This is known for curated reviewers
-                    reviewer_name=reviewer_name,             # This is known
-                    analysis_json_str=analysis_json_str
-                )
-                logger.info(f"[CONSUMER] Successfully analyzed and saved: '{video_title_yt}' (ID: {video_id}) for '{product_name_from_config}'")
-            else:
-                logger.error(f"[CONSUMER] Failed to get Gemini full analysis for video: '{video_title_yt}' (ID: {video_id})")
-
-            logger.info("Waiting for 5 seconds before next API call...")
-            time.sleep(5)
-
-        if relevant_videos_found_for_reviewer == 0:
+        if not relevant_videos:
             logger.info(f"[CONSUMER] No relevant videos found for '{product_name_from_config}' from '{reviewer_name}' after filtering.")
 
     logger.info(f"--- [CONSUMER] Finished processing for Product Config: {product_name_from_config} ---")
 
 
-def process_saas_product_general_search(product_config):
-    """Processes a SaaS product using general YouTube search and tiered filtering."""
+def process_saas_product_general_search(product_config, task_runner=None):
+    """
+    Processes a SaaS product using general YouTube search and tiered filtering.
+    Filtering stays sequential so the `max_full_analysis_videos` cap selects the same videos in every mode;
+    full analyses are handed to `task_runner`.
+    """
+    task_runner = task_runner or SequentialTaskRunner()
     product_name_from_config = product_config['name']
-    product_keywords = product_config.get('keywords_for_relevance', [product_name_from_config])
-    # For SaaS, you might want more candidates for initial filtering
-    saas_initial_search_max_results = product_config.get('initial_search_max_results', config.SAAS_INITIAL_SEARCH_MAX_RESULTS) 
     saas_max_videos_to_fully_analyze = product_config.get('max_full_analysis_videos', config.SAAS_MAX_VIDEOS_TO_FULLY_ANALYZE)
 
-
     logger.info(f"--- [SAAS] Processing Product Config: {product_name_from_config} ---")
-    logger.info(f"[SAAS] Performing general YouTube search for keywords '{product_keywords}'")
-
-    # 1. General YouTube Search
-    # You can add region_code or relevance_language from product_config if needed
-    general_search_query = " ".join(product_keywords) # Combine keywords for a search query
-    candidate_videos_metadata = youtube_client.find_general_videos_by_query(
-        query_string=general_search_query,
-        max_results=saas_initial_search_max_results,
-        order='relevance', # Or 'viewCount'
-        relevance_language=product_config.get('search_language', 'en') # Default to English
-    )
+    prefetch_stored_verdicts(product_config, 'saas')
 
-    if not candidate_videos_metadata:
-        logger.info(f"[SAAS] No initial video candidates found for '{general_search_query}'.")
-        return
+    # 1. General YouTube Search (streamed: the next results page is only fetched if filtering needs more candidates)
+    candidate_videos_metadata = search_saas_candidates(product_config)
+    candidate_videos_metadata = iter_filtered_videos(product_config, candidate_videos_metadata, "[SAAS]") # Duration/view thresholds, one page at a time
+    logger.info(f"[SAAS] Filtering video candidates for '{product_name_from_config}' as search results arrive...")
 
-    logger.info(f"[SAAS] Found {len(candidate_videos_metadata)} initial video candidates for '{product_name_from_config}'. Starting filtering...")
-    
+    candidate_count = 0
     suitable_videos_for_full_analysis = []
     for video_meta in candidate_videos_metadata:
+        candidate_count += 1
         video_id = video_meta['video_id']
         video_title_yt = video_meta['title']
-        video_description_yt = video_meta['description']
 
         # A. Check if already analyzed (important to avoid re-filtering and re-analyzing)
-        if database_manager.is_video_analyzed(video_id, product_name_from_config):
+        if database_manager.is_video_analyzed_cached(video_id, product_name_from_config):
             logger.info(f"[SAAS] Video '{video_title_yt}' (ID: {video_id}) for product '{product_name_from_config}' already analyzed. Skipping filtering.")
             continue
 
-        # B. Tier 1 Relevance & Type Classification
-        logger.debug(f"[SAAS] Tier 1 Relevance Check for '{video_title_yt}'...")
-        tier1_result = gemini_client.check_saas_video_relevance_tier1(
-            video_title=video_title_yt,
-            video_description=video_description_yt,
-            channel_title=video_meta.get('channel_title', 'Unknown Channel'),
-            saas_product_name=product_name_from_config
-        )
-        sys.stdout.flush()
-
-        if not tier1_result or not tier1_result.get("is_relevant_to_product"):
-            logger.info(f"[SAAS] Tier 1: Video '{video_title_yt}' NOT relevant to product '{product_name_from_config}'. Skipping.")
-            continue
-        
-        video_type_from_tier1 = tier1_result.get("video_type", "Other")
-        logger.info(f"[SAAS] Tier 1: Video '{video_title_yt}' IS relevant. Type: '{video_type_from_tier1}'. Proceeding to Tier 2.")
-
-        # C. Tier 2 Suitability for Detailed Analysis
-        logger.debug(f"[SAAS] Tier 2 Suitability Check for '{video_title_yt}' (Type: {video_type_from_tier1})...")
-        is_suitable_for_analysis = gemini_client.check_saas_video_relevance_tier2(
-            video_title=video_title_yt,
-            video_description=video_description_yt,
-            channel_title=video_meta.get('channel_title', 'Unknown Channel'),
-            saas_product_name=product_name_from_config,
-            video_type_from_tier1=video_type_from_tier1
-        )
-        sys.stdout.flush()
-
-        if not is_suitable_for_analysis:
-            logger.info(f"[SAAS] Tier 2: Video '{video_title_yt}' (Type: {video_type_from_tier1}) NOT suitable for detailed analysis. Skipping.")
+        # B./C. Tier 1 + Tier 2 screening (two requests, or one in "fused" mode)
+        if not is_saas_video_suitable(product_config, video_meta):
             continue
-        
-        logger.info(f"[SAAS] Tier 2: Video '{video_title_yt}' (Type: {video_type_from_tier1}) IS SUITABLE for detailed analysis.")
         suitable_videos_for_full_analysis.append(video_meta)
 
         if len(suitable_videos_for_full_analysis) >= saas_max_videos_to_fully_analyze:
             logger.info(f"[SAAS] Reached limit of {saas_max_videos_to_fully_analyze} suitable videos for '{product_name_from_config}'. Stopping filtering.")
+            mark_discovery_incomplete(product_config, video_meta) # Candidates already fetched but not screened
             break
-    
-    logger.info(f"[SAAS] Found {len(suitable_videos_for_full_analysis)} suitable videos for '{product_name_from_config}' after tiered filtering.")
+    candidate_videos_metadata.close() # Stop paging now rather than when the generator is garbage-collected
+
+    if not candidate_count:
+        logger.info(f"[SAAS] No initial video candidates found for '{product_name_from_config}'.")
+        return
+    logger.info(f"[SAAS] Found {len(suitable_videos_for_full_analysis)} suitable videos among {candidate_count} candidates for '{product_name_from_config}' after tiered filtering.")
 
     # D. Full Analysis for selected suitable videos
     for video_meta_to_analyze in suitable_videos_for_full_analysis:
-        video_id = video_meta_to_analyze['video_id']
-        video_title_yt = video_meta_to_analyze['title']
-        video_url = video_meta_to_analyze['url']
-        video_published_at = video_meta_to_analyze['published_at']
-        # For SaaS general search, reviewer info comes from the video metadata itself
-        reviewer_channel_id_saas = video_meta_to_analyze['channel_id']
-        reviewer_name_saas = video_meta_to_analyze['channel_title']
-
-        # Redundant check, but good for safety, as filtering might take time
-        if database_manager.is_video_analyzed(video_id, product_name_from_config):
-            logger.info(f"[SAAS] Video '{video_title_yt}' (ID: {video_id}) re-checked and already analyzed. Skipping full analysis.")
-            continue
-
-        logger.info(f"[SAAS] Performing FULL analysis for: '{video_title_yt}' (URL: {video_url})")
-        # Use the specific SaaS analysis function
-        analysis_json_str = gemini_client.analyze_saas_video_content(
-            video_url=video_url,
-            saas_product_name_context=product_name_from_config,
-            video_title_from_yt=video_title_yt,
-            channel_name_from_yt=reviewer_name_saas # or video_meta_to_analyze.get('channel_title')
-        )
-        sys.stdout.flush()
-
-        if analysis_json_str:
-            database_manager.save_video_analysis(
-                product_config=product_config, # Pass the original product_config
-                video_id=video_id,
-                video_url=video_url,
-                video_title_from_yt=video_title_yt,
-                video_published_at_str=video_published_at,
-                reviewer_channel_id=reviewer_channel_id_saas,
-                reviewer_name=reviewer_name_saas,
-                analysis_json_str=analysis_json_str
-            )
-            logger.info(f"[SAAS] Successfully analyzed and saved: '{video_title_yt}' (ID: {video_id}) for '{product_name_from_config}'")
-        else:
-            logger.error(f"[SAAS] Failed to get Gemini full SaaS analysis for video: '{video_title_yt}' (ID: {video_id})")
-        
-        logger.info("Waiting for 5 seconds before next API call...")
-        time.sleep(5)
+        task_runner.submit(analyze_and_save_video, make_saas_analysis_job(product_config, video_meta_to_analyze))
 
     logger.info(f"--- [SAAS] Finished processing for Product Config: {product_name_from_config} ---")
 
 
-def main():
-    logger.info(f"Application starting in {config.APP_MODE} mode...")
-    sys.stdout.flush()
-
-    if config.IS_TEST_MODE:
-        logger.info(
-            f"--- TEST MODE ACTIVE: Categories={config.TEST_MODE_CATEGORIES}, "
-            f"Products/Cat={config.TEST_MODE_PRODUCTS_LIMIT_PER_CATEGORY}, "
-            f"Reviewers/Prod={config.TEST_MODE_REVIEWERS_LIMIT_PER_PRODUCT} ---"
-        )
-    else:
-        logger.info("--- PRODUCTION MODE ACTIVE (processing all configured items) ---")
+# --- Staged Pipeline Execution Mode ---
+# discovery -> dedup -> relevance -> full analysis -> persist, joined by bounded queues.
+# Items flowing through the first three stages are "candidate batches" (one per YouTube search):
+#   {'kind', 'product_config', 'reviewer_info' (consumer only), 'videos'}
+# The relevance stage fans a batch out into individual analysis jobs as soon as each video passes,
+# so full analyses start while the rest of the batch (and later searches) are still being screened.
+
+class Phase1Pipeline:
+    """Wires the Phase 1 steps above into a `StagedPipeline`."""
+
+    def __init__(self, stage_workers, queue_size, analysis_dispatcher=None):
+        self._queued_keys = set() # (video_id, product_config_name) pairs already sent downstream in this run
+        self._queued_keys_lock = threading.Lock()
+        # Cross-product mode: consumer jobs are held by the dispatcher and released as groups once screening is done
+        self.analysis_dispatcher = analysis_dispatcher
+        self.pipeline = StagedPipeline(name="phase1")
+        self.pipeline.add_stage("discovery", self._discover, workers=stage_workers.get("discovery", 1), queue_size=queue_size)
+        self.pipeline.add_stage("dedup", self._dedup, workers=stage_workers.get("dedup", 1), queue_size=queue_size)
+        self.pipeline.add_stage("relevance", self._screen, workers=stage_workers.get("relevance", 2), queue_size=queue_size,
+                                on_finish=self._release_grouped_jobs if analysis_dispatcher else None)
+        self.pipeline.add_stage("analysis", self._analyze, workers=stage_workers.get("analysis", 4), queue_size=queue_size)
+        self.pipeline.add_stage("persist", self._persist, workers=stage_workers.get("persist", 1), queue_size=queue_size)
+
+    def _discover(self, discovery_task, emit):
+        product_config = discovery_task['product_config']
+        if discovery_task['kind'] == 'saas':
+            # Lazy search results: pages are fetched by whichever stage iterates them (the relevance stage),
+            # so paging stops as soon as the product's suitable-video cap is reached
+            emit(dict(discovery_task, videos=search_saas_candidates(product_config)))
+            return
+        videos = search_consumer_candidates(product_config, discovery_task['reviewer_info'])
+        if not videos:
+            logger.info(f"[CONSUMER] No initial videos found for '{product_config['name']}' from '{discovery_task['reviewer_info']['name']}'.")
+        if videos:
+            emit(dict(discovery_task, videos=videos))
+
+    def _is_new_video(self, video_meta, product_name_from_config, log_prefix):
+        key = (video_meta['video_id'], product_name_from_config)
+        with self._queued_keys_lock:
+            if key in self._queued_keys:
+                return False # Same video found by another search for this product earlier in the run
+            self._queued_keys.add(key)
+        if database_manager.is_video_analyzed_cached(video_meta['video_id'], product_name_from_config):
+            logger.info(f"{log_prefix} Video '{video_meta['title']}' (ID: {video_meta['video_id']}) for product '{product_name_from_config}' already analyzed. Skipping.")
+            return False
+        return True
+
+    def _dedup(self, candidate_batch, emit):
+        product_name_from_config = candidate_batch['product_config']['name']
+        prefetch_stored_verdicts(candidate_batch['product_config'], candidate_batch['kind']) # Once per product; here, so it happens before screening
+        if candidate_batch['kind'] == 'saas':
+            # Keep SaaS results lazy: filtering happens as the relevance stage pulls candidates
+            emit(dict(candidate_batch, videos=(
+                video_meta for video_meta in candidate_batch['videos']
+                if self._is_new_video(video_meta, product_name_from_config, "[SAAS]")
+            )))
+            return
+        new_videos = [video_meta for video_meta in candidate_batch['videos']
+                      if self._is_new_video(video_meta, product_name_from_config, "[CONSUMER]")]
+        if new_videos:
+            emit(dict(candidate_batch, videos=new_videos))
+
+    def _screen(self, candidate_batch, emit):
+        product_config = candidate_batch['product_config']
+        if candidate_batch['kind'] == 'saas':
+            # One batch per SaaS product, screened in search order, so the cap picks the same videos as a sequential run
+            saas_max_videos_to_fully_analyze = product_config.get('max_full_analysis_videos', config.SAAS_MAX_VIDEOS_TO_FULLY_ANALYZE)
+            suitable_count = 0
+            candidate_count = 0
+            candidate_videos = iter_filtered_videos(product_config, candidate_batch['videos'], "[SAAS]")
+            for video_meta in candidate_videos:
+                candidate_count += 1
+                if not is_saas_video_suitable(product_config, video_meta):
+                    continue
+                emit(make_saas_analysis_job(product_config, video_meta))
+                suitable_count += 1
+                if suitable_count >= saas_max_videos_to_fully_analyze:
+                    logger.info(f"[SAAS] Reached limit of {saas_max_videos_to_fully_analyze} suitable videos for '{product_config['name']}'. Stopping filtering.")
+                    mark_discovery_incomplete(product_config, video_meta) # Candidates already fetched but not screened
+                    break
+            candidate_videos.close() # Stops the underlying search from fetching further pages
+            if not candidate_count:
+                logger.info(f"[SAAS] No new video candidates found for '{product_config['name']}'.")
+        else:
+            reviewer_info = candidate_batch['reviewer_info']
+            candidate_videos = apply_video_filters(product_config, candidate_batch['videos'], "[CONSUMER]")
+            for video_meta in filter_relevant_consumer_videos(product_config, candidate_videos):
+                analysis_job = make_consumer_analysis_job(product_config, video_meta, reviewer_info['id'], reviewer_info['name'])
+                if self.analysis_dispatcher is not None:
+                    self.analysis_dispatcher.add(analysis_job)
+                else:
+                    emit(analysis_job)
+
+    def _release_grouped_jobs(self, emit):
+        for job_group in self.analysis_dispatcher.drain():
+            emit(job_group if len(job_group) > 1 else job_group[0])
+
+    def _analyze(self, analysis_job, emit):
+        if analysis_batch_writer is not None:
+            defer_analysis(analysis_job)
+            return
+        if isinstance(analysis_job, list): # Cross-product group: one video, several products
+            for analysis_result in run_multi_product_analysis(analysis_job):
+                emit(analysis_result)
+            return
+        emit((analysis_job, run_full_analysis(analysis_job)))
+
+    def _persist(self, analysis_result, emit):
+        analysis_job, analysis_json_str = analysis_result
+        persist_analysis(analysis_job, analysis_json_str)
+
+    def run(self, discovery_tasks):
+        self.pipeline.run(discovery_tasks)
+
+
+def iter_discovery_tasks(product_entries):
+    """Yields one discovery task per (consumer product, reviewer) and per SaaS product in `product_entries` (see `iter_products_to_process`)."""
+    for category, product_conf, reviewers_for_this_product in product_entries:
+        if reviewers_for_this_product is None:
+            yield {'kind': 'saas', 'product_config': product_conf}
+            continue
+        for reviewer_info in reviewers_for_this_product:
+            yield {'kind': 'consumer', 'product_config': product_conf, 'reviewer_info': reviewer_info}
 
-    if not config.YOUTUBE_API_KEY or not config.GEMINI_API_KEY:
-        logger.critical("CRITICAL: API keys are not configured. Exiting.")
-        return
 
-    database_manager.initialize_db()
-    if not youtube_client.get_youtube_service() or not gemini_client.get_gemini_model():
-        logger.critical("Failed to initialize API services. Check keys/configs. Exiting.")
-        return
+# --- Entry Point ---
 
+def iter_products_to_process():
+    """
+    Yields (category, product_config, reviewers) for every product Phase 1 should process.
+    `reviewers` is the curated reviewer list, or None for categories that use general search (e.g. SaaS).
+    """
     for category, all_product_configs_in_category in config.PRODUCTS_TO_ANALYZE.items():
         # Apply test mode category filtering
         if config.IS_TEST_MODE and category not in config.TEST_MODE_CATEGORIES:
@@ -272,17 +833,136 @@ def main():
                 if config.IS_TEST_MODE: # Apply reviewer limit if in test mode for curated path
                     reviewers_for_this_product = all_reviewers_for_this_category[:config.TEST_MODE_REVIEWERS_LIMIT_PER_PRODUCT]
                     logger.debug(f"Test mode: Limiting curated reviewers for '{product_conf['name']}' to {len(reviewers_for_this_product)}.")
-                
-                process_consumer_product_with_curated_reviewers(product_conf, reviewers_for_this_product)
+                yield category, product_conf, reviewers_for_this_product
             else:
                 # This is a category for general search (e.g., SaaS)
                 logger.info(f"Category '{category}' has no pre-defined reviewers. Initiating general search workflow for product '{product_conf['name']}'.")
                 # Test mode limits for SaaS (number of videos to fully analyze) should be handled within process_saas_product_general_search
                 # or configured per product in config.py if more granularity is needed for SaaS test mode.
                 # For now, test mode for SaaS just means it runs for fewer products/categories based on the top-level test limits.
-                process_saas_product_general_search(product_conf)
-                
+                yield category, product_conf, None
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Phase 1: discover, screen and analyze YouTube review videos.")
+    parser.add_argument("--full-rescan", action="store_true",
+                        help="Ignore stored discovery watermarks and search each source's full history (watermarks are still updated).")
+    parser.add_argument("--gemini-cache-mode", choices=GEMINI_CACHE_MODES, default=None,
+                        help="Override GEMINI_CACHE_MODE: record/replay Gemini responses (replay_strict runs fully offline for Gemini).")
+    parser.add_argument("--gemini-batch-submit", action="store_true",
+                        help="Discover and screen as usual, but write the full analyses to a batch job file (GEMINI_BATCH_BACKEND) instead of running them.")
+    parser.add_argument("--gemini-batch-ingest", nargs="*", metavar="BATCH_ID", default=None,
+                        help="Only ingest the results of submitted batches (all pending batches if no id is given) and exit.")
+    return parser.parse_args()
+
+
+def main(full_rescan=False, gemini_cache_mode=None, gemini_batch_submit=False, gemini_batch_ingest=None):
+    global analysis_batch_writer
+    logger.info(f"Application starting in {config.APP_MODE} mode...")
+    sys.stdout.flush()
+    if gemini_cache_mode:
+        gemini_response_cache.set_mode(gemini_cache_mode)
+    if gemini_response_cache.mode != "passthrough":
+        logger.info(f"Gemini record/replay cache mode: {gemini_response_cache.mode}")
+    discovery_watermarks.full_rescan = full_rescan
+    if full_rescan:
+        logger.info("Full rescan requested: discovery watermarks are ignored for this run.")
+
+    if config.IS_TEST_MODE:
+        logger.info(
+            f"--- TEST MODE ACTIVE: Categories={config.TEST_MODE_CATEGORIES}, "
+            f"Products/Cat={config.TEST_MODE_PRODUCTS_LIMIT_PER_CATEGORY}, "
+            f"Reviewers/Prod={config.TEST_MODE_REVIEWERS_LIMIT_PER_PRODUCT} ---"
+        )
+    else:
+        logger.info("--- PRODUCTION MODE ACTIVE (processing all configured items) ---")
+
+    if not config.YOUTUBE_API_KEY or not config.GEMINI_API_KEY:
+        logger.critical("CRITICAL: API keys are not configured. Exiting.")
+        return
+
+    # Warm-up: connect MongoDB and build the API clients before any work is scheduled
+    if not warm_up_clients([
+        ("MongoDB", database_manager.get_mongo_db),
+        ("YouTube", youtube_client.get_youtube_service),
+        ("Gemini", gemini_client.get_gemini_model),
+        # Every other Gemini key too: a key whose client can't be built should stop the run here
+        *((f"Gemini ({credential.label})", functools.partial(gemini_client.get_gemini_model, credential=credential))
+          for credential in gemini_client.gemini_credentials.credentials[1:]),
+    ]):
+        logger.critical("Failed to initialize API services. Check keys/configs. Exiting.")
+        return
+    database_manager.initialize_db()
+
+    if gemini_batch_ingest is not None:
+        ingest_analysis_batches(gemini_batch_ingest)
+        gemini_usage.log_summary()
+        gemini_usage.persist("phase1_batch_ingest")
+        database_manager.close_mongo_client()
+        logger.info("Application finished processing.")
+        return
+    if gemini_batch_submit:
+        analysis_batch_writer = AnalysisBatchWriter()
+        logger.info(f"Batch mode: full analyses are deferred to batch {analysis_batch_writer.batch_id} (backend: {config.GEMINI_BATCH_BACKEND}).")
+
+    # Plan the run's YouTube discovery calls against what is left of today's quota budget
+    product_entries = list(iter_products_to_process())
+    affordable_entries = plan_discovery(product_entries, quota_budget.remaining_units())
+    if config.YOUTUBE_QUOTA_DEFER_UNAFFORDABLE_PRODUCTS and len(affordable_entries) < len(product_entries):
+        logger.warning(f"Deferring {len(product_entries) - len(affordable_entries)} product(s) that don't fit into today's YouTube quota budget.")
+        product_entries = affordable_entries
+
+    logger.info(f"Phase 1 execution mode: {config.PHASE1_EXECUTION_MODE}, consumer discovery mode: {config.CONSUMER_DISCOVERY_MODE}")
+    analysis_dispatcher = None
+    if config.PHASE1_CROSS_PRODUCT_ANALYSIS and analysis_batch_writer is not None:
+        logger.info("Cross-product analysis is not used in batch mode: each product's analysis is deferred on its own.")
+    elif config.PHASE1_CROSS_PRODUCT_ANALYSIS:
+        logger.info("Cross-product analysis enabled: videos shared by several consumer products are analyzed once.")
+        analysis_dispatcher = CrossProductAnalysisDispatcher(config.PHASE1_CROSS_PRODUCT_MAX_PRODUCTS)
+
+    if config.PHASE1_EXECUTION_MODE == "pipeline":
+        Phase1Pipeline(
+            stage_workers=config.PHASE1_PIPELINE_STAGE_WORKERS,
+            queue_size=config.PHASE1_PIPELINE_QUEUE_SIZE,
+            analysis_dispatcher=analysis_dispatcher
+        ).run(iter_discovery_tasks(product_entries))
+    else:
+        task_runner = create_task_runner(
+            config.PHASE1_EXECUTION_MODE,
+            max_workers=config.PHASE1_MAX_WORKERS,
+            max_pending_tasks=config.PHASE1_MAX_PENDING_TASKS
+        )
+        try:
+            for category, product_conf, reviewers_for_this_product in product_entries:
+                if reviewers_for_this_product is not None:
+                    process_consumer_product_with_curated_reviewers(product_conf, reviewers_for_this_product, task_runner=task_runner, analysis_dispatcher=analysis_dispatcher)
+                else:
+                    process_saas_product_general_search(product_conf, task_runner=task_runner)
+            if analysis_dispatcher is not None:
+                for job_group in analysis_dispatcher.drain():
+                    task_runner.submit(analyze_and_save_video_group, job_group)
+        finally:
+            task_runner.shutdown() # Waits for any analyses still running on the worker pool
+
+    if analysis_batch_writer is not None:
+        analysis_batch_writer.submit()
+    discovery_watermarks.commit() # After every analysis has finished, so failures are known
+    relevance_prefilter.log_prefilter_summary()
+    response_cache.log_summary()
+    quota_budget.log_summary()
+    youtube_client.youtube_credentials.log_summary()
+    gemini_response_cache.log_summary()
+    prompt_prefix_cache.log_summary()
+    gemini_client.gemini_credentials.log_summary()
+    gemini_usage.log_summary()
+    gemini_usage.persist("phase1")
+    logger.info(f"Screening verdicts: {verdict_stats['reused']} reused from earlier runs, {verdict_stats['stored']} new verdicts stored.")
+    logger.info(f"YouTube service objects created: {sum(provider.created_count for provider in youtube_client.youtube_service_providers)} (one per thread and key that called the API).")
+    database_manager.close_mongo_client()
     logger.info("Application finished processing.")
 
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    args = parse_args()
+    main(full_rescan=args.full_rescan, gemini_cache_mode=args.gemini_cache_mode,
+         gemini_batch_submit=args.gemini_batch_submit, gemini_batch_ingest=args.gemini_batch_ingest)